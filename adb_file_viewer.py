@@ -1,12 +1,21 @@
 import tkinter as tk
 import tkinter
+import tkinter.filedialog
 import datetime
 import platform
 import subprocess
 import os
 import threading
 import time
-import random
+import queue
+import uuid
+import tarfile
+import shutil
+import collections
+import sqlite3
+import re
+import fnmatch
+import stat
 
 # Holds information about what files have been selected to copy/move.
 # Persists through directory changes.
@@ -14,6 +23,7 @@ class CopyMoveStateInfo:
     def __init__(self, current_directory_value, selected_files, clicked_button):
         self.initial_working_directory = current_directory_value
         self.file_names = []
+        self.file_list = list(selected_files)
         self.clicked_button = clicked_button
 
         for file in selected_files:
@@ -28,6 +38,8 @@ class SortState:
     FILE_SIZE = 16
     FILE_SIZE_REVERSE = 32
 
+    REVERSE_STATES = [ALPHA_REVERSE, DATE_TIME_REVERSE, FILE_SIZE_REVERSE]
+
 # Holds all necessary information to interact with a file on the Android device
 class FileDescriptor:
     # On select, set the file to unselected and then call the selection toggle function
@@ -58,42 +70,722 @@ class FileDescriptor:
             return
         self.checkbox_object.invoke()            
 
-    # Show human readable sizes rather than just bytes
-    def calculate_human_readable_size(self):
-        SIZE_PRESENTATIONS = ["B", "KB", "MB", "GB", "TB"]
-        size_index = 0
-        current_size = self.file_size_bytes
-
-        def set_value(current_size):
-            if current_size < 1000:
-                self.file_size = "{} {}".format(current_size, SIZE_PRESENTATIONS[size_index])
-                return True
-            else:
-                return False
+    # Only these attributes can be set, which saves the memory of a dictionary per FileDescriptor when there are many thousands of files
+    __slots__ = ["is_directory", "file_name", "file_name_key", "natural_sort_key", "file_absolute_directory_path", "file_modified_epoch", "file_size_bytes", "is_size_deferred", "is_selected", "checkbox_object"]
 
-        # Continue to divide the bytes count by 1000 until the value is below 1000
-        # Then select the associated size presentation
-        # e.g., bytes count = 1050, divide by 1000, = 50 KB
-        while set_value(current_size) == False:
-            current_size = int(current_size / 1000)
-            size_index = size_index + 1
+    # Show human readable sizes rather than just bytes
+    # Only worked out when presented, as only the visible files need it
+    @property
+    def file_size(self):
+        if self.is_size_deferred == True:
+            return DEFERRED_DIRECTORY_SIZE_STRING
+        return get_human_readable_size(self.file_size_bytes)
+
+    # e.g. "2000-01-01 23:45". Only worked out when presented.
+    @property
+    def date_time(self):
+        try:
+            return datetime.datetime.fromtimestamp(self.file_modified_epoch).strftime("%Y-%m-%d %H:%M")
+        except (ValueError, OverflowError, OSError):
+            # The date is outside of what the host can present
+            return ""
 
-    def __init__(self, is_directory, file_name, file_absolute_directory_path, date_time, file_size_bytes):
+    def __init__(self, is_directory, file_name, file_absolute_directory_path, file_modified_epoch, file_size_bytes):
         self.is_directory = is_directory
-        self.file_name = file_name # Required for pulling & presentation
-        self.file_name_compat = get_compatibility_name(self.file_name) # For Windows
+        self.set_file_name(file_name)
         self.file_absolute_directory_path = file_absolute_directory_path # Required for pulling
-        self.date_time = date_time # Required for presentation
-        self.date_time_object = datetime.datetime.strptime(date_time, "%Y-%m-%d %H:%M") # Required for sorting (presentation)
+        self.file_modified_epoch = file_modified_epoch # Required for sorting & presentation
         self.file_size_bytes = file_size_bytes # Required for presentation
-        self.calculate_human_readable_size() 
+        self.is_size_deferred = False # Directories presented before du has sized them
         self.is_selected = False
         self.checkbox_object = None
 
+    # e.g. "IMG10.jpg" -> ("img", 10, ".jpg"), which sorts after ("img", 2, ".jpg")
+    # Strings and numbers always alternate, starting with a string, so two keys never compare a string with a number
+    def get_natural_sort_key(self):
+        if self.natural_sort_key is None:
+            name_parts = NATURAL_SORT_NUMBER_PATTERN.split(self.file_name_key)
+            for name_part_index in range(1, len(name_parts), 2):
+                name_parts[name_part_index] = int(name_parts[name_part_index])
+            self.natural_sort_key = tuple(name_parts)
+        return self.natural_sort_key
+
+    # Also used when the file is renamed
+    def set_file_name(self, file_name):
+        self.file_name = file_name # Required for pulling & presentation
+        self.file_name_key = file_name.casefold() # Required for searching & sorting
+        # Most file names are already lower case, in which case the same string can be used rather than holding a copy
+        if self.file_name_key == file_name:
+            self.file_name_key = file_name
+        self.natural_sort_key = None # Only worked out when first required, see get_natural_sort_key
+
+    # Takes the date modified and size of a newer listing of the same file, keeping everything else (e.g. whether it is selected)
+    def copy_details(self, file_descriptor):
+        self.file_modified_epoch = file_descriptor.file_modified_epoch
+        self.file_size_bytes = file_descriptor.file_size_bytes
+        self.is_size_deferred = file_descriptor.is_size_deferred
+
+# One row of the file list. Rows are created once, and are then shown with whichever file is currently in their position.
+class FileListRow:
+    def __init__(self, parent_frame, grid_row_index):
+        self.file_descriptor = None
+
+        configure_widget_array = []
+
+        self.file_icon_label = tk.Label(parent_frame, width=1, height=1)
+        # Only directories should be clickable, so files use a label and directories use a button. Only one of them is shown at a time.
+        self.file_name_label = tk.Label(parent_frame, width=1, height=1, bg="#f0f0f0")
+        self.directory_name_button = tk.Button(parent_frame, width=1, height=1, bg="#f0f0f0", command=self.on_directory_clicked)
+        self.file_datetime_label = tk.Label(parent_frame, width=1, height=1)
+        self.file_filesize_label = tk.Label(parent_frame, width=1, height=1)
+        self.file_select_button = tk.Checkbutton(parent_frame, command=self.on_file_select_toggle, width=1, height=1)
+
+        configure_widget_array.append(lambda column_index : self.file_icon_label.grid(column=column_index, row=grid_row_index, sticky="nsew"))
+        configure_widget_array.append(lambda column_index : self.file_name_label.grid(column=column_index, row=grid_row_index, sticky="nsew"))
+        configure_widget_array.append(lambda column_index : self.file_datetime_label.grid(column=column_index, row=grid_row_index, sticky="nsew"))
+        configure_widget_array.append(lambda column_index : self.file_filesize_label.grid(column=column_index, row=grid_row_index, sticky="nsew"))
+        configure_widget_array.append(lambda column_index : self.file_select_button.grid(column=column_index, row=grid_row_index, sticky="nsew"))
+
+        column_index = 0
+
+        for configure_widget_function in configure_widget_array:
+            configure_widget_function(column_index)
+            column_index = column_index + 2
+
+        # Shares the file name's cell
+        self.directory_name_button.grid(column=2, row=grid_row_index, sticky="nsew")
+        self.widgets = [self.file_icon_label, self.file_name_label, self.directory_name_button, self.file_datetime_label, self.file_filesize_label, self.file_select_button]
+        self.hide()
+
+    # The label which is currently showing the file's name
+    def get_name_widget(self):
+        return self.directory_name_button if self.file_descriptor.is_directory == True else self.file_name_label
+
+    def on_directory_clicked(self):
+        on_directory_clicked(self.file_descriptor)
+
+    def on_file_select_toggle(self):
+        on_file_select_toggle(self.file_descriptor, self.get_name_widget())
+
+    def show(self, file_descriptor):
+        # The previous file is no longer on screen, so it must not hold on to this row's checkbox
+        self.release_file_descriptor()
+        self.file_descriptor = file_descriptor
+
+        self.file_icon_label.config(text="D" if file_descriptor.is_directory else "F")
+        self.file_datetime_label.config(text=file_descriptor.date_time)
+        self.file_filesize_label.config(text=file_descriptor.file_size)
+
+        for widget in [self.file_icon_label, self.file_datetime_label, self.file_filesize_label, self.file_select_button]:
+            widget.grid()
+
+        if file_descriptor.is_directory == False:
+            self.directory_name_button.grid_remove()
+            self.file_name_label.grid()
+        else:
+            self.file_name_label.grid_remove()
+            self.directory_name_button.grid()
+
+        name_widget = self.get_name_widget()
+        name_widget.config(text=file_descriptor.file_name, bg="#f0f0f0")
+
+        # The ".." directory should not be selectable
+        if file_descriptor.file_name == ".." or copy_move_state_info_object is not None:
+            modify_widget_states(disable_list=[self.file_select_button])
+        else:
+            modify_widget_states(enable_list=[self.file_select_button])
+
+        # The checkbox may still be ticked from the previous file it was showing
+        self.file_select_button.deselect()
+        file_descriptor.checkbox_object = self.file_select_button
+
+        # Useful when the copy/move button is clicked in the same directoy as it started,
+        # Thereby toggling off the copy/move state but presenting to the user what files they still have selected.
+        if file_descriptor.is_selected == True:
+            file_descriptor.select()
+
+    def hide(self):
+        self.release_file_descriptor()
+        self.file_descriptor = None
+        for widget in self.widgets:
+            widget.grid_remove()
+
+    def release_file_descriptor(self):
+        if self.file_descriptor is not None and self.file_descriptor.checkbox_object is self.file_select_button:
+            self.file_descriptor.checkbox_object = None
+
+# Remembers the files found in recently visited directories, so moving back and forth between directories does not need to query the device again
+# Entries are keyed by (device serial, absolute directory path), expire after time_to_live seconds,
+# and the least recently used entries are removed once there are more than max_entry_count entries or max_file_count files in total.
+# Only used from the main thread.
+class DirectoryListingCache:
+    def __init__(self, time_to_live, max_entry_count, max_file_count):
+        self.time_to_live = time_to_live
+        self.max_entry_count = max_entry_count
+        self.max_file_count = max_file_count
+        # Ordered from least to most recently used
+        self.entries = collections.OrderedDict()
+        self.file_count = 0
+
+    # Returns a copy of the cached file list, or None if there is no valid entry
+    def get(self, key):
+        if key not in self.entries:
+            return None
+
+        created_time, file_list = self.entries[key]
+
+        if time.monotonic() - created_time > self.time_to_live:
+            self.remove(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return list(file_list)
+
+    def put(self, key, file_list):
+        self.remove(key)
+        self.entries[key] = (time.monotonic(), list(file_list))
+        self.file_count = self.file_count + len(file_list)
+
+        while len(self.entries) > self.max_entry_count or (self.file_count > self.max_file_count and len(self.entries) > 1):
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        if key in self.entries:
+            self.file_count = self.file_count - len(self.entries.pop(key)[1])
+
+    # Removes the entry for the directory, and every entry inside it
+    def remove_tree(self, device_serial, absolute_directory):
+        for key in list(self.entries.keys()):
+            if key[0] == device_serial and key[1].startswith(absolute_directory):
+                self.remove(key)
+
+# A copy of the type, size and date modified of every file under a directory of the device (e.g. /sdcard/), stored in a SQLite file on the host.
+# It survives restarts, so directories can be presented from it straight away, while the device is listed again in the background.
+# Records are (absolute directory path, file name, is directory, size in bytes, date modified epoch).
+# The directories table holds the date modified of every directory whose contents are in the index, at the time they were listed.
+# A directory's date modified changes whenever a file is added to, removed from or renamed inside it, so only changed directories need listing again.
+# Can be used from any thread.
+class MetadataIndex:
+    def __init__(self, database_path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (directory TEXT NOT NULL, name TEXT NOT NULL, is_directory INTEGER NOT NULL, size INTEGER NOT NULL, modified INTEGER NOT NULL, PRIMARY KEY (directory, name))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, modified INTEGER)")
+        self.connection.commit()
+
+    def is_empty(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM directories").fetchone()[0] == 0
+
+    # Returns a dictionary of absolute directory path to date modified epoch, for every directory whose contents are in the index
+    def get_directory_modified_epochs(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT path, modified FROM directories").fetchall())
+
+    # Returns the FileDescriptors of every file directly inside the directory, or None if its contents are not in the index
+    # The size of a directory is the total size of every file inside it, which is close to what du reports
+    def get_file_list(self, absolute_directory):
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM directories WHERE path = ?", (absolute_directory,)).fetchone() is None:
+                return None
+
+            file_list = []
+
+            for file_name, is_directory, file_size, file_modified_epoch in self.connection.execute("SELECT name, is_directory, size, modified FROM files WHERE directory = ?", (absolute_directory,)).fetchall():
+                if is_directory == 1:
+                    # Every path that starts with "/sdcard/DCIM/" sorts between "/sdcard/DCIM/" and "/sdcard/DCIM0"
+                    directory_path = absolute_directory + file_name + "/"
+                    file_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM files WHERE directory >= ? AND directory < ? AND is_directory = 0", (directory_path, directory_path[:-1] + "0")).fetchone()[0]
+
+                file_list.append(FileDescriptor(is_directory == 1, file_name, absolute_directory, file_modified_epoch, file_size))
+
+            return file_list
+
+    # Returns the record of every file anywhere inside the directory, or None if the directory's contents are not in the index
+    def get_records_inside(self, absolute_directory):
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM directories WHERE path = ?", (absolute_directory,)).fetchone() is None:
+                return None
+            return self.connection.execute("SELECT directory, name, is_directory, size, modified FROM files WHERE directory >= ? AND directory < ?", (absolute_directory, absolute_directory[:-1] + "0")).fetchall()
+
+    # Removes everything in the index, e.g. before the device is listed again from scratch
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM directories")
+            self.connection.commit()
+
+    def add_records(self, record_list):
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", record_list)
+            self.connection.commit()
+
+    # directory_modified_epochs is a list of (absolute directory path, date modified epoch). An epoch of None means the directory should be listed again.
+    def set_directory_modified_epochs(self, directory_modified_epochs):
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO directories VALUES (?, ?)", directory_modified_epochs)
+            self.connection.commit()
+
+    # Removes the contents of the directories, but not anything inside their subdirectories
+    def remove_directory_contents(self, absolute_directory_list):
+        with self.lock:
+            self.connection.executemany("DELETE FROM files WHERE directory = ?", map(lambda absolute_directory : (absolute_directory,), absolute_directory_list))
+            self.connection.executemany("DELETE FROM directories WHERE path = ?", map(lambda absolute_directory : (absolute_directory,), absolute_directory_list))
+            self.connection.commit()
+
+    # Removes a file or directory (e.g. "/sdcard/DCIM/"), its record in the directory it is in, and everything inside it
+    def remove_tree(self, absolute_directory):
+        # e.g. "/sdcard/DCIM/" -> "/sdcard/", "DCIM"
+        parent_directory_path, file_name = absolute_directory[:-1].rsplit("/", 1)
+        with self.lock:
+            self.connection.execute("DELETE FROM files WHERE directory = ? AND name = ?", (parent_directory_path + "/", file_name))
+            self.connection.execute("DELETE FROM files WHERE directory >= ? AND directory < ?", (absolute_directory, absolute_directory[:-1] + "0"))
+            self.connection.execute("DELETE FROM directories WHERE path >= ? AND path < ?", (absolute_directory, absolute_directory[:-1] + "0"))
+            self.connection.commit()
+
+    # Replaces the contents of a directory with a newer listing of it, which is a list of FileDescriptors
+    # The directory's date modified is not known, so it will be listed again by the next index walk
+    def replace_directory_contents(self, absolute_directory, file_list):
+        record_list = []
+
+        for file_descriptor in file_list:
+            record_list.append((absolute_directory, file_descriptor.file_name, 1 if file_descriptor.is_directory == True else 0, file_descriptor.file_size_bytes, file_descriptor.file_modified_epoch))
+
+        with self.lock:
+            self.connection.execute("DELETE FROM files WHERE directory = ?", (absolute_directory,))
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", record_list)
+            self.connection.execute("INSERT OR REPLACE INTO directories VALUES (?, NULL)", (absolute_directory,))
+            self.connection.commit()
+
+# Created on the main thread. Every command run for the thread is run on the device which was selected when it was created, see run_shell_command.
 class CustomThreadState:
     def __init__(self):
+        self.device_serial = current_device_serial
         self.is_complete = False
         self.is_interrupted = False
+        # Functions which each stop a command currently running for the thread, see interrupt
+        self.running_command_stop_functions = set()
+        self.interrupt_lock = threading.Lock()
+
+    # Called with a function which stops a command (e.g. subprocess.Popen.kill) once the command has started, and removed once it has finished
+    # Returns False, without adding the function, if the thread has already been interrupted, in which case the command should be stopped.
+    def add_running_command(self, stop_function):
+        with self.interrupt_lock:
+            if self.is_interrupted == True:
+                return False
+            self.running_command_stop_functions.add(stop_function)
+            return True
+
+    def remove_running_command(self, stop_function):
+        with self.interrupt_lock:
+            self.running_command_stop_functions.discard(stop_function)
+
+    # Can be called from any thread. Any command still running for the thread is killed, so the thread gives up straight away,
+    # however long the command would have taken, and the device is free for other commands.
+    def interrupt(self):
+        with self.interrupt_lock:
+            self.is_interrupted = True
+            for stop_function in self.running_command_stop_functions:
+                stop_function()
+
+# If metadata_index is given, the directory is presented from it first, and is then listed to bring both the presented files and the index up to date
+class RefreshThreadState(CustomThreadState):
+    def __init__(self, absolute_directory, metadata_index=None):
+        CustomThreadState.__init__(self)
+        self.absolute_directory = absolute_directory
+        self.metadata_index = metadata_index
+
+# A recursive search of every file inside absolute_directory. Results are presented a page at a time,
+# and the search waits once a page is full until the user scrolls to the end of the list.
+class SearchThreadState(RefreshThreadState):
+    def __init__(self, absolute_directory, search_query, metadata_index=None):
+        RefreshThreadState.__init__(self, absolute_directory, metadata_index)
+        self.search_query = search_query
+        self.result_count = 0
+        self.result_limit = SEARCH_RESULT_PAGE_SIZE
+        self.is_paused = False
+        self.next_page_event = threading.Event()
+
+# The text typed into the search field, for a recursive search. Made up of a file name, and any number of filters, separated by spaces. e.g.
+# "holiday" - file names containing "holiday", ignoring case
+# "IMG_*.jpg" - file names matching the glob pattern, ignoring case
+# "re:^IMG_\d+" - file names matching the regular expression, ignoring case
+# "size>10M", "size<500K" - files bigger or smaller than the size, in bytes, or K, M or G (1000s)
+# "after:2024-01-31", "before:2024-01-31" - files modified after or before the start of the date
+class SearchQuery:
+    SIZE_UNITS = {"": 1, "K": 1000, "M": 1000 ** 2, "G": 1000 ** 3}
+
+    def __init__(self, query):
+        self.name_pattern = None
+        self.name_regex = None
+        self.min_size = None
+        self.max_size = None
+        self.min_epoch = None
+        self.max_epoch = None
+
+        name_word_list = []
+
+        for word in filter_empty_string_elements(query.split()):
+            size_match = re.fullmatch("size([<>])(\\d+)([KMG]?)", word, re.IGNORECASE)
+
+            if word.startswith("re:"):
+                self.name_regex = re.compile(word[len("re:"):], re.IGNORECASE)
+            elif size_match is not None:
+                size = int(size_match.group(2)) * SearchQuery.SIZE_UNITS[size_match.group(3).upper()]
+                if size_match.group(1) == ">":
+                    self.min_size = size
+                else:
+                    self.max_size = size
+            elif word.startswith("after:"):
+                self.min_epoch = datetime.datetime.strptime(word[len("after:"):], "%Y-%m-%d").timestamp()
+            elif word.startswith("before:"):
+                self.max_epoch = datetime.datetime.strptime(word[len("before:"):], "%Y-%m-%d").timestamp()
+            else:
+                name_word_list.append(word)
+
+        name = " ".join(name_word_list)
+
+        if len(name) > 0:
+            # Without any wildcards, the name can be anywhere in the file name
+            if "*" in name or "?" in name or "[" in name:
+                self.name_pattern = name.lower()
+            else:
+                self.name_pattern = "*" + name.lower() + "*"
+
+    def matches(self, file_name, file_size, file_modified_epoch):
+        if self.name_pattern is not None and fnmatch.fnmatchcase(file_name.lower(), self.name_pattern) == False:
+            return False
+        if self.name_regex is not None and self.name_regex.search(file_name) is None:
+            return False
+        if self.min_size is not None and file_size <= self.min_size:
+            return False
+        if self.max_size is not None and file_size >= self.max_size:
+            return False
+        if self.min_epoch is not None and file_modified_epoch < self.min_epoch:
+            return False
+        if self.max_epoch is not None and file_modified_epoch >= self.max_epoch:
+            return False
+        return True
+
+# Lists directories in the background before the user opens them, so that they can be presented straight from the DirectoryListingCache
+class PrefetchThreadState(CustomThreadState):
+    def __init__(self, absolute_directory_list):
+        CustomThreadState.__init__(self)
+        self.absolute_directory_list = absolute_directory_list
+
+# A single file to be pulled from the Android device to the host computer
+# If file_modified_epoch is given, the host file is given the same date modified once it has been pulled
+# file_size_bytes is the size of the file on the device, if known. byte_count is the amount of bytes which were pulled.
+class PullTask:
+    def __init__(self, absolute_file_path, absolute_file_path_on_host, file_modified_epoch=None, file_size_bytes=None):
+        self.absolute_file_path = absolute_file_path
+        self.absolute_file_path_on_host = absolute_file_path_on_host
+        self.file_modified_epoch = file_modified_epoch
+        self.file_size_bytes = file_size_bytes
+        self.byte_count = 0
+        self.attempt_count = 0
+        self.is_complete = False
+        self.is_failed = False
+
+# Pulls a list of files using a fixed number of worker threads, each running its own adb pull
+# Failed pulls are retried up to retry_count times.
+# progress_callback is called from the worker threads with the scheduler and the task, every time a task starts, completes or fails.
+# If a job is given, no more tasks are started once it has been cancelled.
+# Files are pulled from the device with the given serial, or the only device that is connected if it is None.
+class PullScheduler:
+    def __init__(self, pull_task_list, worker_count, retry_count, progress_callback, job=None, device_serial=None):
+        self.pull_task_list = pull_task_list
+        self.worker_count = worker_count
+        self.retry_count = retry_count
+        self.progress_callback = progress_callback
+        self.job = job
+        self.device_serial = device_serial
+        self.pending_task_queue = queue.Queue()
+        self.progress_lock = threading.Lock()
+        self.running_task_list = []
+        self.completed_count = 0
+        self.failed_count = 0
+
+        for pull_task in pull_task_list:
+            self.pending_task_queue.put(pull_task)
+
+    # Blocks until every task has completed or failed
+    def run(self):
+        worker_thread_list = []
+
+        for _ in range(min(self.worker_count, len(self.pull_task_list))):
+            worker_thread_object = threading.Thread(target=self.worker_action)
+            worker_thread_object.daemon = True
+            worker_thread_object.start()
+            worker_thread_list.append(worker_thread_object)
+
+        for worker_thread_object in worker_thread_list:
+            worker_thread_object.join()
+
+    def worker_action(self):
+        while True:
+            if self.job is not None and self.job.is_interrupted == True:
+                return
+            try:
+                pull_task = self.pending_task_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            with self.progress_lock:
+                self.running_task_list.append(pull_task)
+            self.progress_callback(self, pull_task)
+
+            self.transfer(pull_task)
+
+            with self.progress_lock:
+                self.running_task_list.remove(pull_task)
+                if pull_task.is_complete == True:
+                    self.completed_count = self.completed_count + 1
+                elif pull_task.is_failed == True:
+                    self.failed_count = self.failed_count + 1
+            self.progress_callback(self, pull_task)
+
+    # Overridden by PushScheduler
+    def transfer(self, pull_task):
+        self.pull(pull_task)
+
+    def pull(self, pull_task):
+        # adb is run directly rather than through the host shell, so killing the process stops the pull
+        command = get_adb_command(self.device_serial) + ["pull", pull_task.absolute_file_path, pull_task.absolute_file_path_on_host]
+        # A directory is pulled into the given host directory, e.g. "/sdcard/DCIM" -> output/DCIM
+        pulled_path_on_host = pull_task.absolute_file_path_on_host
+        if os.path.isdir(pulled_path_on_host):
+            pulled_path_on_host = os.path.join(pulled_path_on_host, os.path.basename(pull_task.absolute_file_path))
+        is_new_path_on_host = not os.path.exists(pulled_path_on_host)
+
+        while pull_task.attempt_count <= self.retry_count:
+            pull_task.attempt_count = pull_task.attempt_count + 1
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            if self.job is not None and self.job.add_running_command(process.kill) == False:
+                process.kill()
+            output = process.communicate()[0]
+            if self.job is not None:
+                self.job.remove_running_command(process.kill)
+            print("Command run: {command}".format(command=" ".join(command)))
+
+            if self.job is not None and self.job.is_interrupted == True:
+                remove_partially_pulled_path(pulled_path_on_host, is_new_path_on_host)
+                return
+
+            if process.returncode == 0:
+                if pull_task.file_modified_epoch is not None:
+                    os.utime(pull_task.absolute_file_path_on_host, (pull_task.file_modified_epoch, pull_task.file_modified_epoch))
+                # e.g. "/sdcard/test.txt: 1 file pulled, 0 skipped. 31.8 MB/s (1048576 bytes in 0.031s)"
+                byte_count_match = ADB_PULL_BYTE_COUNT_PATTERN.search(output)
+                if byte_count_match is not None:
+                    pull_task.byte_count = int(byte_count_match.group(1))
+                elif os.path.isfile(pull_task.absolute_file_path_on_host):
+                    pull_task.byte_count = os.path.getsize(pull_task.absolute_file_path_on_host)
+                pull_task.is_complete = True
+                return
+
+        pull_task.is_failed = True
+        print("Failed to pull: {path}".format(path=pull_task.absolute_file_path))
+
+# A single file or directory to be pushed from absolute_file_path_on_host to absolute_file_path on the Android device
+# A directory is pushed into absolute_file_path, which must be a directory, e.g. output/DCIM -> "/sdcard/" makes "/sdcard/DCIM"
+class PushTask(PullTask):
+    pass
+
+# Pushes a list of PushTasks using a fixed number of worker threads, each running its own adb push, in the same way as PullScheduler
+class PushScheduler(PullScheduler):
+    def transfer(self, push_task):
+        self.push(push_task)
+
+    def push(self, push_task):
+        # adb is run directly rather than through the host shell, so killing the process stops the push
+        command = get_adb_command(self.device_serial) + ["push", push_task.absolute_file_path_on_host, push_task.absolute_file_path]
+
+        while push_task.attempt_count <= self.retry_count:
+            push_task.attempt_count = push_task.attempt_count + 1
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            if self.job is not None and self.job.add_running_command(process.kill) == False:
+                process.kill()
+            output = process.communicate()[0]
+            if self.job is not None:
+                self.job.remove_running_command(process.kill)
+            print("Command run: {command}".format(command=" ".join(command)))
+
+            if self.job is not None and self.job.is_interrupted == True:
+                # A partly pushed file can't be used, but a directory may hold files which were there before
+                # The job's shell commands can no longer run, so adb is run directly
+                if os.path.isfile(push_task.absolute_file_path_on_host):
+                    remove_command = REMOVE_FILE_COMMAND.format(absolute_file_path=quote_path_correctly_single(push_task.absolute_file_path))
+                    subprocess.run(get_adb_command(self.device_serial) + ["shell", remove_command], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    print("Command run: {command}".format(command=remove_command))
+                return
+
+            if process.returncode == 0:
+                # e.g. "test.txt: 1 file pushed, 0 skipped. 31.8 MB/s (1048576 bytes in 0.031s)"
+                byte_count_match = ADB_PULL_BYTE_COUNT_PATTERN.search(output)
+                if byte_count_match is not None:
+                    push_task.byte_count = int(byte_count_match.group(1))
+                elif push_task.file_size_bytes is not None:
+                    push_task.byte_count = push_task.file_size_bytes
+                push_task.is_complete = True
+                return
+
+        push_task.is_failed = True
+        print("Failed to push: {path}".format(path=push_task.absolute_file_path_on_host))
+
+# Enum for the state of a Job
+class JobState:
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    COMPLETE = "Done"
+    FAILED = "Failed"
+    CANCELLED = "Cancelled"
+
+# Something the user asked for which runs in the background (e.g. a pull), so they can carry on browsing in the meantime
+# action is called on the job thread with the Job. It reports its progress with set_totals and add_progress,
+# and should stop as soon as it can once the job is interrupted. Commands run for the job are killed when it is interrupted (see CustomThreadState).
+# on_complete is called on the main thread with the Job once it has stopped, however it stopped.
+class Job(CustomThreadState):
+    def __init__(self, title, action, on_complete=None):
+        CustomThreadState.__init__(self)
+        self.title = title
+        self.action = action
+        self.on_complete = on_complete
+        self.state = JobState.QUEUED
+        # None until known
+        self.total_file_count = None
+        self.total_byte_count = None
+        # Failed files are counted in file_count too
+        self.file_count = 0
+        self.failed_count = 0
+        self.byte_count = 0
+        self.start_time = None
+        self.progress_lock = threading.Lock()
+
+    def set_totals(self, total_file_count, total_byte_count=None):
+        with self.progress_lock:
+            self.total_file_count = total_file_count
+            self.total_byte_count = total_byte_count
+
+    def add_progress(self, file_count, byte_count=0, failed_count=0):
+        with self.progress_lock:
+            self.file_count = self.file_count + file_count + failed_count
+            self.byte_count = self.byte_count + byte_count
+            self.failed_count = self.failed_count + failed_count
+
+    def is_finished(self):
+        return self.state != JobState.QUEUED and self.state != JobState.RUNNING
+
+    # e.g. "Pull 3 file(s): Running, 120/300 files, 1 failed, 2 MB/s, 40 files/s, 0:05 left"
+    def get_status_text(self):
+        with self.progress_lock:
+            file_count = self.file_count
+            failed_count = self.failed_count
+            byte_count = self.byte_count
+            total_file_count = self.total_file_count
+            total_byte_count = self.total_byte_count
+
+        status_text_list = [self.state if self.is_interrupted == False or self.is_finished() == True else "Cancelling"]
+
+        if total_file_count is not None:
+            status_text_list.append("{file_count}/{total_file_count} files".format(file_count=file_count, total_file_count=total_file_count))
+        elif file_count > 0:
+            status_text_list.append("{file_count} files".format(file_count=file_count))
+
+        if failed_count > 0:
+            status_text_list.append("{failed_count} failed".format(failed_count=failed_count))
+
+        if self.state == JobState.RUNNING and time.monotonic() - self.start_time > 0:
+            running_time = time.monotonic() - self.start_time
+            bytes_per_second = byte_count / running_time
+            files_per_second = file_count / running_time
+            if byte_count > 0:
+                status_text_list.append(get_human_readable_size(int(bytes_per_second)) + "/s")
+            status_text_list.append("{files_per_second:.0f} files/s".format(files_per_second=files_per_second))
+
+            # Bytes give a better estimate than files, as files can be any size
+            remaining_time = None
+            if total_byte_count is not None and bytes_per_second > 0:
+                remaining_time = max(total_byte_count - byte_count, 0) / bytes_per_second
+            elif total_file_count is not None and files_per_second > 0:
+                remaining_time = max(total_file_count - file_count, 0) / files_per_second
+            if remaining_time is not None:
+                status_text_list.append("{minutes}:{seconds:02d} left".format(minutes=int(remaining_time) // 60, seconds=int(remaining_time) % 60))
+
+        # Jobs from every device are presented together
+        title = self.title if self.device_serial is None else "{device_serial} {title}".format(device_serial=self.device_serial, title=self.title)
+        return "{title}: {status}".format(title=title, status=", ".join(status_text_list))
+
+# Runs Jobs on a background thread one at a time, in the order they were added, so e.g. a delete never runs before a copy of the same files added ahead of it
+# There is one per device (see add_job), so jobs on different devices run at the same time.
+class JobQueue:
+    def __init__(self):
+        self.pending_job_queue = queue.Queue()
+        self.job_thread_object = None
+
+    def add(self, job):
+        self.pending_job_queue.put(job)
+
+        # Started once the first job is added, and then waits for more
+        if self.job_thread_object is None:
+            self.job_thread_object = threading.Thread(target=self.job_thread_action)
+            self.job_thread_object.daemon = True
+            self.job_thread_object.start()
+
+    def job_thread_action(self):
+        while True:
+            job = self.pending_job_queue.get()
+
+            if job.is_interrupted == False:
+                job.start_time = time.monotonic()
+                job.state = JobState.RUNNING
+                # Stops any prefetching while the job runs, even when it is not running a shell command (e.g. adb pull)
+                begin_foreground_command()
+                try:
+                    job.action(job)
+                except Exception as error:
+                    print("{title} stopped: {error}".format(title=job.title, error=error))
+                    job.add_progress(0, failed_count=1)
+                finally:
+                    end_foreground_command()
+
+            if job.is_interrupted == True:
+                job.state = JobState.CANCELLED
+            elif job.failed_count > 0:
+                job.state = JobState.FAILED
+            else:
+                job.state = JobState.COMPLETE
+            run_on_main_thread(lambda job=job : job_main_thread_action_complete(job))
+
+# One row of the jobs panel, created once like FileListRow, and then shown with whichever job is currently in its position
+class JobPanelRow:
+    def __init__(self, parent_frame, grid_row_index):
+        self.job = None
+        self.job_status_label = tk.Label(parent_frame, width=1, height=1, anchor="w")
+        self.job_cancel_button = tk.Button(parent_frame, text="Cancel", width=1, height=1, command=self.on_cancel)
+        self.job_status_label.grid(column=0, row=grid_row_index, sticky="nsew")
+        self.job_cancel_button.grid(column=2, row=grid_row_index, sticky="nsew")
+        self.hide()
+
+    def on_cancel(self):
+        if self.job is not None:
+            self.job.interrupt()
+            update_job_panel()
+
+    def show(self, job):
+        self.job = job
+        self.job_status_label.config(text=job.get_status_text())
+        self.job_status_label.grid()
+        self.job_cancel_button.grid()
+        if job.is_finished() == True or job.is_interrupted == True:
+            modify_widget_states(disable_list=[self.job_cancel_button])
+        else:
+            modify_widget_states(enable_list=[self.job_cancel_button])
+
+    def hide(self):
+        self.job = None
+        self.job_status_label.grid_remove()
+        self.job_cancel_button.grid_remove()
 
 class SanitisationThreadState(CustomThreadState):
     def __init__(self, target_text_field, target_text_field_cursor):
@@ -101,6 +793,96 @@ class SanitisationThreadState(CustomThreadState):
         self.target_text_field = target_text_field
         self.target_text_field_cursor = target_text_field_cursor
 
+# A long-lived "adb shell" process which device commands are written to one after another,
+# saving the cost of starting a new host shell, adb client and device shell for every command.
+# After each command, a unique token and the command's exit code are printed, which marks where the command's output ends.
+# If the process dies, it is started again the next time a command is run.
+class AdbShellSession:
+    def __init__(self, device_serial):
+        self.device_serial = device_serial
+        self.process = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(get_adb_command(self.device_serial) + ["shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    # Can be called from any thread, which will also stop any command currently running in this session
+    # Waits for the process to end, so the next command never finds it still alive and writes to it
+    def close(self):
+        process = self.process
+        if process is not None:
+            try:
+                process.kill()
+                process.wait()
+            except OSError:
+                pass
+
+    # Runs a device command and returns a subprocess.CompletedProcess holding its exit code and output (bytes)
+    # If output_callback is given, output is handed to it as it arrives instead of being returned.
+    # output_callback can return False to stop the command early, which will restart the session.
+    def run(self, command, output_callback=None):
+        token = ADB_SHELL_SESSION_TOKEN_PREFIX + uuid.uuid4().hex
+        # e.g. "ADB_FILE_VIEWER_0123...cdef 0\n"
+        token_marker = (token + " ").encode("utf-8")
+        # stdin is redirected so a command can never read the commands that follow it
+        # The command runs in a subshell, so even a command which calls exit or exec can't end the session before the token is printed
+        framed_command = "(\n" + command + "\n) </dev/null\nprintf '%s %d\\n' " + token + " $?\n"
+
+        # The previous process may have died since the last command, e.g. the device was unplugged
+        if self.is_alive() == False:
+            self.start()
+
+        try:
+            self.process.stdin.write(framed_command.encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError:
+            self.close()
+            return subprocess.CompletedProcess(command, ADB_SHELL_SESSION_FAILED_RETURN_CODE, b"")
+
+        output = bytearray()
+        search_start_index = 0
+
+        while True:
+            chunk = self.process.stdout.read1(ADB_SHELL_SESSION_READ_SIZE)
+
+            # The process has died part way through the command
+            if len(chunk) == 0:
+                self.close()
+                return subprocess.CompletedProcess(command, ADB_SHELL_SESSION_FAILED_RETURN_CODE, bytes(output))
+
+            output.extend(chunk)
+            token_index = output.find(token_marker, search_start_index)
+
+            if token_index == -1:
+                # Only the end of the output can hold part of the token, everything before it can be handed over
+                search_start_index = max(0, len(output) - len(token_marker))
+                if output_callback is not None and search_start_index > 0:
+                    if output_callback(bytes(output[:search_start_index])) == False:
+                        self.close()
+                        return subprocess.CompletedProcess(command, ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE, b"")
+                    del output[:search_start_index]
+                    search_start_index = 0
+                continue
+
+            return_code_end_index = output.find(b"\n", token_index)
+
+            # The exit code has not been fully received yet
+            if return_code_end_index == -1:
+                search_start_index = token_index
+                continue
+
+            return_code = int(output[token_index + len(token_marker):return_code_end_index])
+            del output[token_index:]
+
+            if output_callback is not None:
+                if len(output) > 0:
+                    output_callback(bytes(output))
+                return subprocess.CompletedProcess(command, return_code, b"")
+
+            return subprocess.CompletedProcess(command, return_code, bytes(output))
+
 CURRENT_OS = platform.system()
 
 # Command constants
@@ -121,7 +903,13 @@ CURRENT_OS = platform.system()
 # Quotes aside, there are other symbols which file names can have that can be interpreted by the host shell like $, ` etc. These symbols must be escaped once, as they are wrapped in double quotes and will be interpreted on the host, but will then be wrapped by single quotes on the Android device and therefore won't be interpreted.
 
 # Therefore, any path being supplied must be altered to escape any potential characters that may break or change the command
-# All paths are sent through either quote_path_correctly_outer_double_inner_single or quote_path_correctly_outer_double
+# All paths are sent through either quote_path_correctly_single or quote_path_correctly_outer_double
+
+# Shell commands are not supplied on the host command line at all, but are written to an AdbShellSession, which means only the Android shell sees them
+# Received command on android::: ls '/sdcard/John'\''s_Photos'
+# So for shell commands, only the single quotes need to be corrected, which is done by quote_path_correctly_single
+# Commands run by adb itself, like adb pull, are passed to adb as a list of arguments, so their paths don't need quoting at all
+# Only commands run through the host shell, like RUNTIME_OPEN_COMMAND, use quote_path_correctly_outer_double
 
 RUNTIME_ADB_COMMAND = ""
 RUNTIME_OPEN_COMMAND = ""
@@ -137,24 +925,81 @@ print("Creating output directory: {path}".format(path=make_directory_path_value)
 OPEN_FILE_COMMAND_WINDOWS =  "start \"\" \"{absolute_file_path_on_host}\"" # https://superuser.com/a/239572
 OPEN_FILE_COMMAND_LINUX = "xdg-open \"{absolute_file_path_on_host}\""
 
-LIST_FILES_COMMAND = " shell \"ls -L1a '{absolute_current_directory}'\""
-LIST_FILES_AND_DETAILS_COMMAND = " shell \"ls -Lla '{absolute_current_directory}'\""
-GET_FILE_EPOCH_COMMAND = " shell \"date -r '{absolute_file_path}' \"+%s\"\""
-GET_DIRECTORY_KBYTE_SIZE_COMMAND = " shell \"du -sd 1 -k '{absolute_directory}'\""
-PULL_FILE_COMMAND = " pull \"{absolute_file_path}\" \"{absolute_file_path_on_host}\""
-COPY_COMMAND = " shell \"cp -a '{absolute_file_path}' '{absolute_directory}'\""
-MOVE_COMMAND = " shell \"mv '{absolute_file_path}' '{absolute_directory}'\""
-DELETE_COMMAND = " shell \"rm -rf '{absolute_file_path}'\""
-CREATE_DIRECTORY_COMMAND = " shell \"mkdir -p '{absolute_directory}'\""
-GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND = " shell \"find '{absolute_directory}' -type f\""
-RENAME_COMMAND = " shell \"mv '{absolute_file_path}' '{absolute_new_file_path}'\""
+# Lists every file in a directory in a single round trip. Each file is printed as type/size/epoch/name and terminated by a NUL character.
+# A "/" can never appear in a file name and a NUL can never appear in a file name, so neither delimiter can be broken by the file name itself.
+# Shell commands, run through an AdbShellSession
+LIST_FILES_WITH_DETAILS_COMMAND = "find -L '{absolute_current_directory}' -mindepth 1 -maxdepth 1 -printf '%y/%s/%T@/%f\\0'"
+LIST_FILES_COMMAND = "ls -L1a '{absolute_current_directory}'"
+LIST_FILES_AND_DETAILS_COMMAND = "ls -Lla '{absolute_current_directory}'"
+# Prints the date modified epoch, size, type and mode (in hex) and path of each file on its own line, e.g. "1700000000 4 81b0 /sdcard/test.txt"
+# The paths are each quoted and separated by a space
+GET_FILE_DETAILS_COMMAND = "stat -L -c '%Y %s %f %n' {quoted_paths}"
+# Returns the size of the directory and of every directory directly inside it, one per line, e.g. "12\t/sdcard/DCIM"
+GET_CHILD_DIRECTORY_KBYTE_SIZES_COMMAND = "du -k -d 1 '{absolute_directory}'"
+# Copy, move and delete take any number of paths, each quoted and separated by a space. See run_batched_path_command.
+# Errors are printed to stdout, as that is all a session returns
+COPY_COMMAND = "cp -a {quoted_paths} '{absolute_directory}' 2>&1"
+MOVE_COMMAND = "mv {quoted_paths} '{absolute_directory}' 2>&1"
+DELETE_COMMAND = "rm -rf {quoted_paths} 2>&1"
+CREATE_DIRECTORY_COMMAND = "mkdir -p '{absolute_directory}'"
+# Takes any number of paths in the same way as DELETE_COMMAND. Any directories above each path are created too.
+CREATE_DIRECTORIES_COMMAND = "mkdir -p {quoted_paths} 2>&1"
+REMOVE_FILE_COMMAND = "rm -f '{absolute_file_path}'"
+GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND = "find '{absolute_directory}' -type f"
+# Lists every file inside the given paths, printed as size/epoch/path and terminated by a NUL character
+# The paths are each quoted and separated by a space
+GET_ALL_FILES_WITH_DETAILS_RECURSIVELY_COMMAND = "find {quoted_paths} -type f -printf '%s/%T@/%p\\0'"
+# Lists every file and directory inside a directory, printed as type/path and terminated by a NUL character
+GET_ALL_FILES_AND_DIRECTORIES_RECURSIVELY_COMMAND = "find '{absolute_directory}' -mindepth 1 -printf '%y/%p\\0'"
+RENAME_COMMAND = "mv '{absolute_file_path}' '{absolute_new_file_path}'"
+# Lists every file and directory inside the given paths, and the paths themselves, in the same form as INDEX_ALL_FILES_COMMAND
+# The paths are each quoted and separated by a space
+MIRROR_LIST_COMMAND = "find {quoted_paths} -printf '%y/%s/%T@/%p\\0'"
+# Index commands. Each file is printed as type/size/epoch/path and each directory as epoch/path, terminated by a NUL character
+INDEX_ALL_FILES_COMMAND = "find -L '{absolute_directory}' -printf '%y/%s/%T@/%p\\0'"
+INDEX_ALL_DIRECTORIES_COMMAND = "find -L '{absolute_directory}' -type d -printf '%T@/%p\\0'"
+# Lists every file inside a directory whose name matches the name_predicate (e.g. "-iname '*.jpg' "), in the same form as INDEX_ALL_FILES_COMMAND
+SEARCH_COMMAND = "find -L '{absolute_directory}' -mindepth 1 {name_predicate}-printf '%y/%s/%T@/%p\\0'"
+# The paths are each quoted and separated by a space
+INDEX_DIRECTORY_CONTENTS_COMMAND = "find -L {quoted_paths} -mindepth 1 -maxdepth 1 -printf '%y/%s/%T@/%p\\0'"
+
+# Writes a tar archive of the given files to stdout. Run through adb exec-out, which does not alter the binary output like adb shell can.
+# The file names are each quoted and separated by a space, and are relative to the directory
+TAR_STREAM_COMMAND = "tar -cf - -C '{absolute_directory}' {quoted_file_names}"
+
+ADB_SHELL_SESSION_COUNT = 3
+PULL_WORKER_COUNT = 4
+PULL_RETRY_COUNT = 2
+# If True, a selected directory is pulled with a single adb pull, unless it holds files which need a compatible name on the host
+PULL_DIRECTORIES_AS_TREES = True
+# If True, everything selected is pulled through a single tar stream rather than with adb pull
+PULL_USING_TAR_STREAM = False
+TAR_STREAM_COPY_BUFFER_SIZE = 1048576
+# If True, files which already exist on the host with the same size and date modified are not pulled again
+# This also means a pull which was interrupted will carry on from where it stopped.
+PULL_SKIP_UNCHANGED_FILES = False
+PUSH_WORKER_COUNT = 4
+PUSH_RETRY_COUNT = 2
+# If True, a directory is pushed with a single adb push, otherwise its directories are created with a single command, and its files are pushed one by one
+PUSH_DIRECTORIES_AS_TREES = True
+# If True, a mirror also removes anything from the host which no longer exists on the Android device, see on_mirror
+MIRROR_REMOVE_DELETED_FILES = False
+ADB_SHELL_SESSION_TOKEN_PREFIX = "ADB_FILE_VIEWER_"
+ADB_SHELL_SESSION_READ_SIZE = 65536
+ADB_SHELL_SESSION_FAILED_RETURN_CODE = -1
+ADB_PULL_BYTE_COUNT_PATTERN = re.compile("\\(([0-9]+) bytes in")
+ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE = -2
 
 FILE_LIST_DETAIL_DATE_INDEX = 5
 FILE_LIST_DETAIL_TIME_INDEX = 6
 LS_FILE_BYTE_INDEX = 4
-DIRECTORY_KBYTE_INDEX = 0
+DU_FIELD_SEPARATOR = "\t"
 LS_DETAIL_START_INDEX = 3
 LS_SIMPLE_START_INDEX = 2
+FIND_RECORD_SEPARATOR = b"\0"
+FIND_FIELD_SEPARATOR = "/"
+FIND_FIELD_COUNT = 4
+FIND_DIRECTORY_TYPE = "d"
 
 if CURRENT_OS == "Windows":
     RUNTIME_ADB_COMMAND = ADB_WINDOWS
@@ -163,27 +1008,59 @@ elif CURRENT_OS == "Linux":
     RUNTIME_ADB_COMMAND = ADB_LINUX
     RUNTIME_OPEN_COMMAND = OPEN_FILE_COMMAND_LINUX   
 
-LIST_FILES_COMMAND = RUNTIME_ADB_COMMAND + LIST_FILES_COMMAND
-LIST_FILES_AND_DETAILS_COMMAND = RUNTIME_ADB_COMMAND + LIST_FILES_AND_DETAILS_COMMAND
-GET_FILE_EPOCH_COMMAND = RUNTIME_ADB_COMMAND + GET_FILE_EPOCH_COMMAND
-GET_DIRECTORY_KBYTE_SIZE_COMMAND = RUNTIME_ADB_COMMAND + GET_DIRECTORY_KBYTE_SIZE_COMMAND
-PULL_FILE_COMMAND = RUNTIME_ADB_COMMAND + PULL_FILE_COMMAND
-COPY_COMMAND = RUNTIME_ADB_COMMAND + COPY_COMMAND
-MOVE_COMMAND = RUNTIME_ADB_COMMAND + MOVE_COMMAND
-DELETE_COMMAND = RUNTIME_ADB_COMMAND + DELETE_COMMAND
-OPEN_COMMAND = PULL_FILE_COMMAND + " && " + RUNTIME_OPEN_COMMAND
-CREATE_DIRECTORY_COMMAND = RUNTIME_ADB_COMMAND + CREATE_DIRECTORY_COMMAND
-GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND = RUNTIME_ADB_COMMAND + GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND
-RENAME_COMMAND = RUNTIME_ADB_COMMAND + RENAME_COMMAND
-
 # Constants
 ILLEGAL_WINDOWS_CHARACTERS = ["<", ">", ":", "\"", "/", "\\", "|", "?", "*"]
 LINUX_SHELL_INTERPRETED_SYMBOLS = ["$", "`"]
 WINDOWS_CMD_INTERPRETED_SYMBOLS = ["%"]
 UP_ARROW_STRING = "↑"
+NATURAL_SORT_NUMBER_PATTERN = re.compile("([0-9]+)")
 DOWN_ARROW_STRING = "↓"
 MAX_LIST_LENGTH = 15
+SCROLL_REDRAW_INTERVAL_MS = 16
+SCROLL_WHEEL_ROW_COUNT = 1
+# If True, directory sizes are calculated in the background after the file list has been presented
+DEFER_DIRECTORY_SIZES = False
+DEFERRED_DIRECTORY_SIZE_STRING = "…"
+MAIN_THREAD_CALLBACK_POLL_INTERVAL_MS = 50
+# The background refresh hands files over to the main thread at most once per interval (seconds), reading at most REFRESH_READ_SIZE bytes at a time
+REFRESH_CHUNK_INTERVAL = 0.1
+REFRESH_READ_SIZE = 65536
+ROOT_TITLE = "ADB File Viewer"
+# Directory listings are reused for this many seconds, unless refreshed or changed by this program
+DIRECTORY_LISTING_CACHE_TIME_TO_LIVE = 300
+DIRECTORY_LISTING_CACHE_MAX_ENTRY_COUNT = 64
+DIRECTORY_LISTING_CACHE_MAX_FILE_COUNT = 200000
+ROOT_LOADING_TITLE = ROOT_TITLE + " (Loading...)"
+# Once a directory has been listed and nothing else has run for PREFETCH_DELAY_MS, up to PREFETCH_MAX_DIRECTORY_COUNT of its directories are listed in the background
+PREFETCH_DIRECTORIES = True
+PREFETCH_DELAY_MS = 1000
+PREFETCH_MAX_DIRECTORY_COUNT = 16
+# Prefetch and index commands run at the lowest priority on the device, so they slow down anything else running as little as possible
+BACKGROUND_COMMAND_PREFIX = "nice -n 19 "
+# If True, every file under METADATA_INDEX_ROOT_DIRECTORY is kept in a MetadataIndex per device, stored in METADATA_INDEX_FOLDER
+USE_METADATA_INDEX = False
+METADATA_INDEX_ROOT_DIRECTORY = "/sdcard/"
+METADATA_INDEX_FOLDER = "index"
+# Records are written to the index this many at a time, and changed directories are listed this many at a time
+METADATA_INDEX_BATCH_SIZE = 10000
+METADATA_INDEX_DIRECTORY_BATCH_SIZE = 100
+# The longest list of paths given to a single command. Older devices limit a command's arguments to 128 KiB.
+BATCH_COMMAND_MAX_PATHS_LENGTH = 100000
+# The details of files (e.g. the dates of files which could not be read from ls) are fetched this many at a time
+GET_FILE_DETAILS_BATCH_SIZE = 200
+# A recursive search presents this many results before waiting for the user to scroll to the end of the list
+SEARCH_RESULT_PAGE_SIZE = 500
+ROOT_SEARCHING_TITLE = ROOT_TITLE + " (Searching... {result_count} found)"
+ROOT_SEARCH_PAUSED_TITLE = ROOT_TITLE + " ({result_count} found, scroll down for more)"
+ROOT_SEARCH_COMPLETE_TITLE = ROOT_TITLE + " ({result_count} found)"
 TOOLBAR_BUTTON_SIZE = 60
+# The jobs panel presents this many jobs at once, and is updated once per interval while any job is running
+JOB_PANEL_TITLE = ROOT_TITLE + " - Jobs"
+JOB_PANEL_ROW_COUNT = 10
+JOB_PANEL_UPDATE_INTERVAL_MS = 500
+# e.g. "SM_G973F (R58M12ABCDE)"
+DEVICE_SELECTOR_STRING = "{device_model} ({device_serial})"
+NO_DEVICE_STRING = "No device"
 
 copy_move_state_info_object = None
 
@@ -191,12 +1068,56 @@ current_directory_value = "/sdcard/"
 search_file_field_value = ""
 
 sort_state = SortState.ALPHA
+# If True, numbers in file names are sorted by their value, e.g. "img2" before "img10"
+use_natural_sort = False
 
 file_list_frame = None
+file_list_rows = []
+file_list_scrollbar = None
+pending_scroll_index = None
 current_directory_list = []
+# Changed every time current_directory_list is filled again, so a job which finishes later can tell whether the files it changed are still presented
+current_directory_list_generation = 0
 current_directory_list_index = 0
 selected_files = set()
 filtered_current_directory_list = []
+# The search value, copy/move state and directory that filtered_current_directory_list was filtered with
+filtered_current_directory_list_state = ("", None, None)
+filtered_current_directory_list_is_valid = False
+
+# Device serial to a queue of idle shell sessions for that device, shared by every thread that needs to run a shell command there
+# See get_adb_shell_session_pool. Sessions are only started once they are first used.
+adb_shell_session_pools = {}
+adb_shell_session_pools_lock = threading.Lock()
+
+# Background threads must not touch any UI elements, so they hand their results to the main thread through this queue
+main_thread_callback_queue = queue.Queue()
+refresh_thread_state = None
+
+# None means the only device that is connected. Chosen with the device selector, see on_device_selected.
+current_device_serial = None
+device_selector_variable = None
+device_option_menu = None
+directory_listing_cache = DirectoryListingCache(DIRECTORY_LISTING_CACHE_TIME_TO_LIVE, DIRECTORY_LISTING_CACHE_MAX_ENTRY_COUNT, DIRECTORY_LISTING_CACHE_MAX_FILE_COUNT)
+# Device serial to MetadataIndex, see get_metadata_index
+metadata_indexes = {}
+updated_metadata_index_device_serials = set()
+
+# Device serial to JobQueue
+job_queues = {}
+# The jobs which are yet to finish, on every device, and the most recent ones which have, for the jobs panel to present. Only changed from the main thread.
+job_list = []
+job_panel = None
+job_panel_summary_label = None
+job_panel_rows = []
+job_panel_after_id = None
+
+prefetch_thread_state = None
+prefetch_after_id = None
+# Prefetching only starts once no foreground command (any command the user asked for) is running, and none has run for PREFETCH_DELAY_MS
+foreground_command_count = 0
+last_foreground_command_time = 0
+foreground_command_lock = threading.Lock()
 
 # Toolbar Elements
 SANITISE_EVENT_KEY = "<<sanitise>>"
@@ -212,7 +1133,11 @@ create_directory_button = None
 rename_file_field = None
 rename_file_button = None
 
+find_button = None
 pull_button = None
+mirror_button = None
+push_files_button = None
+push_directory_button = None
 open_button = None
 copy_button = None
 move_button = None
@@ -222,6 +1147,8 @@ delete_button = None
 # Sort Buttons
 file_name_sort_button = None
 FILE_NAME_SORT_BUTTON_STRING = "File Name"
+natural_sort_button = None
+NATURAL_SORT_BUTTON_STRING = "1-10"
 date_time_sort_button = None
 DATE_TIME_SORT_BUTTON_STRING = "Date Time"
 file_size_sort_button = None
@@ -231,11 +1158,8 @@ file_scrollup_button = None
 file_scrolldown_button = None
 #
 
-root = tk.Tk()
-
-root.geometry("1280x788")
-root.title('ADB File Viewer')
-root.resizable(0, 0)
+# Created once the program is run, rather than imported (e.g. by the tests)
+root = None
 
 ####################
 # Initialisations, called once...
@@ -304,6 +1228,7 @@ def create_toolbar_row_0():
 
     search_file_field = tk.Text(toolbar_frame, width=1, height=1)
     search_file_field.bind("<Return>", lambda event : on_enter_in_text_field(search_file_field, on_search))
+    search_file_field.bind("<KeyRelease>", lambda event : on_search_field_changed())
     search_file_confirm_button = tk.Button(toolbar_frame, text="Search", width=1, height=1, command=on_search)    
 
     create_directory_field = tk.Text(toolbar_frame, width=1, height=1)
@@ -347,9 +1272,20 @@ def create_toolbar_row_1():
 
     # A weight of 0 should enforce the size specified
 
-    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=504, weight=0)) # Left-Padding
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=300, weight=0)) # Device
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Scan
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=68, weight=0))
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Find
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
     toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Pull
     toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Mirror
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Push
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Push Dir
+    toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
     toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Open
     toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=8, weight=0))
     toolbar_frame_column_configure_array.append(lambda column_index : toolbar_frame.columnconfigure(column_index, minsize=TOOLBAR_BUTTON_SIZE, weight=0)) # Copy
@@ -368,7 +1304,13 @@ def create_toolbar_row_1():
     toolbar_frame.grid_propagate(0) # Should stop any resizing based on the size of the grid and added widgets
     toolbar_frame.pack()
 
+    global device_selector_variable
+    global device_option_menu
+    global find_button
     global pull_button
+    global mirror_button
+    global push_files_button
+    global push_directory_button
     global open_button
     global copy_button
     global move_button
@@ -380,26 +1322,116 @@ def create_toolbar_row_1():
 
     # Similar logic to above with configuring the widgets by using an array of functions, thereby allowing easy additions and removals
     
+    # The devices are added by on_scan_devices
+    device_selector_variable = tk.StringVar(toolbar_frame, NO_DEVICE_STRING)
+    device_option_menu = tk.OptionMenu(toolbar_frame, device_selector_variable, NO_DEVICE_STRING)
+    device_option_menu.config(width=1, height=1)
+    scan_devices_button = tk.Button(toolbar_frame, text="Scan", width=1, height=1, command=on_scan_devices)
+    find_button = tk.Button(toolbar_frame, text="Find", width=1, height=1, command=on_find)
     pull_button = tk.Button(toolbar_frame, text="Pull", width=1, height=1, command=on_pull)
+    mirror_button = tk.Button(toolbar_frame, text="Mirror", width=1, height=1, command=on_mirror)
+    push_files_button = tk.Button(toolbar_frame, text="Push", width=1, height=1, command=on_push_files)
+    push_directory_button = tk.Button(toolbar_frame, text="Push Dir", width=1, height=1, command=on_push_directory)
     open_button = tk.Button(toolbar_frame, text="Open", width=1, height=1, command=on_open)
     copy_button = tk.Button(toolbar_frame, text="Copy", width=1, height=1, command=lambda : on_copy_or_move(COPY_COMMAND, copy_button, move_button))    
     move_button = tk.Button(toolbar_frame, text="Move", width=1, height=1, command=lambda : on_copy_or_move(MOVE_COMMAND, move_button, copy_button))
     delete_button = tk.Button(toolbar_frame, text="Delete", width=1, height=1, command=on_delete)    
 
-    modify_widget_states(disable_list=[pull_button, open_button, copy_button, move_button, delete_button])
+    modify_widget_states(disable_list=[pull_button, mirror_button, open_button, copy_button, move_button, delete_button])
 
+    configure_widget_array.append(lambda column_index : device_option_menu.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : scan_devices_button.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : find_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : pull_button.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : mirror_button.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : push_files_button.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : push_directory_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : open_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : copy_button.grid(column=column_index, row=0, sticky="nsew"))    
     configure_widget_array.append(lambda column_index : move_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : delete_button.grid(column=column_index, row=0, sticky="nsew"))
 
-    column_index = 1
+    column_index = 0
 
     for configure_widget_function in configure_widget_array:
         configure_widget_function(column_index)
         column_index = column_index + 2 # Skip by 2 as every odd element is padding
 
+# Create a frame to hold a certain amount of files row by row.
+# Every row is created here, once. display_file_list then only changes what each row shows.
+def create_file_list():
+    global file_list_frame
+
+    # Same creation logic as toolbar frame
+    
+    file_list_frame = tk.Frame(root, bg="light blue", width=1280, height=592)
+
+    file_list_frame_column_configure_array = []
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=32, weight=0)) # Icon
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=782, weight=0)) # File Name
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=192, weight=0)) # Date Time
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=96, weight=0)) # File Size
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=16, weight=0))
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=64, weight=0)) # Select Box
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
+    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=24, weight=0)) # Scrollbar
+    
+    column_index = 0
+
+    for file_list_column_configure_function in file_list_frame_column_configure_array:
+        file_list_column_configure_function(column_index)
+        column_index = column_index + 1
+
+    global file_list_scrollbar
+
+    # Spans every row
+    file_list_scrollbar = tk.Scrollbar(file_list_frame, orient="vertical", command=on_file_list_scrollbar)
+    file_list_scrollbar.grid(column=column_index - 1, row=0, rowspan=MAX_LIST_LENGTH * 2 - 1, sticky="ns")
+
+    grid_row_index = 0
+
+    for _ in range(0, MAX_LIST_LENGTH):
+        file_list_rows.append(FileListRow(file_list_frame, grid_row_index))
+        file_list_frame.rowconfigure(grid_row_index, minsize=32, weight=0)
+        grid_row_index = grid_row_index + 1
+        file_list_frame.rowconfigure(grid_row_index, minsize=8, weight=0)
+        grid_row_index = grid_row_index + 1
+
+    file_list_frame.grid_propagate(0)
+    file_list_frame.pack()
+
+# Create the jobs panel, a window of its own which does not stop the user from using the main window
+# It is hidden until the first job is added, and closing it only hides it again.
+def create_job_panel():
+    global job_panel
+    global job_panel_summary_label
+
+    job_panel = tk.Toplevel(root)
+    job_panel.title(JOB_PANEL_TITLE)
+    job_panel.geometry("640x{height}".format(height=(JOB_PANEL_ROW_COUNT + 1) * 32))
+    job_panel.resizable(0, 0)
+    job_panel.protocol("WM_DELETE_WINDOW", job_panel.withdraw)
+    job_panel.withdraw()
+
+    job_panel_frame = tk.Frame(job_panel, width=640, height=(JOB_PANEL_ROW_COUNT + 1) * 32)
+    job_panel_frame.columnconfigure(0, minsize=564, weight=0) # Job Status
+    job_panel_frame.columnconfigure(1, minsize=8, weight=0)
+    job_panel_frame.columnconfigure(2, minsize=68, weight=0) # Cancel
+
+    job_panel_summary_label = tk.Label(job_panel_frame, width=1, height=1, anchor="w")
+    job_panel_summary_label.grid(column=0, row=0, columnspan=3, sticky="nsew")
+    job_panel_frame.rowconfigure(0, minsize=32, weight=0)
+
+    for grid_row_index in range(1, JOB_PANEL_ROW_COUNT + 1):
+        job_panel_rows.append(JobPanelRow(job_panel_frame, grid_row_index))
+        job_panel_frame.rowconfigure(grid_row_index, minsize=32, weight=0)
+
+    job_panel_frame.grid_propagate(0)
+    job_panel_frame.pack()
+
 # A seperator between frames
 
 def create_separator(separation_size, separation_colour_string):
@@ -418,7 +1450,9 @@ def create_sort_bar():
 
     sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=368, weight=0)) # Space
     sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=128, weight=0)) # File Name
-    sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=368, weight=0))
+    sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=4, weight=0))
+    sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=32, weight=0)) # Natural File Name Sort
+    sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=332, weight=0))
     sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=128, weight=0)) # DateTime
     sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=24, weight=0))
     sort_frame_column_configure_array.append(lambda column_index : sort_frame.columnconfigure(column_index, minsize=128, weight=0)) # File Size
@@ -440,6 +1474,7 @@ def create_sort_bar():
     sort_frame.pack()
 
     global file_name_sort_button
+    global natural_sort_button
     global date_time_sort_button
     global file_size_sort_button
     global file_select_or_clear_all_button
@@ -449,6 +1484,7 @@ def create_sort_bar():
     configure_widget_array = []
 
     file_name_sort_button = tk.Button(sort_frame, text=FILE_NAME_SORT_BUTTON_STRING + " " + UP_ARROW_STRING, width=1, height=1, command=on_file_name_sort)
+    natural_sort_button = tk.Button(sort_frame, text=NATURAL_SORT_BUTTON_STRING, width=1, height=1, command=on_natural_sort)
     date_time_sort_button = tk.Button(sort_frame, text=DATE_TIME_SORT_BUTTON_STRING, width=1, height=1, command=on_date_time_sort)
     file_size_sort_button = tk.Button(sort_frame, text=FILE_SIZE_SORT_BUTTON_STRING, width=1, height=1, command=on_file_size_sort)
     file_scrollup_button = tk.Button(sort_frame, text=UP_ARROW_STRING, width=1, height=1, command=on_arrow_up)
@@ -457,6 +1493,7 @@ def create_sort_bar():
     file_select_or_clear_all_button = tk.Button(sort_frame, width=1, height=1, text="*", command=on_select_or_clear_all)
 
     configure_widget_array.append(lambda column_index : file_name_sort_button.grid(column=column_index, row=0, sticky="nsew"))
+    configure_widget_array.append(lambda column_index : natural_sort_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : date_time_sort_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : file_size_sort_button.grid(column=column_index, row=0, sticky="nsew"))
     configure_widget_array.append(lambda column_index : file_select_or_clear_all_button.grid(column=column_index, row=0, sticky="nsew"))
@@ -474,7 +1511,203 @@ def create_sort_bar():
 # General functions, can be called at any point during interactions with the application
 
 # Query the file system for all files
-def get_file_list():
+# Runs on a background thread, handing files over to the main thread in chunks as they are parsed, so the first files can be presented straight away.
+# A single find command returns the type, size, date modified and name of every file in one round trip.
+# The du command used to size directories is started alongside it, so both run at the same time.
+# If the device's find does not support -printf, fall back to the slower ls based listing.
+# If the directory is in the thread's MetadataIndex, it is presented from there straight away, and the listing then replaces it all at once.
+def get_file_list(thread_state):
+    absolute_directory = thread_state.absolute_directory
+    metadata_index = thread_state.metadata_index
+    indexed_file_list = None
+
+    if metadata_index is not None:
+        indexed_file_list = metadata_index.get_file_list(absolute_directory)
+        if indexed_file_list is not None:
+            run_on_main_thread(lambda : refresh_main_thread_action_add_files(thread_state, indexed_file_list))
+
+    # Unless directory sizes are deferred, directories are held back until their sizes are known
+    held_directory_list = []
+    pending_file_list = []
+    listed_file_count = 0
+    # Every file listed by find, in case they need to be written to the index
+    listed_file_list = []
+    last_chunk_time = 0
+    unparsed_output = b""
+
+    def on_directory_size_output(output):
+        directory_size_output.extend(output)
+        return not thread_state.is_interrupted
+
+    def on_file_list_output(output):
+        nonlocal listed_file_count
+        nonlocal unparsed_output
+
+        if thread_state.is_interrupted == True:
+            return False
+
+        unparsed_output = unparsed_output + output
+        # The final record may be incomplete, so keep it back until the rest of it has been read
+        records = unparsed_output.split(FIND_RECORD_SEPARATOR)
+        unparsed_output = records.pop()
+
+        for file_descriptor in parse_file_list_with_details(records, absolute_directory):
+            listed_file_count = listed_file_count + 1
+            listed_file_list.append(file_descriptor)
+            # The indexed files are being presented, so everything is held back until they can all be replaced at once
+            if indexed_file_list is not None:
+                held_directory_list.append(file_descriptor)
+                continue
+            if file_descriptor.is_directory == True:
+                if DEFER_DIRECTORY_SIZES == False:
+                    held_directory_list.append(file_descriptor)
+                    continue
+                file_descriptor.is_size_deferred = True
+            pending_file_list.append(file_descriptor)
+
+        # Hand over the first files immediately, and then at most once every REFRESH_CHUNK_INTERVAL seconds
+        if len(pending_file_list) > 0 and time.monotonic() - last_chunk_time >= REFRESH_CHUNK_INTERVAL:
+            hand_over_pending_files()
+
+        return True
+
+    def hand_over_pending_files():
+        nonlocal pending_file_list
+        nonlocal last_chunk_time
+        run_on_main_thread((lambda file_list : lambda : refresh_main_thread_action_add_files(thread_state, file_list))(pending_file_list))
+        pending_file_list = []
+        last_chunk_time = time.monotonic()
+
+    # The du command runs in its own session at the same time as the find command
+    directory_size_output = bytearray()
+    directory_size_command = GET_CHILD_DIRECTORY_KBYTE_SIZES_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_directory))
+    directory_size_thread_object = threading.Thread(target=run_shell_command, args=(directory_size_command, on_directory_size_output, thread_state))
+    directory_size_thread_object.daemon = True
+    directory_size_thread_object.start()
+
+    command = LIST_FILES_WITH_DETAILS_COMMAND.format(absolute_current_directory=quote_path_correctly_single(absolute_directory))
+    result = run_shell_command(command, on_file_list_output, thread_state)
+
+    if thread_state.is_interrupted == True:
+        return
+
+    # Any output left over is a final record which was not terminated
+    on_file_list_output(FIND_RECORD_SEPARATOR)
+
+    if len(pending_file_list) > 0:
+        hand_over_pending_files()
+
+    # find will return a non-zero code if even one file could not be read, so only fall back if nothing was listed at all
+    if result.returncode != 0 and listed_file_count == 0:
+        # The ls based listing presents files as it goes, so the indexed files have to go first
+        if indexed_file_list is not None:
+            run_on_main_thread(lambda : refresh_main_thread_action_remove_files(thread_state))
+            indexed_file_list = None
+        held_directory_list = get_file_list_from_ls(thread_state)
+    # Directory sizes have not been applied yet, so the index gets the sizes reported by find
+    elif metadata_index is not None:
+        metadata_index.replace_directory_contents(absolute_directory, listed_file_list)
+
+    directory_size_thread_object.join()
+
+    if thread_state.is_interrupted == True:
+        return
+
+    child_directory_byte_sizes = parse_child_directory_byte_sizes(directory_size_output.decode("utf-8", errors="replace"), absolute_directory)
+    if indexed_file_list is not None:
+        run_on_main_thread(lambda : refresh_main_thread_action_reconcile_files(thread_state, held_directory_list, child_directory_byte_sizes))
+    else:
+        run_on_main_thread(lambda : refresh_main_thread_action_set_directory_sizes(thread_state, held_directory_list, child_directory_byte_sizes))
+
+# Turns the NUL separated records of LIST_FILES_WITH_DETAILS_COMMAND into FileDescriptors
+# e.g. [b"d/4096/1700000000.123456789/DCIM", b"f/1050/1700000000.0/test.txt"]
+def parse_file_list_with_details(records, absolute_directory_path):
+    file_list = []
+
+    for record in records:
+        # The name is the last field, and can never contain the field separator, so it is safe to split on every separator
+        record_fields = record.decode("utf-8", errors="replace").split(FIND_FIELD_SEPARATOR)
+
+        if len(record_fields) != FIND_FIELD_COUNT or len(record_fields[3]) == 0:
+            continue
+
+        file_type, file_size, file_epoch, file_name = record_fields
+
+        try:
+            # "1700000000.123456789" -> 1700000000
+            file_list.append(FileDescriptor(file_type == FIND_DIRECTORY_TYPE, file_name, absolute_directory_path, int(float(file_epoch)), int(file_size)))
+        except (ValueError, OverflowError):
+            # Unknown issue, try next file
+            continue
+
+    return file_list
+
+# Returns a dictionary of directory name to size in bytes, for every directory directly inside absolute_directory
+# du in adb appears to only support KB as a minimum size, so to make it compatible with the file constructor which requires bytes, multiply the output by 1000
+def parse_child_directory_byte_sizes(output, absolute_directory):
+    # e.g. "/sdcard/" -> ["sdcard"]
+    parent_path_list = filter_empty_string_elements(absolute_directory.split("/"))
+    child_directory_byte_sizes = {}
+
+    for line in filter_empty_string_elements(output.split("\n")):
+        line_fields = line.split(DU_FIELD_SEPARATOR, 1)
+
+        if len(line_fields) != 2:
+            continue
+
+        # e.g. "/sdcard//DCIM" -> ["sdcard", "DCIM"]
+        child_path_list = filter_empty_string_elements(line_fields[1].split("/"))
+
+        # Skip the line for the directory itself
+        if len(child_path_list) == 0 or child_path_list[:-1] != parent_path_list:
+            continue
+
+        try:
+            child_directory_byte_sizes[child_path_list[-1]] = int(line_fields[0]) * 1000
+        except ValueError:
+            continue
+
+    return child_directory_byte_sizes
+
+# Lists a directory with the same commands as get_file_list, but all at once and at a low priority, for prefetch_directory_listings
+# Returns None if the directory could not be listed, or if prefetching was interrupted
+def get_prefetch_file_list(absolute_directory, thread_state):
+    # Returns an output_callback which collects the output into output_bytes
+    def on_output(output_bytes):
+        def output_callback(output):
+            output_bytes.extend(output)
+            return not thread_state.is_interrupted
+        return output_callback
+
+    file_list_output = bytearray()
+    command = BACKGROUND_COMMAND_PREFIX + LIST_FILES_WITH_DETAILS_COMMAND.format(absolute_current_directory=quote_path_correctly_single(absolute_directory))
+    result = run_shell_command(command, on_output(file_list_output), thread_state, True)
+
+    # The slower ls based listing is not worth running in the background, the directory will simply be listed once it is opened
+    if thread_state.is_interrupted == True or (result.returncode != 0 and len(file_list_output) == 0):
+        return None
+
+    directory_size_output = bytearray()
+    command = BACKGROUND_COMMAND_PREFIX + GET_CHILD_DIRECTORY_KBYTE_SIZES_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_directory))
+    run_shell_command(command, on_output(directory_size_output), thread_state, True)
+
+    if thread_state.is_interrupted == True:
+        return None
+
+    file_list = parse_file_list_with_details(bytes(file_list_output).split(FIND_RECORD_SEPARATOR), absolute_directory)
+    apply_directory_sizes(list(filter(lambda file_descriptor : file_descriptor.is_directory, file_list)), parse_child_directory_byte_sizes(directory_size_output.decode("utf-8", errors="replace"), absolute_directory))
+    return file_list
+
+# Directories which du could not report on (e.g. no read permissions) are left with a size of 0
+def apply_directory_sizes(directory_list, child_directory_byte_sizes):
+    for directory in directory_list:
+        directory.file_size_bytes = child_directory_byte_sizes.get(directory.file_name, 0)
+        directory.is_size_deferred = False
+
+# Query the file system for all files using ls, for devices where find does not support -printf
+# The detailed ls output is matched to the simple ls output by index
+# Files are handed to the main thread, but directories are returned so they can be sized first
+def get_file_list_from_ls(thread_state):
     # Some DateTimes are extended and contain too much information,
     # This will reduce it by removing anything like seconds or miliseconds. e.g. 2000-01-01 23:45:00.087116584 +1100
     # Ensuring that the date time string is of a form like: "2000-01-01 23:45"
@@ -485,216 +1718,264 @@ def get_file_list():
         file_time_unformatted = date_time_string_split_list[time_index].split(".")[0].split(":") 
         file_time = file_time_unformatted[0] + ":" + file_time_unformatted[1] # [23, 45, 00] -> 23:45
         return file_date + " " + file_time # 2000-01-01 23:45
-    
-    current_directory_list.clear()
+
+    absolute_directory = thread_state.absolute_directory
 
     # Run a detailed ls command to retrieve information such as file type, size and date modified
-    command = LIST_FILES_AND_DETAILS_COMMAND.format(absolute_current_directory=quote_path_correctly_outer_double_inner_single(current_directory_value))
-    popup_destructor = create_command_running_popup()
-    result = subprocess.run(command, capture_output=True, text=True, shell=True)
-    print("Command run: {command}".format(command=command))
-    popup_destructor()
+    command = LIST_FILES_AND_DETAILS_COMMAND.format(absolute_current_directory=quote_path_correctly_single(absolute_directory))
+    result = run_shell_command(command, thread_state=thread_state)
     # The first 3 elements after splitting by \n are total size, ".", and "..", none of which we want.
     file_list_details = filter_empty_string_elements(result.stdout.split("\n"))[LS_DETAIL_START_INDEX:]
 
     # Run a simple ls command to just get file names - helps when dealing with a file name that has spaces.
-    command = LIST_FILES_COMMAND.format(absolute_current_directory=quote_path_correctly_outer_double_inner_single(current_directory_value))
-    popup_destructor = create_command_running_popup()
-    result = subprocess.run(command, capture_output=True, text=True, shell=True)
-    print("Command run: {command}".format(command=command))
-    popup_destructor()
+    command = LIST_FILES_COMMAND.format(absolute_current_directory=quote_path_correctly_single(absolute_directory))
+    result = run_shell_command(command, thread_state=thread_state)
     # The first 2 elements after splitting by \n are ".", and "..", none of which we want.
     file_list = filter_empty_string_elements(result.stdout.split("\n"))[LS_SIMPLE_START_INDEX:]
+    new_file_list = []
+    directory_list = []
+    # Files whose date could not be read from ls, as (is_directory, file_name, file_size)
+    unparsed_date_file_list = []
+
+    def add_file(new_file_descriptor):
+        if new_file_descriptor.is_directory == True:
+            directory_list.append(new_file_descriptor)
+        else:
+            new_file_list.append(new_file_descriptor)
     
     for file_index in range(0, len(file_list)):
+        if thread_state.is_interrupted == True:
+            return []
+
         is_directory = False
         file_name = file_list[file_index]
         file_date_time = ""
         file_size = 0
 
-        # The first value in the detailed ls command will be "d" if the file is a directory
-        if file_list_details[file_index][0].lower() == "d":
-            is_directory = True
-
-        # Split the detailed line by all whitespace, remove any empty elements, and then retrieve the size of the file in bytes
-        if is_directory == False:
-            file_size = int(filter_empty_string_elements(file_list_details[file_index].split())[LS_FILE_BYTE_INDEX])
-        else:
-            # If the file is a directory, then the du command has to be used.
-            command = GET_DIRECTORY_KBYTE_SIZE_COMMAND.format(absolute_directory=quote_path_correctly_outer_double_inner_single(current_directory_value + file_list[file_index]))
-            popup_destructor = create_command_running_popup()
-            result = subprocess.run(command, capture_output=True, text=True, shell=True)
-            print("Command run: {command}".format(command=command))
-            popup_destructor()
-            # du in adb appears to only support KB as a minimum size, so to make it compatible with the file constructor which requires bytes, multiply the output by 1000
-            try:
-                file_size = int(filter_empty_string_elements(result.stdout.split())[DIRECTORY_KBYTE_INDEX]) * 1000         
-            except:
-                # Can fail if directory does not have read permissions, so skip directory.
-                continue
-
-        file_date_time = format_date_time_string(file_list_details[file_index], FILE_LIST_DETAIL_DATE_INDEX, FILE_LIST_DETAIL_TIME_INDEX)
+        try:
+            # The first value in the detailed ls command will be "d" if the file is a directory
+            if file_list_details[file_index][0].lower() == "d":
+                is_directory = True
+
+            # Split the detailed line by all whitespace, remove any empty elements, and then retrieve the size of the file in bytes
+            # If the file is a directory, then the du command has to be used, which is done for all directories at once afterwards.
+            if is_directory == False:
+                file_size = int(filter_empty_string_elements(file_list_details[file_index].split())[LS_FILE_BYTE_INDEX])
+        except (IndexError, ValueError):
+            # The detailed line is missing or can't be read, e.g. the directory changed between the two ls commands
+            print("Could not read details of: {path}".format(path=absolute_directory + file_name))
+            continue
 
         try:
-            new_file_descriptor = FileDescriptor(is_directory, file_name, current_directory_value, file_date_time, file_size)
-        except:
-            # The only possible exception here is if the date time extracted from ls was wrong,
+            file_date_time = format_date_time_string(file_list_details[file_index], FILE_LIST_DETAIL_DATE_INDEX, FILE_LIST_DETAIL_TIME_INDEX)
+            file_modified_epoch = parse_date_time_string(file_date_time)
+        except (IndexError, ValueError, OverflowError):
+            # The date time extracted from ls was wrong, e.g. the device prints dates in another format,
             # in which case we can fall back to another command which should work (but is slower)
+            # It is run once for all such files, after every other file has been read
+            unparsed_date_file_list.append((is_directory, file_name, file_size))
+            continue
+
+        add_file(FileDescriptor(is_directory, file_name, absolute_directory, file_modified_epoch, file_size))
+
+    if len(unparsed_date_file_list) > 0:
+        file_modified_epochs = get_file_modified_epochs(list(map(lambda unparsed_date_file : absolute_directory + unparsed_date_file[1], unparsed_date_file_list)), thread_state)
+
+        for is_directory, file_name, file_size in unparsed_date_file_list:
+            # Unknown issue, try next file
+            if absolute_directory + file_name not in file_modified_epochs:
+                continue
+            add_file(FileDescriptor(is_directory, file_name, absolute_directory, file_modified_epochs[absolute_directory + file_name], file_size))
+
+    run_on_main_thread(lambda : refresh_main_thread_action_add_files(thread_state, new_file_list))
+
+    return directory_list
+
+# A faster equivalent of datetime.datetime.strptime(date_time_string, "%Y-%m-%d %H:%M").timestamp(), for the fixed format of format_date_time_string
+# e.g. "2000-01-01 23:45" -> 946730700 (in the host's time zone). Raises ValueError if the string is in any other format.
+def parse_date_time_string(date_time_string):
+    if len(date_time_string) != 16 or date_time_string[4] != "-" or date_time_string[7] != "-" or date_time_string[10] != " " or date_time_string[13] != ":":
+        raise ValueError("Unexpected date time: {date_time_string}".format(date_time_string=date_time_string))
+    return int(datetime.datetime(int(date_time_string[0:4]), int(date_time_string[5:7]), int(date_time_string[8:10]), int(date_time_string[11:13]), int(date_time_string[14:16])).timestamp())
+
+# Returns a dictionary of absolute file path to (is_directory, file_size_bytes, file_modified_epoch), with a single command for every GET_FILE_DETAILS_BATCH_SIZE files
+# Files which could not be read are left out. The commands are run for thread_state, as in run_shell_command.
+# If unchecked_path_list is given, the paths of any command which could not run (e.g. it was interrupted) are added to it,
+# as whether those files exist is not known.
+def get_file_details(absolute_file_path_list, thread_state=None, unchecked_path_list=None):
+    file_details = {}
+
+    for batch_start_index in range(0, len(absolute_file_path_list), GET_FILE_DETAILS_BATCH_SIZE):
+        quoted_paths = " ".join(map(lambda absolute_file_path : "'" + quote_path_correctly_single(absolute_file_path) + "'", absolute_file_path_list[batch_start_index : batch_start_index + GET_FILE_DETAILS_BATCH_SIZE]))
+        result = run_shell_command(GET_FILE_DETAILS_COMMAND.format(quoted_paths=quoted_paths), thread_state=thread_state)
+        if result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE or result.returncode == ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE:
+            if unchecked_path_list is not None:
+                unchecked_path_list.extend(absolute_file_path_list[batch_start_index : batch_start_index + GET_FILE_DETAILS_BATCH_SIZE])
+            continue
+
+        for line in filter_empty_string_elements(result.stdout.split("\n")):
+            # e.g. "1700000000 4 81b0 /sdcard/test file.txt" -> ["1700000000", "4", "81b0", "/sdcard/test file.txt"]
+            line_fields = line.split(" ", 3)
+            if len(line_fields) != 4:
+                continue
             try:
-                command = GET_FILE_EPOCH_COMMAND.format(absolute_file_path=current_directory_value + file_list[file_index])
-                popup_destructor = create_command_running_popup()
-                result = subprocess.run(command, capture_output=True, text=True, shell=True)
-                print("Command run: {command}".format(command=command))
-                popup_destructor()
-                file_date_time_timestamp = int(result.stdout.rstrip())
-                file_date_time = format_date_time_string(str(datetime.datetime.fromtimestamp(file_date_time_timestamp)), 0, 1)
-                new_file_descriptor = FileDescriptor(is_directory, file_name, current_directory_value, file_date_time, file_size)
-            except:
-                # Unknown issue, try next file
+                file_details[line_fields[3]] = (stat.S_ISDIR(int(line_fields[2], 16)), int(line_fields[1]), int(line_fields[0]))
+            except ValueError:
                 continue
 
-        current_directory_list.append(new_file_descriptor)
-        
-# Present all files returned from query    
-# Create a frame to hold a certain amount of files row by row.
-# Frame must be recreated when showing new files (e.g. when scrolling down)    
-def display_file_list():
-    global file_list_frame
+    return file_details
 
-    if file_list_frame is not None:
-        file_list_frame.forget()
-        file_list_frame.destroy()
+# Returns a dictionary of absolute file path to date modified epoch. See get_file_details.
+def get_file_modified_epochs(absolute_file_path_list, thread_state=None, unchecked_path_list=None):
+    file_modified_epochs = {}
+    for absolute_file_path, (is_directory, file_size_bytes, file_modified_epoch) in get_file_details(absolute_file_path_list, thread_state, unchecked_path_list).items():
+        file_modified_epochs[absolute_file_path] = file_modified_epoch
+    return file_modified_epochs
 
-    # Same creation logic as toolbar frame
-    
-    file_list_frame = tk.Frame(root, bg="light blue", width=1280, height=592)
+# Adds files which have been parsed by the background thread and presents them
+def refresh_main_thread_action_add_files(thread_state, file_list):
+    # The user has since moved to another directory or refreshed, so these files are no longer needed
+    if thread_state.is_interrupted == True:
+        return
+    current_directory_list.extend(file_list)
+    redraw()
 
-    file_list_frame_column_configure_array = []
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=32, weight=0)) # Icon
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=782, weight=0)) # File Name
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=192, weight=0)) # Date Time
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=8, weight=0))
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=96, weight=0)) # File Size
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=16, weight=0))
-    file_list_frame_column_configure_array.append(lambda column_index : file_list_frame.columnconfigure(column_index, minsize=64, weight=0)) # Select Box
-    
-    column_index = 0
+# Called once the file list is complete, with any directories that were held back until their size was known
+def refresh_main_thread_action_set_directory_sizes(thread_state, held_directory_list, child_directory_byte_sizes):
+    thread_state.is_complete = True
+    if thread_state.is_interrupted == True:
+        return
+    root.title(ROOT_TITLE)
+    apply_directory_sizes(held_directory_list, child_directory_byte_sizes)
+    # With deferred sizes, the directories are already in the list and only their sizes need updating
+    apply_directory_sizes(list(filter(lambda file_descriptor : file_descriptor.is_directory, current_directory_list)), child_directory_byte_sizes)
+    current_directory_list.extend(held_directory_list)
+    directory_listing_cache.put((thread_state.device_serial, thread_state.absolute_directory), current_directory_list)
+    redraw()
+    schedule_prefetch()
 
-    for file_list_column_configure_function in file_list_frame_column_configure_array:
-        file_list_column_configure_function(column_index)
-        column_index = column_index + 1
+# Called instead of refresh_main_thread_action_set_directory_sizes when the files presented came from the MetadataIndex.
+# Files which are still there keep their FileDescriptor (and so stay selected), taking on the newer size and date modified.
+def refresh_main_thread_action_reconcile_files(thread_state, file_list, child_directory_byte_sizes):
+    thread_state.is_complete = True
+    if thread_state.is_interrupted == True:
+        return
+    root.title(ROOT_TITLE)
+    apply_directory_sizes(list(filter(lambda file_descriptor : file_descriptor.is_directory, file_list)), child_directory_byte_sizes)
+
+    presented_file_descriptors = {}
+    for file_descriptor in current_directory_list:
+        presented_file_descriptors[(file_descriptor.file_name, file_descriptor.is_directory)] = file_descriptor
+
+    reconciled_file_list = []
+    for file_descriptor in file_list:
+        presented_file_descriptor = presented_file_descriptors.pop((file_descriptor.file_name, file_descriptor.is_directory), None)
+        if presented_file_descriptor is None:
+            reconciled_file_list.append(file_descriptor)
+        else:
+            presented_file_descriptor.copy_details(file_descriptor)
+            reconciled_file_list.append(presented_file_descriptor)
 
-    # The current directory list may need to be filtered depending on the state of the program
-    # If the program is in a "Copy/Move file state", then only directories should be presented
-    # If the program is in a "Search file state", only valid files should be presented
-    # If both states are active, then only valid directories should be presented
+    # Files which no longer exist must not stay selected
+    for file_descriptor in presented_file_descriptors.values():
+        if file_descriptor.is_selected == True:
+            file_descriptor.deselect()
 
-    global filtered_current_directory_list
+    current_directory_list[:] = reconciled_file_list
+    directory_listing_cache.put((thread_state.device_serial, thread_state.absolute_directory), current_directory_list)
+    redraw()
+    schedule_prefetch()
 
-    filtered_move_state_directory_list = []
-    filtered_search_file_directory_list = []
+# Removes the files presented from the MetadataIndex, when the directory has to be listed with ls instead
+def refresh_main_thread_action_remove_files(thread_state):
+    if thread_state.is_interrupted == True:
+        return
+    on_unselect_all()
+    current_directory_list.clear()
+    redraw()
 
-    # If in copy/move state, add all unselected directories to the directory list
-    if copy_move_state_info_object is not None:
-        for file_descriptor in current_directory_list:
-            if file_descriptor.is_directory == True:
-                if copy_move_state_info_object.initial_working_directory != current_directory_value or file_descriptor.file_name not in copy_move_state_info_object.file_names:
-                    filtered_move_state_directory_list.append(file_descriptor)
-    # If in search state, add all valid files to the search file list
-    if len(search_file_field_value) > 0:
-        for file_descriptor in current_directory_list:
-            if search_file_field_value.lower() in file_descriptor.file_name.lower():
-                filtered_search_file_directory_list.append(file_descriptor)
-    
-    # If in copy/move state...
-    if copy_move_state_info_object is not None:
-        # and if in search state...
-        if len(search_file_field_value) > 0:
-            # Only keep directories that match the search value
-            filtered_move_state_directory_list = list(filter(lambda search_file_name : search_file_name in filtered_move_state_directory_list, filtered_search_file_directory_list))
-        # Set the filtered directory list to the copy/move state directory list
-        filtered_current_directory_list = filtered_move_state_directory_list
-    # else if in search state
-    elif len(search_file_field_value) > 0:
-        # set the filtered directory list to the search file directory list
-        filtered_current_directory_list = filtered_search_file_directory_list
-    else:
-        # set the filtererd directory list to the normal current directory list
-        filtered_current_directory_list = current_directory_list
+# Present all files returned from query    
+# The rows were all created once by create_file_list, so presenting new files (e.g. when scrolling down) only changes what each row shows
+# The filtered list is only worked out again when something it depends on has changed, so scrolling does not filter every file again
+def display_file_list():
+    global current_directory_list_index
 
-    row_index = 0
+    if filtered_current_directory_list_is_valid == False or filtered_current_directory_list_state != (search_file_field_value, copy_move_state_info_object, current_directory_value):
+        update_filtered_current_directory_list()
 
     # Add the ".." directory to the top of list always. Date and size does not matter.
     # Presents a maximum of MAX_LIST_LENGTH files, starting from current_directory_list_index
     # current_directory_list_index is changed by the scroll up and scroll down buttons
-    for file_descriptor in ([FileDescriptor(True, "..", current_directory_value ,"1970-01-01 11:00", 0)] + filtered_current_directory_list)[current_directory_list_index : current_directory_list_index + MAX_LIST_LENGTH]:
-
-        configure_widget_array = []
-
-        file_icon_button = tk.Label(file_list_frame, text="D" if file_descriptor.is_directory else "F", width=1, height=1)
-
-        # Lambdas which reference a variable in an outer scope bind to the "label", but not the value.
-        # For example, if a new lambda is created every iteration, 
-        # and each lambda binds to an iteration_count variable, 
-        # and there are 10 iterations
-        # and then each lambda is called after the loop is completed, 
-        # then each lambda will get the same value from the index (9), as that is the final value of the iteration_count
+    # The list may have become shorter since it was last presented
+    if current_directory_list_index > get_max_directory_list_index():
+        current_directory_list_index = get_max_directory_list_index()
 
-        # To actually hold the value at the time of lambda creation, a double lambda is required.
-        # The outer lambda must accept the outer scope variable as an argument, 
-        # and then return an inner lambda which references the outer lambda's parameter
-        # The outer lambda should be called immediately, thus returning the desired inner lambda which holds the desired value,
-        # which can then be called when desired.
+    # Only the visible part of the list is copied, as the whole list can hold many thousands of files
+    if current_directory_list_index == 0:
+        visible_file_list = [FileDescriptor(True, "..", current_directory_value, 0, 0)] + filtered_current_directory_list[0 : MAX_LIST_LENGTH - 1]
+    else:
+        visible_file_list = filtered_current_directory_list[current_directory_list_index - 1 : current_directory_list_index - 1 + MAX_LIST_LENGTH]
 
-        # Only directories should be clickable
-        # If directory, clicking will move into that directory
-        if file_descriptor.is_directory == False:
-            file_name_label = tk.Label(file_list_frame, text=file_descriptor.file_name, width=1, height=1)
+    for row_index in range(0, MAX_LIST_LENGTH):
+        if row_index < len(visible_file_list):
+            file_list_rows[row_index].show(visible_file_list[row_index])
         else:
-            # Double lambda for on_directory_clicked so this file is passed to the function correctly
-            file_name_label = tk.Button(file_list_frame, text=file_descriptor.file_name, width=1, height=1, command=(lambda current_file_descriptor : lambda : on_directory_clicked(current_file_descriptor))(file_descriptor))
+            file_list_rows[row_index].hide()
 
-        file_name_label.config(bg="#f0f0f0")
+    update_scroll_widget_states()
 
-        file_datetime_label = tk.Label(file_list_frame, text=file_descriptor.date_time, width=1, height=1)
-        file_filesize_label = tk.Label(file_list_frame, text=file_descriptor.file_size, width=1, height=1)
-        # Double lambda for on_file_select_toggle, so this file and its label are passed to the function correctly
-        file_select_button = tk.Checkbutton(file_list_frame, command=(lambda current_file_descriptor, current_file_name_label : lambda : on_file_select_toggle(current_file_descriptor, current_file_name_label))(file_descriptor, file_name_label), width=1, height=1)
+    # A paused search continues once its results have been scrolled to the end
+    if isinstance(refresh_thread_state, SearchThreadState) and refresh_thread_state.is_paused == True and current_directory_list_index >= get_max_directory_list_index():
+        refresh_thread_state.next_page_event.set()
 
-        # The ".." directory should not be selectable
-        if file_descriptor.file_name == ".." or copy_move_state_info_object is not None:
-            modify_widget_states(disable_list=[file_select_button])
+# The current directory list may need to be filtered depending on the state of the program
+# If the program is in a "Copy/Move file state", then only directories should be presented
+# If the program is in a "Search file state", only valid files should be presented
+# If both states are active, then only valid directories should be presented
+# Both are checked in a single pass over the list, which keeps its order
+def update_filtered_current_directory_list():
+    global filtered_current_directory_list
+    global filtered_current_directory_list_is_valid
+    global filtered_current_directory_list_state
 
-        configure_widget_array.append(lambda column_index : file_icon_button.grid(column=column_index, row=row_index, sticky="nsew"))
-        configure_widget_array.append(lambda column_index : file_name_label.grid(column=column_index, row=row_index, sticky="nsew"))
-        configure_widget_array.append(lambda column_index : file_datetime_label.grid(column=column_index, row=row_index, sticky="nsew"))
-        configure_widget_array.append(lambda column_index : file_filesize_label.grid(column=column_index, row=row_index, sticky="nsew"))
-        configure_widget_array.append(lambda column_index : file_select_button.grid(column=column_index, row=row_index, sticky="nsew"))
+    search_file_key = search_file_field_value.casefold()
+    previous_search_file_key = filtered_current_directory_list_state[0].casefold()
+    previous_state = filtered_current_directory_list_state
+    filtered_current_directory_list_state = (search_file_field_value, copy_move_state_info_object, current_directory_value)
 
-        column_index = 0
+    # Nothing to filter, so present the current directory list as it is
+    if copy_move_state_info_object is None and len(search_file_key) == 0:
+        filtered_current_directory_list = current_directory_list
+        filtered_current_directory_list_is_valid = True
+        return
 
-        for configure_widget_function in configure_widget_array:
-            configure_widget_function(column_index)
-            column_index = column_index + 2
+    # Typing more of the search value can only remove files, so only the files which matched the previous search value need checking
+    if filtered_current_directory_list_is_valid == True and previous_state[1:] == filtered_current_directory_list_state[1:] and len(previous_search_file_key) > 0 and previous_search_file_key in search_file_key:
+        candidate_file_list = filtered_current_directory_list
+    else:
+        candidate_file_list = current_directory_list
 
-        # If a file selection is made, and then a scroll is done, other checkboxes become ticked for some reason. So deselection is done by default
-        file_select_button.deselect()
-        file_descriptor.checkbox_object = file_select_button
+    # Files being copied/moved are not presented in the directory they are being copied/moved from
+    excluded_file_names = set()
+    if copy_move_state_info_object is not None and copy_move_state_info_object.initial_working_directory == current_directory_value:
+        excluded_file_names = set(copy_move_state_info_object.file_names)
 
-        # Useful when the copy/move button is clicked in the same directoy as it started,
-        # Thereby toggling off the copy/move state but presenting to the user what files they still have selected.
-        if file_descriptor.is_selected == True:
-            file_descriptor.select()
+    new_filtered_file_list = []
 
-        file_list_frame.rowconfigure(row_index, minsize=32, weight=0)
-        row_index = row_index + 1
-        file_list_frame.rowconfigure(row_index, minsize=8, weight=0)
-        row_index = row_index + 1
+    for file_descriptor in candidate_file_list:
+        if copy_move_state_info_object is not None and (file_descriptor.is_directory == False or file_descriptor.file_name in excluded_file_names):
+            continue
+        if search_file_key not in file_descriptor.file_name_key:
+            continue
+        new_filtered_file_list.append(file_descriptor)
 
-    file_list_frame.grid_propagate(0)
-    file_list_frame.pack()
+    filtered_current_directory_list = new_filtered_file_list
+    filtered_current_directory_list_is_valid = True
+
+# Called whenever files are added to or removed from current_directory_list, or it is sorted, so the filtered list is worked out again when it is next presented
+def invalidate_filtered_current_directory_list():
+    global filtered_current_directory_list_is_valid
+    filtered_current_directory_list_is_valid = False
 
 # Windows has file name restrictions which have to be considered when pulling a file from Android (Linux)
 def get_compatibility_name(name):
@@ -706,12 +1987,25 @@ def get_compatibility_name(name):
 
     return new_name
 
+# Returns the path on the host of a file relative to the host directory it is pulled into, e.g. for a search result "DCIM/Camera/IMG_1.jpg"
+# On Windows, each name in the path is given its compatible name, rather than the whole path being made into a single name
+def get_host_relative_path(file_name):
+    name_list = filter_empty_string_elements(file_name.split("/"))
+    if CURRENT_OS == "Windows":
+        name_list = list(map(get_compatibility_name, name_list))
+    return os.path.join(*name_list)
+
 # Queries the file system for files in the currently selected directory
 # (Which can be directly specified in the field UI widget)
 # Clears out all selections
 # and presents the files to the user, starting from the top, in their desired sorting style.
-def refresh():
+# The query runs on a background thread, and files are presented as they arrive.
+# If use_cache is True and the directory was listed recently, the files from then are presented instead, without a query.
+# If search_query is given, every file inside the directory matching it is presented instead, see search_files.
+def refresh(use_cache=False, search_query=None):
     global current_directory_value
+    global refresh_thread_state
+    global current_directory_list_generation
     # Get the current directory field value
     current_directory_value = current_directory_field.get("1.0", tkinter.END).replace("\n","").replace("\r","")
     if current_directory_value[-1] != "/":
@@ -722,18 +2016,316 @@ def refresh():
     current_directory_field.insert(tkinter.END, current_directory_value)
     scroll_to_top()
     on_unselect_all()
-    get_file_list()
+    # Any query still running in the background is for the previous directory, so stop it
+    if refresh_thread_state is not None:
+        refresh_thread_state.interrupt()
+    stop_prefetch()
+    current_directory_list.clear()
+    current_directory_list_generation = current_directory_list_generation + 1
+    cached_file_list = directory_listing_cache.get((current_device_serial, current_directory_value)) if use_cache == True and search_query is None else None
+    if cached_file_list is not None:
+        current_directory_list.extend(cached_file_list)
+        root.title(ROOT_TITLE)
     redraw()
     scroll_to_top()
+    if search_query is not None:
+        root.title(ROOT_SEARCHING_TITLE.format(result_count=0))
+        refresh_thread_state = SearchThreadState(current_directory_value, search_query, get_metadata_index(current_device_serial))
+        search_thread_object = threading.Thread(target=search_files, args=(refresh_thread_state,))
+        search_thread_object.daemon = True
+        search_thread_object.start()
+    elif cached_file_list is None:
+        root.title(ROOT_LOADING_TITLE)
+        refresh_thread_state = RefreshThreadState(current_directory_value, get_metadata_index(current_device_serial))
+        refresh_thread_object = threading.Thread(target=get_file_list, args=(refresh_thread_state,))
+        refresh_thread_object.daemon = True
+        refresh_thread_object.start()
+    else:
+        schedule_prefetch()
     # After a refresh, all selections will be cleared out which will disable all interaction buttons including the copy/move button
     # But if we are in a copy/move state, then the copy/move button must remain enabled.
     if copy_move_state_info_object is not None:
         modify_widget_states(enable_list=[copy_move_state_info_object.clicked_button])    
 
+# Called after the contents of a directory have been changed. Removes the cached listing for the directory,
+# and for every directory above it, as they present the size of the directories inside them.
+# If include_subdirectories is True, every cached listing inside the directory is removed too, e.g. when the directory has been deleted.
+# The directory's contents are removed from the MetadataIndex too, so it is not presented from there until it has been listed again.
+# If include_subdirectories is True, the directory itself and everything inside it is removed from the MetadataIndex, as it may no longer exist.
+# device_serial is the device the directory was changed on, which may no longer be the current device
+def invalidate_directory_listing(device_serial, absolute_directory, include_subdirectories=False):
+    if include_subdirectories == True:
+        directory_listing_cache.remove_tree(device_serial, absolute_directory)
+
+    metadata_index = get_metadata_index(device_serial)
+    if metadata_index is not None:
+        if include_subdirectories == True and absolute_directory != "/":
+            metadata_index.remove_tree(absolute_directory)
+        else:
+            metadata_index.remove_directory_contents([absolute_directory])
+
+    # e.g. "/sdcard/DCIM/" -> ["sdcard", "DCIM"] -> "/sdcard/DCIM/", "/sdcard/", "/"
+    directory_path_list = filter_empty_string_elements(absolute_directory.split("/"))
+    for directory_path_length in range(len(directory_path_list), -1, -1):
+        directory_listing_cache.remove((device_serial, "/" + "".join(map(lambda name : name + "/", directory_path_list[:directory_path_length]))))
+
+# True while the files presented are the results of a search (see search_files), rather than the files of the current directory
+def is_showing_search_results():
+    return isinstance(refresh_thread_state, SearchThreadState) and refresh_thread_state.is_interrupted == False
+
+# Called after current_directory_list has been changed in place to match a change made on the device (e.g. on_delete),
+# so the directory does not have to be listed again. The listing is only stored once it is complete, and never for search results.
+def store_current_directory_list():
+    if is_showing_search_results() == True:
+        return
+    if refresh_thread_state is not None and refresh_thread_state.is_interrupted == False and refresh_thread_state.is_complete == False:
+        return
+    directory_listing_cache.put((current_device_serial, current_directory_value), current_directory_list)
+    metadata_index = get_metadata_index(current_device_serial)
+    if metadata_index is not None:
+        metadata_index.replace_directory_contents(current_directory_value, current_directory_list)
+
+# Called once the current directory has been presented. Unless the user does something else in the meantime,
+# the directories inside it are listed in the background after PREFETCH_DELAY_MS, so opening one of them is instant.
+def schedule_prefetch():
+    global prefetch_after_id
+    if PREFETCH_DIRECTORIES == False:
+        return
+    if prefetch_after_id is not None:
+        root.after_cancel(prefetch_after_id)
+    prefetch_after_id = root.after(PREFETCH_DELAY_MS, start_prefetch)
+
+# Directories are listed in the order they are presented, starting from the first one on screen
+def start_prefetch():
+    global prefetch_after_id
+    global prefetch_thread_state
+    prefetch_after_id = None
+
+    # The current directory is still being listed, it will schedule prefetching again once it is done
+    if refresh_thread_state is not None and refresh_thread_state.is_interrupted == False and refresh_thread_state.is_complete == False:
+        return
+
+    # Try again once the foreground commands have finished
+    with foreground_command_lock:
+        if foreground_command_count > 0 or time.monotonic() - last_foreground_command_time < PREFETCH_DELAY_MS / 1000:
+            schedule_prefetch()
+            return
+
+    stop_prefetch()
+
+    # The first row on screen is "..", which is not part of filtered_current_directory_list
+    first_visible_index = max(0, current_directory_list_index - 1)
+    absolute_directory_list = []
+
+    for file_descriptor in filtered_current_directory_list[first_visible_index:] + filtered_current_directory_list[:first_visible_index]:
+        if len(absolute_directory_list) >= PREFETCH_MAX_DIRECTORY_COUNT:
+            break
+        if file_descriptor.is_directory == False:
+            continue
+        absolute_directory = file_descriptor.file_absolute_directory_path + file_descriptor.file_name + "/"
+        if directory_listing_cache.get((current_device_serial, absolute_directory)) is None:
+            absolute_directory_list.append(absolute_directory)
+
+    if len(absolute_directory_list) == 0:
+        return
+
+    prefetch_thread_state = PrefetchThreadState(absolute_directory_list)
+    prefetch_thread_object = threading.Thread(target=prefetch_directory_listings, args=(prefetch_thread_state,))
+    prefetch_thread_object.daemon = True
+    prefetch_thread_object.start()
+
+# Can be called from any thread
+def stop_prefetch():
+    if prefetch_thread_state is not None:
+        prefetch_thread_state.interrupt()
+
+# Foreground commands are counted so that prefetching can wait until they have all finished. Can be called from any thread.
+def begin_foreground_command():
+    global foreground_command_count
+    global last_foreground_command_time
+    with foreground_command_lock:
+        foreground_command_count = foreground_command_count + 1
+        last_foreground_command_time = time.monotonic()
+    stop_prefetch()
+
+def end_foreground_command():
+    global foreground_command_count
+    global last_foreground_command_time
+    with foreground_command_lock:
+        foreground_command_count = foreground_command_count - 1
+        last_foreground_command_time = time.monotonic()
+
+# Runs on a background thread, one directory at a time so that at most one session is ever used for prefetching
+def prefetch_directory_listings(thread_state):
+    for absolute_directory in thread_state.absolute_directory_list:
+        file_list = get_prefetch_file_list(absolute_directory, thread_state)
+        if thread_state.is_interrupted == True:
+            return
+        if file_list is not None:
+            run_on_main_thread((lambda absolute_directory, file_list : lambda : prefetch_main_thread_action_add_listing(thread_state, absolute_directory, file_list))(absolute_directory, file_list))
+    thread_state.is_complete = True
+
+def prefetch_main_thread_action_add_listing(thread_state, absolute_directory, file_list):
+    # A foreground command may have changed the directory since it was listed
+    if thread_state.is_interrupted == True:
+        return
+    directory_listing_cache.put((thread_state.device_serial, absolute_directory), file_list)
+
+# Returns the MetadataIndex of the device, or None if USE_METADATA_INDEX is False. Only called from the main thread.
+def get_metadata_index(device_serial):
+    if USE_METADATA_INDEX == False:
+        return None
+    if device_serial not in metadata_indexes:
+        # e.g. "192.168.0.2:5555" -> "192.168.0.25555.sqlite3", as ":" is not allowed in Windows file names
+        database_file_name = get_compatibility_name(device_serial if device_serial is not None else "default") + ".sqlite3"
+        database_directory_path = os.path.join(os.path.abspath("."), METADATA_INDEX_FOLDER)
+        os.makedirs(database_directory_path, exist_ok=True)
+        metadata_indexes[device_serial] = MetadataIndex(os.path.join(database_directory_path, database_file_name))
+    return metadata_indexes[device_serial]
+
+# Brings the current device's MetadataIndex up to date on a background thread, once per device each time the program is run
+def start_metadata_index_update():
+    metadata_index = get_metadata_index(current_device_serial)
+    if metadata_index is None or current_device_serial in updated_metadata_index_device_serials:
+        return
+    updated_metadata_index_device_serials.add(current_device_serial)
+    metadata_index_thread_object = threading.Thread(target=update_metadata_index, args=(metadata_index, METADATA_INDEX_ROOT_DIRECTORY, CustomThreadState()))
+    metadata_index_thread_object.daemon = True
+    metadata_index_thread_object.start()
+
+# An empty index is filled with a single find command which lists every file under the root directory.
+# Otherwise, only the directories are listed, and the contents of directories whose date modified has changed since they were indexed are listed again.
+# Files which are changed in place (which does not change their directory's date modified) are only updated once their directory is opened.
+# The commands are run for thread_state, as in run_shell_command
+def update_metadata_index(metadata_index, absolute_root_directory, thread_state):
+    start_time = time.monotonic()
+    if metadata_index.is_empty() == True:
+        index_all_files(metadata_index, absolute_root_directory, thread_state)
+    else:
+        index_changed_directories(metadata_index, absolute_root_directory, thread_state)
+    print("Updated the index of {path} in {seconds:.1f} seconds".format(path=absolute_root_directory, seconds=time.monotonic() - start_time))
+
+def index_all_files(metadata_index, absolute_root_directory, thread_state):
+    record_list = []
+    directory_modified_epochs = []
+    unparsed_output = b""
+
+    def on_output(output):
+        nonlocal unparsed_output
+        unparsed_output = unparsed_output + output
+        # The final record may be incomplete, so keep it back until the rest of it has been read
+        records = unparsed_output.split(FIND_RECORD_SEPARATOR)
+        unparsed_output = records.pop()
+        parse_index_records(records, record_list, directory_modified_epochs)
+
+        if len(record_list) >= METADATA_INDEX_BATCH_SIZE:
+            metadata_index.add_records(record_list)
+            record_list.clear()
+        return True
+
+    metadata_index.clear()
+    command = BACKGROUND_COMMAND_PREFIX + INDEX_ALL_FILES_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_root_directory))
+    result = run_shell_command(command, on_output, thread_state, is_background_command=True)
+    on_output(FIND_RECORD_SEPARATOR)
+    metadata_index.add_records(record_list)
+
+    # Without the directories, the index is still empty, so the device will be listed from scratch again next time
+    if result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE:
+        return
+    metadata_index.set_directory_modified_epochs(directory_modified_epochs)
+
+def index_changed_directories(metadata_index, absolute_root_directory, thread_state):
+    indexed_directory_modified_epochs = metadata_index.get_directory_modified_epochs()
+    output = bytearray()
+
+    def on_output(new_output):
+        output.extend(new_output)
+        return True
+
+    command = BACKGROUND_COMMAND_PREFIX + INDEX_ALL_DIRECTORIES_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_root_directory))
+    result = run_shell_command(command, on_output, thread_state, is_background_command=True)
+
+    if result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE:
+        return
+
+    directory_modified_epochs = {}
+
+    for record in filter_empty_string_elements(bytes(output).split(FIND_RECORD_SEPARATOR)):
+        record_fields = record.decode("utf-8", errors="replace").split(FIND_FIELD_SEPARATOR, 1)
+        if len(record_fields) != 2:
+            continue
+        try:
+            directory_modified_epochs[get_absolute_directory_path(record_fields[1])] = int(float(record_fields[0]))
+        except (ValueError, OverflowError):
+            continue
+
+    # Directories outside the root directory were indexed when they were opened, and are left alone
+    removed_directory_list = []
+    for absolute_directory in indexed_directory_modified_epochs.keys():
+        if absolute_directory.startswith(absolute_root_directory) and absolute_directory not in directory_modified_epochs:
+            removed_directory_list.append(absolute_directory)
+    metadata_index.remove_directory_contents(removed_directory_list)
+
+    changed_directory_list = []
+    for absolute_directory, directory_modified_epoch in directory_modified_epochs.items():
+        if indexed_directory_modified_epochs.get(absolute_directory) != directory_modified_epoch:
+            changed_directory_list.append(absolute_directory)
+
+    for batch_start_index in range(0, len(changed_directory_list), METADATA_INDEX_DIRECTORY_BATCH_SIZE):
+        batch_directory_list = changed_directory_list[batch_start_index : batch_start_index + METADATA_INDEX_DIRECTORY_BATCH_SIZE]
+        quoted_paths = " ".join(map(lambda absolute_directory : "'" + quote_path_correctly_single(absolute_directory) + "'", batch_directory_list))
+        output.clear()
+        result = run_shell_command(BACKGROUND_COMMAND_PREFIX + INDEX_DIRECTORY_CONTENTS_COMMAND.format(quoted_paths=quoted_paths), on_output, thread_state, is_background_command=True)
+
+        if result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE:
+            return
+
+        record_list = []
+        # The directories inside are only listed here, not their contents, so their date modified is not recorded
+        parse_index_records(filter_empty_string_elements(bytes(output).split(FIND_RECORD_SEPARATOR)), record_list, [])
+        metadata_index.remove_directory_contents(batch_directory_list)
+        metadata_index.add_records(record_list)
+        metadata_index.set_directory_modified_epochs(list(map(lambda absolute_directory : (absolute_directory, directory_modified_epochs[absolute_directory]), batch_directory_list)))
+
+# Turns the NUL separated records of INDEX_ALL_FILES_COMMAND into MetadataIndex records, which are added to record_list
+# Every directory's (absolute directory path, date modified epoch) is added to directory_modified_epochs
+# e.g. b"d/4096/1700000000.123456789//sdcard/DCIM" -> ("/sdcard/", "DCIM", 1, 4096, 1700000000), ("/sdcard/DCIM/", 1700000000)
+def parse_index_records(records, record_list, directory_modified_epochs):
+    for record in records:
+        # The path is the last field, and is the only one which can contain the field separator
+        record_fields = record.decode("utf-8", errors="replace").split(FIND_FIELD_SEPARATOR, FIND_FIELD_COUNT - 1)
+
+        if len(record_fields) != FIND_FIELD_COUNT:
+            continue
+
+        file_type, file_size, file_epoch, file_path = record_fields
+        absolute_directory_path = get_absolute_directory_path(file_path)
+
+        try:
+            file_modified_epoch = int(float(file_epoch))
+            file_size = int(file_size)
+        except (ValueError, OverflowError):
+            continue
+
+        if file_type == FIND_DIRECTORY_TYPE:
+            directory_modified_epochs.append((absolute_directory_path, file_modified_epoch))
+
+        # The root directory "/" is not inside any other directory
+        if absolute_directory_path == "/":
+            continue
+
+        # e.g. "/sdcard/DCIM/" -> "/sdcard/", "DCIM"
+        parent_directory_path, file_name = absolute_directory_path[:-1].rsplit("/", 1)
+        record_list.append((parent_directory_path + "/", file_name, 1 if file_type == FIND_DIRECTORY_TYPE else 0, file_size, file_modified_epoch))
+
+# find can print paths with repeated or trailing slashes, e.g. "/sdcard//DCIM" -> "/sdcard/DCIM/"
+def get_absolute_directory_path(path):
+    return "/" + "".join(map(lambda name : name + "/", filter_empty_string_elements(path.split("/"))))
+
 # Will not query the file system, will simply do a re-sort and re-draw based on the current configuration
 def redraw():
-    sort_directory_list_by_state()
-    sort_directory_list_by_directory()
+    invalidate_filtered_current_directory_list()
+    sort_current_directory_list()
     display_file_list()    
 
 # Easy way to mass change widget states
@@ -750,29 +2342,51 @@ def modify_field_states(enable_list = [], disable_list = []):
     for field in disable_list:
         field["state"] = "disabled"
 
+# e.g. 1050 -> "1 KB"
+def get_human_readable_size(byte_count):
+    SIZE_PRESENTATIONS = ["B", "KB", "MB", "GB", "TB"]
+    size_index = 0
+    current_size = byte_count
+
+    # Continue to divide the bytes count by 1000 until the value is below 1000
+    # Then select the associated size presentation
+    # e.g., bytes count = 1050, divide by 1000, = 50 KB
+    while current_size >= 1000 and size_index < len(SIZE_PRESENTATIONS) - 1:
+        current_size = int(current_size / 1000)
+        size_index = size_index + 1
+
+    return "{} {}".format(current_size, SIZE_PRESENTATIONS[size_index])
+
 # Sometimes when splitting a string, it produces empty elements in the returned list.
 # This removes them.
 def filter_empty_string_elements(string_array):
     return list(filter(lambda string_element : len(string_element) > 0, string_array))
 
-# Regardless of sorting style, directories should come before files
-def sort_directory_list_by_directory():
-    current_directory_list.sort(key=lambda element : 0 if element.is_directory == False else 1, reverse=True)
+# Sorts current_directory_list based on the sort state. Regardless of sorting style, directories should come before files.
+# Directories and files are each sorted once, by a key which every FileDescriptor already holds.
+# The sort is stable, so files with the same value keep the same order in either direction.
+def sort_current_directory_list():
+    directory_list = []
+    file_list = []
 
-# Based on the enum, sort the current_directory_list appropriately.
-def sort_directory_list_by_state():
-    if sort_state == SortState.ALPHA:
-        current_directory_list.sort(key=lambda element : element.file_name.lower())
-    if sort_state == SortState.ALPHA_REVERSE:
-        current_directory_list.sort(key=lambda element : element.file_name.lower(), reverse=True)
-    if sort_state == SortState.DATE_TIME:
-        current_directory_list.sort(key=lambda element : element.date_time_object)
-    if sort_state == SortState.DATE_TIME_REVERSE:
-        current_directory_list.sort(key=lambda element : element.date_time_object, reverse=True)    
-    if sort_state == SortState.FILE_SIZE:
-        current_directory_list.sort(key=lambda element : element.file_size_bytes)
-    if sort_state == SortState.FILE_SIZE_REVERSE:
-        current_directory_list.sort(key=lambda element : element.file_size_bytes, reverse=True)   
+    for file_descriptor in current_directory_list:
+        if file_descriptor.is_directory == True:
+            directory_list.append(file_descriptor)
+        else:
+            file_list.append(file_descriptor)
+
+    if sort_state == SortState.ALPHA or sort_state == SortState.ALPHA_REVERSE:
+        sort_key = (lambda element : element.get_natural_sort_key()) if use_natural_sort == True else (lambda element : element.file_name_key)
+    elif sort_state == SortState.DATE_TIME or sort_state == SortState.DATE_TIME_REVERSE:
+        sort_key = lambda element : element.file_modified_epoch
+    else:
+        sort_key = lambda element : element.file_size_bytes
+
+    directory_list.sort(key=sort_key, reverse=sort_state in SortState.REVERSE_STATES)
+    file_list.sort(key=sort_key, reverse=sort_state in SortState.REVERSE_STATES)
+
+    # The list is changed in place, as other lists (e.g. filtered_current_directory_list) can refer to it
+    current_directory_list[:] = directory_list + file_list
 
 def on_select_all():
     for file in filtered_current_directory_list:
@@ -787,11 +2401,81 @@ def on_unselect_all(only_filtered_files=False):
             file.deselect()
         selected_files.clear()
 
+# Returns the start of an adb command line for the device, e.g. ["./adb", "-s", "R58M12ABCDE"]
+# With no serial, adb picks the device itself, which only works while a single device is connected
+def get_adb_command(device_serial):
+    if device_serial is None:
+        return [RUNTIME_ADB_COMMAND]
+    return [RUNTIME_ADB_COMMAND, "-s", device_serial]
+
+# Returns the queue of idle AdbShellSessions for the device, which is filled with ADB_SHELL_SESSION_COUNT sessions the first time. Can be called from any thread.
+def get_adb_shell_session_pool(device_serial):
+    with adb_shell_session_pools_lock:
+        if device_serial not in adb_shell_session_pools:
+            adb_shell_session_pool = queue.Queue()
+            for _ in range(ADB_SHELL_SESSION_COUNT):
+                adb_shell_session_pool.put(AdbShellSession(device_serial))
+            adb_shell_session_pools[device_serial] = adb_shell_session_pool
+        return adb_shell_session_pools[device_serial]
+
+# Returns a list of (serial, model) for every device which is connected and ready to run commands, e.g. [("R58M12ABCDE", "SM_G973F")]
+def get_connected_devices():
+    command = get_adb_command(None) + ["devices", "-l"]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError as error:
+        print("Could not list devices: {error}".format(error=error))
+        return []
+    print("Command run: {command}".format(command=" ".join(command)))
+
+    device_list = []
+    # The first line is "List of devices attached"
+    for line in filter_empty_string_elements(result.stdout.split("\n"))[1:]:
+        # e.g. "R58M12ABCDE    device usb:1-1 product:beyond1lte model:SM_G973F device:beyond1 transport_id:1"
+        line_fields = line.split()
+        # Devices which are offline or yet to be authorised can't run commands
+        if len(line_fields) < 2 or line_fields[1] != "device":
+            continue
+        device_model = line_fields[0]
+        for line_field in line_fields[2:]:
+            if line_field.startswith("model:"):
+                device_model = line_field[len("model:"):]
+        device_list.append((line_fields[0], device_model))
+    return device_list
+
+# Runs a device command through the next idle AdbShellSession, waiting for one to become idle if necessary. Can be called from any thread.
+# Returns a subprocess.CompletedProcess, with the output decoded as text unless output_callback is given (see AdbShellSession.run)
+# If thread_state (a CustomThreadState) is given, the command is run on its device, and interrupting it kills the command, which then returns ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE.
+# Otherwise, the command is run on the current device.
+# Background commands (e.g. prefetching, or updating the MetadataIndex) are the only commands which do not stop prefetching.
+def run_shell_command(command, output_callback=None, thread_state=None, is_background_command=False):
+    if is_background_command == False:
+        begin_foreground_command()
+    adb_shell_session_pool = get_adb_shell_session_pool(thread_state.device_serial if thread_state is not None else current_device_serial)
+    adb_shell_session = adb_shell_session_pool.get()
+    try:
+        if thread_state is not None and thread_state.add_running_command(adb_shell_session.close) == False:
+            result = subprocess.CompletedProcess(command, ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE, b"")
+        else:
+            result = adb_shell_session.run(command, output_callback)
+            # The session was killed by the interruption, rather than dying by itself
+            if thread_state is not None and thread_state.is_interrupted == True and result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE:
+                result.returncode = ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE
+    finally:
+        if thread_state is not None:
+            thread_state.remove_running_command(adb_shell_session.close)
+        adb_shell_session_pool.put(adb_shell_session)
+        if is_background_command == False:
+            end_foreground_command()
+    print("Command run: {command}".format(command=command))
+    result.stdout = result.stdout.decode("utf-8", errors="replace")
+    return result
+
 # This function is called for adb shell commands dealing with a path
-def quote_path_correctly_outer_double_inner_single(path):
-    return quote_path_correctly_outer_double(path).replace("'", "'\\''")
+def quote_path_correctly_single(path):
+    return path.replace("'", "'\\''")
 
-# This function is called for some adb non-shell commands like adb pull
+# This function is called for commands run through the host shell, like RUNTIME_OPEN_COMMAND
 def quote_path_correctly_outer_double(path):
     corrected_path = path.replace("\"", "\\\"")
     
@@ -805,9 +2489,73 @@ def quote_path_correctly_outer_double(path):
 def scroll_to_top():
     global current_directory_list_index
     current_directory_list_index = 0
-    # Arrowing down and up will correctly set the states of the up and down arrow.
-    on_arrow_down()
-    on_arrow_up()
+    update_scroll_widget_states()
+
+# The largest index which still fills the view. The ".." directory is always the first row.
+def get_max_directory_list_index():
+    return max(0, len(filtered_current_directory_list) + 1 - MAX_LIST_LENGTH)
+
+# Moves the view so it starts from new_index, which is kept within the list, and presents it straight away
+def scroll_to_index(new_index):
+    global current_directory_list_index
+
+    new_index = min(max(new_index, 0), get_max_directory_list_index())
+
+    if new_index != current_directory_list_index:
+        current_directory_list_index = new_index
+        display_file_list()
+    else:
+        update_scroll_widget_states()
+
+# Scroll wheels and the scrollbar can produce many events in a short time.
+# Rather than presenting every one of them, only the latest position is presented, once every SCROLL_REDRAW_INTERVAL_MS
+def request_scroll_to_index(new_index):
+    global pending_scroll_index
+
+    if pending_scroll_index is None:
+        root.after(SCROLL_REDRAW_INTERVAL_MS, apply_pending_scroll)
+
+    pending_scroll_index = min(max(new_index, 0), get_max_directory_list_index())
+
+# Relative to any scroll which is still waiting to be presented
+def request_scroll_by(row_count):
+    request_scroll_to_index((current_directory_list_index if pending_scroll_index is None else pending_scroll_index) + row_count)
+
+def apply_pending_scroll():
+    global pending_scroll_index
+    new_index = pending_scroll_index
+    pending_scroll_index = None
+    if new_index is not None:
+        scroll_to_index(new_index)
+
+# Enables or disables the up and down arrows based on the current position in the list, without scrolling, and moves the scrollbar to match
+def update_scroll_widget_states():
+    if current_directory_list_index == 0:
+        modify_widget_states(disable_list=[file_scrollup_button])
+    else:
+        modify_widget_states(enable_list=[file_scrollup_button])
+
+    if current_directory_list_index + MAX_LIST_LENGTH > len(filtered_current_directory_list):
+        modify_widget_states(disable_list=[file_scrolldown_button])
+    else:
+        modify_widget_states(enable_list=[file_scrolldown_button])
+
+    # e.g. 100 files plus "..", starting from file 10, shows 10/101 to 25/101 of the list
+    row_count = len(filtered_current_directory_list) + 1
+    file_list_scrollbar.set(current_directory_list_index / row_count, min(current_directory_list_index + MAX_LIST_LENGTH, row_count) / row_count)
+
+# Called by the scrollbar when it is dragged ("moveto", fraction), or when its arrows or trough are clicked ("scroll", count, "units" or "pages")
+def on_file_list_scrollbar(action, value, unit=None):
+    if action == "moveto":
+        request_scroll_to_index(round(float(value) * (len(filtered_current_directory_list) + 1)))
+    elif action == "scroll":
+        request_scroll_by(int(value) * (MAX_LIST_LENGTH - 1 if unit == "pages" else 1))
+
+# Page up, page down, home and end jump around the list, unless they are being used to move around a text field
+def on_scroll_key(event, new_index_function):
+    if isinstance(event.widget, tk.Text):
+        return
+    request_scroll_to_index(new_index_function())
 
 # Removes any up or down arrows in the sorting button text
 def set_default_sort_button_names():
@@ -830,7 +2578,10 @@ def on_file_select_toggle(file_descriptor, file_name_label):
         except:
             pass
         selected_files.add(file_descriptor)
-        modify_widget_states(enable_list=[pull_button, open_button, copy_button, move_button, delete_button])
+        modify_widget_states(enable_list=[pull_button, mirror_button, open_button, delete_button])
+        # Search results are named by their path inside the searched directory, which a copy/move would give to the new file
+        if is_showing_search_results() == False:
+            modify_widget_states(enable_list=[copy_button, move_button])
     else:
         try:
             file_name_label.config(bg="#f0f0f0")
@@ -841,55 +2592,19 @@ def on_file_select_toggle(file_descriptor, file_name_label):
         except:
             pass
         if len(selected_files) == 0:
-            modify_widget_states(disable_list=[pull_button, open_button, copy_button, move_button, delete_button])
+            modify_widget_states(disable_list=[pull_button, mirror_button, open_button, copy_button, move_button, delete_button])
 
     update_rename_field_and_state()
 
 # Increases the current_directory_list_index if necessary.
 # Arrow down button should only be clickable if there are more files out of view.
 def on_arrow_down():
-    global current_directory_list_index
-
-    def set_correct_button_state():
-        if current_directory_list_index + MAX_LIST_LENGTH > len(filtered_current_directory_list):
-            modify_widget_states(disable_list=[file_scrolldown_button])
-            return False
-        else:
-            modify_widget_states(enable_list=[file_scrolldown_button])
-            return True
-
-    # If there exists more files out of view...
-    if set_correct_button_state() == True:
-        # Increase the index by 1 to get the next file
-        current_directory_list_index = current_directory_list_index + 1
-        # By increasing the index, we have now scrolled down, so the scroll up button must be enabled
-        modify_widget_states(enable_list=[file_scrollup_button])
-        # re-run the check, which will then disable the scroll down button if we have now scrolled as far as possible.
-        set_correct_button_state()
-        display_file_list()
+    scroll_to_index(current_directory_list_index + 1)
 
 # Decreases the current_directory_list_index if necessary.
 # Arrow up button should only be clickable if the index is greater than 0
 def on_arrow_up():
-    global current_directory_list_index
-
-    def set_correct_button_state():
-        if current_directory_list_index == 0:
-            modify_widget_states(disable_list=[file_scrollup_button])
-            return False
-        else:
-            modify_widget_states(enable_list=[file_scrollup_button])
-            return True
-
-    # If there exists more files out of view...
-    if set_correct_button_state() == True:
-        # Decrease the index by 1 to get the next file
-        current_directory_list_index = current_directory_list_index - 1
-        # By decreasing the index, we have now scrolled up, so the scroll down button must be enabled
-        modify_widget_states(enable_list=[file_scrolldown_button])
-        # re-run the check, which will then disable the scroll up button if we have now scrolled as far as possible.
-        set_correct_button_state()
-        display_file_list()
+    scroll_to_index(current_directory_list_index - 1)
 
 # Updates the file name sort button
 def on_file_name_sort():
@@ -908,6 +2623,21 @@ def on_file_name_sort():
 
     redraw()
 
+# Toggles whether numbers in file names are sorted by their value, and sorts by file name
+def on_natural_sort():
+    global sort_state
+    global use_natural_sort
+
+    use_natural_sort = not use_natural_sort
+    natural_sort_button.config(relief="sunken" if use_natural_sort == True else "raised")
+
+    if sort_state != SortState.ALPHA and sort_state != SortState.ALPHA_REVERSE:
+        set_default_sort_button_names()
+        sort_state = SortState.ALPHA
+        file_name_sort_button.config(text=FILE_NAME_SORT_BUTTON_STRING + " " + UP_ARROW_STRING)
+
+    redraw()
+
 # Updates the date time sort button
 def on_date_time_sort():
     global sort_state
@@ -968,7 +2698,7 @@ def on_directory_clicked(file_descriptor):
     current_directory_field.delete(1.0, tkinter.END)
     current_directory_field.insert(tkinter.END, current_directory_value)
     current_directory_list_index = 0
-    refresh()
+    refresh(use_cache=True)
 
 # Filters the list of known files. Does not do a new query.
 def on_search():
@@ -978,35 +2708,275 @@ def on_search():
     display_file_list()
     scroll_to_top()
 
+# Filters the list as the search value is typed, rather than only once the search button is clicked
+def on_search_field_changed():
+    if search_file_field.get("1.0", tkinter.END).replace("\n","").replace("\r","") != search_file_field_value:
+        on_search()
+
+# Fills the device selector with every connected device. The current device stays selected if it is still connected,
+# otherwise the first device is selected.
+def on_scan_devices():
+    device_list = get_connected_devices()
+    device_menu = device_option_menu["menu"]
+    device_menu.delete(0, tkinter.END)
+
+    current_device_label = None
+    for device_serial, device_model in device_list:
+        device_label = DEVICE_SELECTOR_STRING.format(device_model=device_model, device_serial=device_serial)
+        device_menu.add_command(label=device_label, command=(lambda device_serial, device_label : lambda : on_device_selected(device_serial, device_label))(device_serial, device_label))
+        if device_serial == current_device_serial:
+            current_device_label = device_label
+
+    if current_device_label is not None:
+        device_selector_variable.set(current_device_label)
+    elif len(device_list) > 0:
+        on_device_selected(device_list[0][0], DEVICE_SELECTOR_STRING.format(device_model=device_list[0][1], device_serial=device_list[0][0]))
+    else:
+        device_selector_variable.set(NO_DEVICE_STRING)
+
+# Presents the current directory of the newly selected device. Jobs already added for the previous device carry on in the background.
+def on_device_selected(device_serial, device_label):
+    global current_device_serial
+    global copy_move_state_info_object
+
+    device_selector_variable.set(device_label)
+    if device_serial == current_device_serial:
+        return
+    current_device_serial = device_serial
+
+    # Files can't be copied or moved from one device to another
+    if copy_move_state_info_object is not None:
+        copy_move_state_info_object = None
+        modify_widget_states(disable_list=[copy_button, move_button])
+
+    refresh(use_cache=True)
+    start_metadata_index_update()
+
+# Searches every file inside the current directory, using the search field as a SearchQuery. See SearchThreadState.
+# The results replace the file list, named by their path inside the current directory, so pull, mirror and delete work on them as usual.
+# Rename, copy and move are not available for search results, see on_file_select_toggle.
+def on_find():
+    global search_file_field_value
+
+    query = search_file_field.get("1.0", tkinter.END).replace("\n","").replace("\r","")
+
+    try:
+        search_query = SearchQuery(query)
+    except (re.error, ValueError) as error:
+        print("Invalid search: {error}".format(error=error))
+        return
+
+    # The results are already filtered by the query, so the field is cleared to match, and can then filter the results further
+    search_file_field.delete(1.0, tkinter.END)
+    search_file_field_value = ""
+    refresh(search_query=search_query)
+
+# Runs on a background thread. The search is answered by the MetadataIndex if it holds the directory,
+# otherwise by a find command on the device, which only returns files matching the name pattern.
+# Every other part of the query is checked here, as not every device's find supports it.
+# Results are presented a page at a time. Results beyond the current page are kept here until the user scrolls down for them,
+# and the find command is never kept waiting for that, so its shell session is given back as soon as the find is done.
+def search_files(thread_state):
+    absolute_directory = thread_state.absolute_directory
+    search_query = thread_state.search_query
+    matched_file_list = []
+    last_chunk_time = 0
+    unparsed_output = b""
+
+    # Returns False once the search has been interrupted
+    def add_records(record_list, is_waiting_allowed):
+        for parent_directory_path, file_name, is_directory, file_size, file_modified_epoch in record_list:
+            if search_query.matches(file_name, file_size, file_modified_epoch) == False:
+                continue
+            # e.g. "/sdcard/DCIM/Camera/" + "IMG_1.jpg" -> "DCIM/Camera/IMG_1.jpg", for a search of "/sdcard/"
+            matched_file_list.append(FileDescriptor(is_directory == 1, (parent_directory_path + file_name)[len(absolute_directory):], absolute_directory, file_modified_epoch, file_size))
+
+        return hand_over_matched_files(is_waiting_allowed)
+
+    # Presents as many of the matched files as fit in the current page.
+    # Once the page is full, the rest are kept until the user scrolls down, which is only waited for if is_waiting_allowed is True.
+    def hand_over_matched_files(is_waiting_allowed):
+        nonlocal matched_file_list
+        nonlocal last_chunk_time
+        while len(matched_file_list) > 0 and thread_state.is_interrupted == False:
+            page_space = thread_state.result_limit - thread_state.result_count
+            if page_space <= 0:
+                # The user may already have scrolled down while the find was still running
+                if is_waiting_allowed == False and thread_state.next_page_event.is_set() == False:
+                    return True
+                if wait_for_next_search_page(thread_state) == False:
+                    return False
+                continue
+            # While the find is running, files are presented in chunks rather than one at a time
+            if is_waiting_allowed == False and len(matched_file_list) < page_space and time.monotonic() - last_chunk_time < REFRESH_CHUNK_INTERVAL:
+                return True
+            file_list = matched_file_list[:page_space]
+            matched_file_list = matched_file_list[page_space:]
+            last_chunk_time = time.monotonic()
+            hand_over_search_results(thread_state, file_list)
+
+        return not thread_state.is_interrupted
+
+    def on_output(output):
+        nonlocal unparsed_output
+        unparsed_output = unparsed_output + output
+        # The final record may be incomplete, so keep it back until the rest of it has been read
+        records = unparsed_output.split(FIND_RECORD_SEPARATOR)
+        unparsed_output = records.pop()
+        record_list = []
+        parse_index_records(records, record_list, [])
+        return add_records(record_list, False)
+
+    indexed_record_list = None
+    if thread_state.metadata_index is not None:
+        indexed_record_list = thread_state.metadata_index.get_records_inside(absolute_directory)
+
+    if indexed_record_list is not None:
+        # Added a page at a time, so the search can wait between pages
+        for record_start_index in range(0, len(indexed_record_list), SEARCH_RESULT_PAGE_SIZE):
+            if add_records(indexed_record_list[record_start_index : record_start_index + SEARCH_RESULT_PAGE_SIZE], True) == False:
+                return
+    else:
+        name_predicate = ""
+        if search_query.name_pattern is not None:
+            name_predicate = "-iname '" + quote_path_correctly_single(search_query.name_pattern) + "' "
+        command = SEARCH_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_directory), name_predicate=name_predicate)
+        run_shell_command(command, on_output, thread_state)
+
+        if thread_state.is_interrupted == True:
+            return
+        on_output(FIND_RECORD_SEPARATOR)
+
+    if hand_over_matched_files(True) == False:
+        return
+
+    run_on_main_thread(lambda : search_main_thread_action_complete(thread_state))
+
+# Presents the results. Once the current page is full, the search is paused until the user has scrolled to the end of the list.
+def hand_over_search_results(thread_state, file_list):
+    run_on_main_thread(lambda : refresh_main_thread_action_add_files(thread_state, file_list))
+    thread_state.result_count = thread_state.result_count + len(file_list)
+
+    if thread_state.result_count < thread_state.result_limit:
+        run_on_main_thread(lambda : search_main_thread_action_set_title(thread_state, ROOT_SEARCHING_TITLE))
+    else:
+        thread_state.is_paused = True
+        run_on_main_thread(lambda : search_main_thread_action_set_title(thread_state, ROOT_SEARCH_PAUSED_TITLE))
+
+# Waits until the user has scrolled to the end of the list, and then makes room for another page of results
+# Returns False if the search was interrupted while waiting
+def wait_for_next_search_page(thread_state):
+    while thread_state.next_page_event.wait(REFRESH_CHUNK_INTERVAL) == False:
+        if thread_state.is_interrupted == True:
+            return False
+
+    thread_state.next_page_event.clear()
+    thread_state.result_limit = thread_state.result_count + SEARCH_RESULT_PAGE_SIZE
+    thread_state.is_paused = False
+    run_on_main_thread(lambda : search_main_thread_action_set_title(thread_state, ROOT_SEARCHING_TITLE))
+    return not thread_state.is_interrupted
+
+def search_main_thread_action_set_title(thread_state, title):
+    if thread_state.is_interrupted == True:
+        return
+    root.title(title.format(result_count=thread_state.result_count))
+
+def search_main_thread_action_complete(thread_state):
+    thread_state.is_complete = True
+    search_main_thread_action_set_title(thread_state, ROOT_SEARCH_COMPLETE_TITLE)
+
 # Creates a new directory in the current directory
 def on_create_directory():
     # Remove any accidental slashes so there's no path ambiguity
     new_directory_name = create_directory_field.get("1.0", tkinter.END).split("/")[0].replace("\n","").replace("\r","")
-    command = CREATE_DIRECTORY_COMMAND.format(absolute_directory=quote_path_correctly_outer_double_inner_single(current_directory_value + new_directory_name))
-    popup_destructor = create_command_running_popup()
-    subprocess.run(command, shell=True)
-    print("Command run: {command}".format(command=command))
-    popup_destructor()
+    absolute_new_directory_path = current_directory_value + new_directory_name
+    command = CREATE_DIRECTORY_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_new_directory_path))
     create_directory_field.delete(1.0, tkinter.END)
-    refresh()
+
+    # The directory is presented straight away, rather than listing the whole directory again afterwards
+    # mkdir -p leaves a directory which is already there as it is
+    new_directory_descriptor = None
+    if len(new_directory_name) > 0 and is_showing_search_results() == False and any(map(lambda file_descriptor : file_descriptor.file_name == new_directory_name, current_directory_list)) == False:
+        new_directory_descriptor = FileDescriptor(True, new_directory_name, current_directory_value, int(time.time()), 0)
+        current_directory_list.append(new_directory_descriptor)
+        redraw()
+
+    absolute_directory = current_directory_value
+    directory_list_generation = current_directory_list_generation
+    file_modified_epochs = {}
+
+    def create_directory_job_action(job):
+        run_shell_command(command, thread_state=job)
+        file_modified_epochs.update(get_file_modified_epochs([absolute_new_directory_path], job))
+        if absolute_new_directory_path in file_modified_epochs:
+            job.add_progress(1)
+        else:
+            print("Could not create directory: {path}".format(path=absolute_new_directory_path))
+            job.add_progress(0, failed_count=1)
+
+    def create_directory_job_complete(job):
+        invalidate_directory_listing(job.device_serial, absolute_directory)
+        # The user has since moved to another directory, which will be listed again when they come back
+        if directory_list_generation != current_directory_list_generation:
+            return
+        if new_directory_descriptor is not None:
+            if absolute_new_directory_path in file_modified_epochs:
+                new_directory_descriptor.file_modified_epoch = file_modified_epochs[absolute_new_directory_path]
+            else:
+                current_directory_list.remove(new_directory_descriptor)
+        store_current_directory_list()
+        redraw()
+
+    add_job(Job("Create {name}".format(name=new_directory_name), create_directory_job_action, create_directory_job_complete))
 
 # Pulls every selected file to the host computer
 # If a directory is selected, the directory structure is created on the host computer first, 
 # and then files are are pulled into that structure appropriately
-def on_pull():
+# Files are pulled by a job, and on_complete is called on the main thread once every file has been pulled, unless the job was cancelled
+def on_pull(on_complete=None):
+    # The user can move to another directory or change the selection while the job waits and runs
+    absolute_pull_directory = current_directory_value
+    pull_file_list = list(selected_files)
+
+    def pull_job_complete(job):
+        if on_complete is not None and job.state != JobState.CANCELLED:
+            on_complete()
+
+    if PULL_USING_TAR_STREAM == True:
+        pull_job_action = lambda job : run_tar_stream_pull(absolute_pull_directory, pull_file_list, job)
+    else:
+        pull_job_action = lambda job : run_pull_tasks(get_pull_tasks(absolute_pull_directory, pull_file_list, job), job)
+
+    add_job(Job("Pull {file_count} file(s)".format(file_count=len(pull_file_list)), pull_job_action, pull_job_complete))
+
+# Works out the PullTasks needed to pull every file in pull_file_list, which are inside absolute_pull_directory, creating the directories they need on the host
+# Runs on the job thread. Any listing still running is killed if the job is cancelled, in which case no tasks are returned.
+def get_pull_tasks(absolute_pull_directory, pull_file_list, job):
     file_pull_list = []
+    pull_task_list = []
+    # Each directory on the host only needs to be created once, no matter how many files are pulled into it
+    new_host_directory_path_set = set()
+
+    if PULL_SKIP_UNCHANGED_FILES == True:
+        remote_file_list = get_remote_file_details_recursively(list(map(lambda file : absolute_pull_directory + file.file_name, pull_file_list)), job)
+        if job.is_interrupted == True:
+            return []
+        add_changed_file_pull_tasks(absolute_pull_directory, remote_file_list, pull_task_list, new_host_directory_path_set)
+        return pull_task_list
 
     # If the file is not a directory, then no special processing is required.
-    for file in selected_files:
+    for file in pull_file_list:
+        if job.is_interrupted == True:
+            return []
         if file.is_directory == False:
             file_pull_list.append(file)
+        # Else, pull the whole directory at once where possible
+        elif PULL_DIRECTORIES_AS_TREES == True and add_directory_tree_pull_tasks(absolute_pull_directory, absolute_pull_directory + file.file_name + "/", pull_task_list, file_pull_list, new_host_directory_path_set, job) == True:
+            continue
         # Else, get all files in this directory
         else:
-            command = GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND.format(absolute_directory=quote_path_correctly_outer_double_inner_single(current_directory_value + file.file_name + "/"))
-            popup_destructor = create_command_running_popup()
-            result = subprocess.run(command, capture_output=True, text=True, shell=True)
-            print("Command run: {command}".format(command=command))
-            popup_destructor()
+            command = GET_ALL_FILES_IN_DIRECTORY_RECURSIVELY_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_pull_directory + file.file_name + "/"))
+            result = run_shell_command(command, thread_state=job)
             sub_file_list = filter_empty_string_elements(result.stdout.split("\n"))
             for sub_file in sub_file_list:
                 # e.g. "/sdcard/TestDirectory/test.txt" -> ["sdcard", "TestDirectory", "test.txt"]
@@ -1015,63 +2985,650 @@ def on_pull():
                 sub_file_name = sub_file_path_list[-1]
                 # ["sdcard", "TestDirectory", "test.txt"] -> "/sdcard/TestDirectory/"
                 sub_file_absolute_directory_path = "/" + '/'.join(sub_file_path_list[:-1]) + "/"
-                sub_file_descriptor = FileDescriptor(False, sub_file_name, sub_file_absolute_directory_path, "1970-01-01 00:00", 0)
+                sub_file_descriptor = FileDescriptor(False, sub_file_name, sub_file_absolute_directory_path, 0, 0)
                 file_pull_list.append(sub_file_descriptor)
 
+    if job.is_interrupted == True:
+        return []
+
     # For each identified file that has been selected directly or indirectly...
     for file in file_pull_list:
         # Choose the name of the file that will be used on the host computer
-        file_name_on_host = file.file_name if CURRENT_OS != "Windows" else file.file_name_compat
+        file_name_on_host = get_host_relative_path(file.file_name)
 
-        # If the file is not in the current directory path, then it must be inside one of the selected directories...
+        # If the file is not in the pulled directory, then it must be inside one of the selected directories...
         # Which means the directory structure will need to be created on the host first
-        if file.file_absolute_directory_path != current_directory_value:
-            # e.g. "/sdcard/TestDirectory" -> "TestDirectory/"
-            new_host_directory_path = file.file_absolute_directory_path.replace(current_directory_value, "")
-            # ["TestDirectory"]
-            new_host_directory_path = filter_empty_string_elements(new_host_directory_path.split("/"))
-
-            # If using Windows, compatible directory names must be used when creating the structure on the host.
-            if CURRENT_OS == "Windows":
-                for directory_name_index in range(0, len(new_host_directory_path)):
-                    new_host_directory_path[directory_name_index] = get_compatibility_name(new_host_directory_path[directory_name_index])
-
-            # e.g. ["TestDirectory"] -> /my_programs/adb_file_viewer/output/TestDirectory/
-            new_host_directory_path = os.path.join(os.path.abspath("."), OUTPUT_FOLDER, *new_host_directory_path) + "/"
-            os.makedirs(new_host_directory_path, exist_ok=True)
+        if file.file_absolute_directory_path != absolute_pull_directory:
+            new_host_directory_path = get_host_directory_path(absolute_pull_directory, file.file_absolute_directory_path)
+            new_host_directory_path_set.add(new_host_directory_path)
             # "test.txt" -> /my_programs/adb_file_viewer/TestDirectory/test.txt
             absolute_file_path_on_host = new_host_directory_path + file_name_on_host
         else:
             absolute_file_path_on_host = os.path.join(os.path.abspath("."), OUTPUT_FOLDER, file_name_on_host)
+            # A search result is named by its path inside the pulled directory, whose directories are created the same way
+            new_host_directory_path_set.add(os.path.dirname(absolute_file_path_on_host))
+
+        pull_task_list.append(PullTask(file.file_absolute_directory_path + file.file_name, absolute_file_path_on_host))
+
+    for new_host_directory_path in new_host_directory_path_set:
+        os.makedirs(new_host_directory_path, exist_ok=True)
+
+    return pull_task_list
+
+# Gets the size and date modified of every file inside the given paths on the Android device, using a single find command
+# Returns a list of tuples of (absolute directory path, file name, size in bytes, date modified epoch)
+# The command is killed if thread_state is interrupted
+def get_remote_file_details_recursively(absolute_path_list, thread_state=None):
+    if len(absolute_path_list) == 0:
+        return []
+
+    quoted_paths = " ".join(map(lambda absolute_path : "'" + quote_path_correctly_single(absolute_path) + "'", absolute_path_list))
+    result = run_shell_command(GET_ALL_FILES_WITH_DETAILS_RECURSIVELY_COMMAND.format(quoted_paths=quoted_paths), thread_state=thread_state)
+    remote_file_list = []
+
+    for record in filter_empty_string_elements(result.stdout.split("\0")):
+        # The path is the last field, so only split on the first two separators
+        # e.g. "1050/1700000000.5//sdcard/TestDirectory/test.txt" -> ["1050", "1700000000.5", "/sdcard/TestDirectory/test.txt"]
+        record_fields = record.split("/", 2)
+
+        if len(record_fields) != 3:
+            continue
+
+        # e.g. "/sdcard/TestDirectory/test.txt" -> ["sdcard", "TestDirectory", "test.txt"]
+        file_path_list = filter_empty_string_elements(record_fields[2].split("/"))
+
+        try:
+            remote_file_list.append(("/" + "/".join(file_path_list[:-1]) + "/", file_path_list[-1], int(record_fields[0]), int(float(record_fields[1]))))
+        except (ValueError, IndexError):
+            continue
+
+    return remote_file_list
+
+# Adds a pull task for every remote file which is missing on the host, or which has a different size or date modified on the host
+# A pulled file is given the remote date modified, so it will match the next time round.
+# A file which was only partially pulled will not have had its date modified set yet, so it will be pulled again.
+def add_changed_file_pull_tasks(absolute_pull_directory, remote_file_list, pull_task_list, new_host_directory_path_set):
+    for file_absolute_directory_path, file_name, file_size_bytes, file_modified_epoch in remote_file_list:
+        new_host_directory_path = get_host_directory_path(absolute_pull_directory, file_absolute_directory_path)
+        absolute_file_path_on_host = new_host_directory_path + (file_name if CURRENT_OS != "Windows" else get_compatibility_name(file_name))
+
+        try:
+            host_file_stat = os.stat(absolute_file_path_on_host)
+            if host_file_stat.st_size == file_size_bytes and int(host_file_stat.st_mtime) == file_modified_epoch:
+                continue
+        except OSError:
+            # The file does not exist on the host yet
+            pass
+
+        new_host_directory_path_set.add(new_host_directory_path)
+        pull_task_list.append(PullTask(file_absolute_directory_path + file_name, absolute_file_path_on_host, file_modified_epoch, file_size_bytes))
+
+    for new_host_directory_path in new_host_directory_path_set:
+        os.makedirs(new_host_directory_path, exist_ok=True)
+
+# Gets the directory on the host which mirrors a directory inside the pulled directory (e.g. "/sdcard/") on the Android device
+# e.g. "/sdcard/TestDirectory/" -> /my_programs/adb_file_viewer/output/TestDirectory/
+def get_host_directory_path(absolute_pull_directory, absolute_directory_path):
+    # e.g. "/sdcard/TestDirectory" -> "TestDirectory/"
+    new_host_directory_path = absolute_directory_path.replace(absolute_pull_directory, "", 1)
+    # ["TestDirectory"]
+    new_host_directory_path = filter_empty_string_elements(new_host_directory_path.split("/"))
+
+    # If using Windows, compatible directory names must be used when creating the structure on the host.
+    if CURRENT_OS == "Windows":
+        for directory_name_index in range(0, len(new_host_directory_path)):
+            new_host_directory_path[directory_name_index] = get_compatibility_name(new_host_directory_path[directory_name_index])
+
+    # e.g. ["TestDirectory"] -> /my_programs/adb_file_viewer/output/TestDirectory/
+    return os.path.join(os.path.abspath("."), OUTPUT_FOLDER, *new_host_directory_path) + "/"
+
+# adb pull can copy a whole directory in one go, but it can't rename anything on the way.
+# On Windows, any directory that holds a file or directory needing a compatible name is split up instead:
+# its files are added to file_pull_list to be pulled one by one, and each of its subdirectories is considered in the same way.
+# Returns False if the directory could not be listed, in which case it should be pulled file by file.
+def add_directory_tree_pull_tasks(absolute_pull_directory, absolute_directory_path, pull_task_list, file_pull_list, new_host_directory_path_set, job):
+    # No names are ever changed on other systems, so there is no need to look inside the directory
+    if CURRENT_OS != "Windows":
+        pull_task_list.append(PullTask(absolute_directory_path.rstrip("/"), get_host_directory_path(absolute_pull_directory, absolute_pull_directory)))
+        return True
+
+    command = GET_ALL_FILES_AND_DIRECTORIES_RECURSIVELY_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_directory_path))
+    result = run_shell_command(command, thread_state=job)
+
+    records = filter_empty_string_elements(result.stdout.split("\0"))
+
+    if result.returncode != 0 and len(records) == 0:
+        return False
+
+    # e.g. "/sdcard/TestDirectory/" -> ("sdcard", "TestDirectory")
+    root_path_tuple = tuple(filter_empty_string_elements(absolute_directory_path.split("/")))
+    child_file_names = {root_path_tuple: []}
+    child_directory_names = {root_path_tuple: []}
+
+    for record in records:
+        # e.g. "f//sdcard/TestDirectory/test.txt" -> "f", ("sdcard", "TestDirectory", "test.txt")
+        record_fields = record.split("/", 1)
+        if len(record_fields) != 2:
+            continue
+        path_tuple = tuple(filter_empty_string_elements(record_fields[1].split("/")))
+        parent_path_tuple = path_tuple[:-1]
+        if parent_path_tuple not in child_file_names:
+            continue
+        if record_fields[0] == FIND_DIRECTORY_TYPE:
+            child_directory_names[parent_path_tuple].append(path_tuple[-1])
+            child_file_names[path_tuple] = []
+            child_directory_names[path_tuple] = []
+        else:
+            child_file_names[parent_path_tuple].append(path_tuple[-1])
+
+    compatibility_results = {}
+
+    # A directory can be pulled as a whole if neither its name nor anything inside it needs changing
+    # Results are remembered, as each directory is asked about again by every directory above it
+    def is_compatible(path_tuple):
+        if path_tuple in compatibility_results:
+            return compatibility_results[path_tuple]
+
+        is_path_compatible = True
+
+        for name in [path_tuple[-1]] + child_file_names[path_tuple]:
+            if get_compatibility_name(name) != name:
+                is_path_compatible = False
+
+        for child_directory_name in child_directory_names[path_tuple]:
+            if is_compatible(path_tuple + (child_directory_name,)) == False:
+                is_path_compatible = False
+
+        compatibility_results[path_tuple] = is_path_compatible
+        return is_path_compatible
+
+    def add_tasks(path_tuple):
+        directory_path = "/" + "/".join(path_tuple) + "/"
+
+        if is_compatible(path_tuple) == True:
+            # adb pull creates the directory inside the given host directory
+            pull_task_list.append(PullTask(directory_path.rstrip("/"), get_host_directory_path(absolute_pull_directory, "/" + "/".join(path_tuple[:-1]) + "/")))
+            return
+
+        # Created even if empty, as the directory would have been created by a whole directory pull
+        new_host_directory_path_set.add(get_host_directory_path(absolute_pull_directory, directory_path))
+
+        for child_file_name in child_file_names[path_tuple]:
+            file_pull_list.append(FileDescriptor(False, child_file_name, directory_path, 0, 0))
+
+        for child_directory_name in child_directory_names[path_tuple]:
+            add_tasks(path_tuple + (child_directory_name,))
+
+    add_tasks(root_path_tuple)
+
+    return True
 
-        command = PULL_FILE_COMMAND.format(absolute_file_path=quote_path_correctly_outer_double(file.file_absolute_directory_path + file.file_name), absolute_file_path_on_host=quote_path_correctly_outer_double(absolute_file_path_on_host))
-        popup_destructor = create_command_running_popup()
-        subprocess.run(command, shell=True)
-        print("Command run: {command}".format(command=command))
-        popup_destructor()
+# Runs the pull tasks on the job thread, presenting the overall progress in the job
+def run_pull_tasks(pull_task_list, job):
+    def on_progress(pull_scheduler, pull_task):
+        if pull_task.is_complete == True:
+            job.add_progress(1, pull_task.byte_count)
+        elif pull_task.is_failed == True:
+            job.add_progress(0, failed_count=1)
+
+    # The amount of bytes to pull is only known when every file's size is
+    total_byte_count = None
+    if all(map(lambda pull_task : pull_task.file_size_bytes is not None, pull_task_list)):
+        total_byte_count = sum(map(lambda pull_task : pull_task.file_size_bytes, pull_task_list))
+    job.set_totals(len(pull_task_list), total_byte_count)
+
+    pull_scheduler = PullScheduler(pull_task_list, PULL_WORKER_COUNT, PULL_RETRY_COUNT, on_progress, job, job.device_serial)
+    pull_scheduler.run()
+    if pull_scheduler.failed_count > 0:
+        print("{failed_count} file(s) could not be pulled".format(failed_count=pull_scheduler.failed_count))
+
+# Brings the copy of each selected file and directory on the host up to date, in the same place a pull would put it.
+# Only files which are missing on the host, or which have a different size or date modified on the host, are pulled.
+# Anything on the host which is a file where the Android device has a directory (or the other way round) is replaced,
+# and if MIRROR_REMOVE_DELETED_FILES is True, anything which no longer exists on the Android device is removed from the host.
+def on_mirror():
+    absolute_mirror_directory = current_directory_value
+    mirror_file_list = list(selected_files)
+
+    add_job(Job("Mirror {file_count} file(s)".format(file_count=len(mirror_file_list)), lambda job : run_mirror(absolute_mirror_directory, mirror_file_list, job)))
+
+# Runs on the job thread. The differences are worked out from a single find command on the Android device, and a walk of the host with os.scandir.
+def run_mirror(absolute_mirror_directory, mirror_file_list, job):
+    absolute_path_list = list(map(lambda file : absolute_mirror_directory + file.file_name, mirror_file_list))
+    output = bytearray()
+
+    def on_output(new_output):
+        output.extend(new_output)
+        return True
+
+    quoted_paths = " ".join(map(lambda absolute_path : "'" + quote_path_correctly_single(absolute_path) + "'", absolute_path_list))
+    result = run_shell_command(MIRROR_LIST_COMMAND.format(quoted_paths=quoted_paths), on_output, job)
+    if job.is_interrupted == True:
+        return
+
+    record_list = []
+    parse_index_records(filter_empty_string_elements(bytes(output).split(FIND_RECORD_SEPARATOR)), record_list, [])
+
+    # Host path to the remote (absolute file path, is directory, size in bytes, date modified epoch)
+    remote_file_details = {}
+    for file_absolute_directory_path, file_name, is_directory, file_size_bytes, file_modified_epoch in record_list:
+        absolute_file_path_on_host = os.path.normpath(os.path.join(get_host_directory_path(absolute_mirror_directory, file_absolute_directory_path), file_name if CURRENT_OS != "Windows" else get_compatibility_name(file_name)))
+        remote_file_details[absolute_file_path_on_host] = (file_absolute_directory_path + file_name, is_directory == 1, file_size_bytes, file_modified_epoch)
+
+    # Only the selected files which could be listed are compared, so a file which could not be read is never treated as deleted
+    absolute_host_root_path_list = []
+    for file in mirror_file_list:
+        absolute_host_root_path = os.path.normpath(os.path.join(get_host_directory_path(absolute_mirror_directory, absolute_mirror_directory), get_host_relative_path(file.file_name)))
+        if absolute_host_root_path in remote_file_details:
+            absolute_host_root_path_list.append(absolute_host_root_path)
+        else:
+            print("Could not list: {path}".format(path=absolute_mirror_directory + file.file_name))
+            job.add_progress(0, failed_count=1)
+    host_file_details = get_host_file_details_recursively(absolute_host_root_path_list)
+
+    # Nothing inside a removed directory needs removing again
+    removed_path_set = set()
+    for absolute_file_path_on_host in host_file_details.keys():
+        if is_inside_any_directory(absolute_file_path_on_host, removed_path_set) == True:
+            continue
+        if absolute_file_path_on_host in remote_file_details:
+            if remote_file_details[absolute_file_path_on_host][1] == host_file_details[absolute_file_path_on_host][0]:
+                continue
+        # A partial listing (e.g. a directory which could not be read) would make its files look deleted
+        elif MIRROR_REMOVE_DELETED_FILES == False or result.returncode != 0:
+            continue
+        remove_partially_pulled_path(absolute_file_path_on_host, True)
+        removed_path_set.add(absolute_file_path_on_host)
+    if len(removed_path_set) > 0:
+        print("Removed {path_count} path(s) from the host which are no longer on the device".format(path_count=len(removed_path_set)))
+
+    pull_task_list = []
+    for absolute_file_path_on_host, (absolute_file_path, is_directory, file_size_bytes, file_modified_epoch) in remote_file_details.items():
+        # Directories are created even if empty, so the host has the same tree as the Android device
+        if is_directory == True:
+            os.makedirs(absolute_file_path_on_host, exist_ok=True)
+            continue
+        host_file_detail = host_file_details.get(absolute_file_path_on_host)
+        if absolute_file_path_on_host not in removed_path_set and host_file_detail == (False, file_size_bytes, file_modified_epoch):
+            continue
+        pull_task_list.append(PullTask(absolute_file_path, absolute_file_path_on_host, file_modified_epoch, file_size_bytes))
+
+    if job.is_interrupted == True:
+        return
+    run_pull_tasks(pull_task_list, job)
+
+# True if any directory above the path on the host is in the set of directory paths
+def is_inside_any_directory(absolute_path_on_host, absolute_directory_path_set):
+    parent_directory_path = os.path.dirname(absolute_path_on_host)
+    while parent_directory_path != absolute_path_on_host:
+        if parent_directory_path in absolute_directory_path_set:
+            return True
+        absolute_path_on_host = parent_directory_path
+        parent_directory_path = os.path.dirname(absolute_path_on_host)
+    return False
+
+# Returns a dictionary of path to (is directory, size in bytes, date modified epoch) for every given path on the host and everything inside it
+# Directories are given a size and date modified of 0. Paths which do not exist are left out.
+def get_host_file_details_recursively(absolute_path_on_host_list):
+    host_file_details = {}
+    pending_directory_path_list = []
+
+    for absolute_path_on_host in absolute_path_on_host_list:
+        if os.path.isdir(absolute_path_on_host):
+            host_file_details[absolute_path_on_host] = (True, 0, 0)
+            pending_directory_path_list.append(absolute_path_on_host)
+        elif os.path.exists(absolute_path_on_host):
+            host_file_stat = os.stat(absolute_path_on_host)
+            host_file_details[absolute_path_on_host] = (False, host_file_stat.st_size, int(host_file_stat.st_mtime))
+
+    while len(pending_directory_path_list) > 0:
+        absolute_directory_path_on_host = pending_directory_path_list.pop()
+        try:
+            with os.scandir(absolute_directory_path_on_host) as directory_entries:
+                for directory_entry in directory_entries:
+                    if directory_entry.is_dir(follow_symlinks=False):
+                        host_file_details[directory_entry.path] = (True, 0, 0)
+                        pending_directory_path_list.append(directory_entry.path)
+                    else:
+                        host_file_stat = directory_entry.stat(follow_symlinks=False)
+                        host_file_details[directory_entry.path] = (False, host_file_stat.st_size, int(host_file_stat.st_mtime))
+        except OSError as error:
+            print("Could not read {path}: {error}".format(path=absolute_directory_path_on_host, error=error))
+
+    return host_file_details
+
+# Asks for files on the host, and pushes them into the current directory
+def on_push_files():
+    on_push(list(tkinter.filedialog.askopenfilenames(title="Push files")))
+
+# Asks for a directory on the host, and pushes it into the current directory
+def on_push_directory():
+    absolute_directory_path_on_host = tkinter.filedialog.askdirectory(title="Push directory")
+    on_push([absolute_directory_path_on_host] if len(absolute_directory_path_on_host) > 0 else [])
+
+# Pushes each host file and directory into the current directory as a job.
+# Once the job has finished, the pushed files are added to the presented list, taking the place of any file with the same name,
+# rather than listing the whole directory again.
+def on_push(absolute_path_on_host_list):
+    if len(absolute_path_on_host_list) == 0:
+        return
+    # The user can move to another directory while the job waits and runs
+    absolute_push_directory = current_directory_value
+    directory_list_generation = current_directory_list_generation
+    # e.g. /home/user/fixtures/ -> "fixtures"
+    pushed_file_name_list = list(map(lambda absolute_path_on_host : os.path.basename(os.path.normpath(absolute_path_on_host)), absolute_path_on_host_list))
+    pushed_file_details = {}
+    # A pushed directory is presented with the size of the files pushed into it
+    pushed_directory_byte_sizes = {}
+
+    def push_job_action(job):
+        run_push_tasks(get_push_tasks(absolute_push_directory, absolute_path_on_host_list, job), job)
+        if job.is_interrupted == True:
+            return
+        for absolute_path_on_host, file_name in zip(absolute_path_on_host_list, pushed_file_name_list):
+            if os.path.isdir(absolute_path_on_host):
+                pushed_directory_byte_sizes[file_name] = sum(map(lambda host_file_detail : host_file_detail[1], get_host_file_details_recursively([absolute_path_on_host]).values()))
+        pushed_file_details.update(get_file_details(list(map(lambda file_name : absolute_push_directory + file_name, pushed_file_name_list)), job))
+
+    def push_job_complete(job):
+        for absolute_path_on_host, file_name in zip(absolute_path_on_host_list, pushed_file_name_list):
+            if os.path.isdir(absolute_path_on_host):
+                invalidate_directory_listing(job.device_serial, absolute_push_directory + file_name + "/", include_subdirectories=True)
+        invalidate_directory_listing(job.device_serial, absolute_push_directory)
+        # The user has since moved to another directory (or is looking at search results), which will be listed again when they come back
+        if directory_list_generation != current_directory_list_generation or is_showing_search_results() == True:
+            return
+
+        current_file_descriptors = {}
+        for file_descriptor in current_directory_list:
+            current_file_descriptors[file_descriptor.file_name] = file_descriptor
+        # Only the files which are on the device once the push has finished are presented, whether or not every file inside them was pushed
+        for file_name in pushed_file_name_list:
+            if absolute_push_directory + file_name not in pushed_file_details:
+                continue
+            is_directory, file_size_bytes, file_modified_epoch = pushed_file_details[absolute_push_directory + file_name]
+            current_file_descriptor = current_file_descriptors.get(file_name)
+            # A file which was already there is updated in place, so it stays selected if it was.
+            # A directory which was already there keeps its size, as only some of the files inside it were pushed.
+            if current_file_descriptor is not None and current_file_descriptor.is_directory == is_directory:
+                current_file_descriptor.file_modified_epoch = file_modified_epoch
+                if is_directory == False:
+                    current_file_descriptor.file_size_bytes = file_size_bytes
+                continue
+            if current_file_descriptor is not None:
+                current_directory_list.remove(current_file_descriptor)
+                selected_files.discard(current_file_descriptor)
+            current_directory_list.append(FileDescriptor(is_directory, file_name, absolute_push_directory, file_modified_epoch, pushed_directory_byte_sizes.get(file_name, 0) if is_directory == True else file_size_bytes))
+        store_current_directory_list()
+        redraw()
+
+    add_job(Job("Push {file_count} file(s)".format(file_count=len(absolute_path_on_host_list)), push_job_action, push_job_complete))
+
+# Works out the PushTasks needed to push every host file and directory into absolute_push_directory on the Android device
+# Unless PUSH_DIRECTORIES_AS_TREES is True, every directory which is needed is created first, with as few commands as possible (see run_batched_path_command).
+# Runs on the job thread. No tasks are returned if the job is cancelled.
+def get_push_tasks(absolute_push_directory, absolute_path_on_host_list, job):
+    push_task_list = []
+    # Only the deepest directories are given to mkdir -p, as it creates every directory above them too
+    new_directory_path_list = []
+
+    for absolute_path_on_host in absolute_path_on_host_list:
+        # e.g. /home/user/fixtures/ -> "fixtures"
+        file_name = os.path.basename(os.path.normpath(absolute_path_on_host))
+
+        if os.path.isdir(absolute_path_on_host) == False:
+            push_task_list.append(PushTask(absolute_push_directory + file_name, absolute_path_on_host, None, os.path.getsize(absolute_path_on_host)))
+            continue
+
+        if PUSH_DIRECTORIES_AS_TREES == True:
+            host_file_details = get_host_file_details_recursively([absolute_path_on_host])
+            push_task_list.append(PushTask(absolute_push_directory, absolute_path_on_host, None, sum(map(lambda host_file_detail : host_file_detail[1], host_file_details.values()))))
+            continue
+
+        for absolute_directory_path_on_host, directory_name_list, file_name_list in os.walk(absolute_path_on_host):
+            # e.g. /home/user/fixtures/images -> "/sdcard/fixtures/images/"
+            relative_path_list = filter_empty_string_elements(os.path.relpath(absolute_directory_path_on_host, absolute_path_on_host).replace("\\", "/").split("/"))
+            absolute_directory_path = absolute_push_directory + "".join(map(lambda name : name + "/", [file_name] + list(filter(lambda name : name != ".", relative_path_list))))
+            if len(directory_name_list) == 0:
+                new_directory_path_list.append(absolute_directory_path)
+            for child_file_name in file_name_list:
+                absolute_file_path_on_host = os.path.join(absolute_directory_path_on_host, child_file_name)
+                push_task_list.append(PushTask(absolute_directory_path + child_file_name, absolute_file_path_on_host, None, os.path.getsize(absolute_file_path_on_host)))
+
+    if job.is_interrupted == True:
+        return []
+
+    run_batched_path_command(CREATE_DIRECTORIES_COMMAND, new_directory_path_list, "create directory", job, False)
+
+    if job.is_interrupted == True:
+        return []
+
+    return push_task_list
+
+# Runs the push tasks on the job thread, presenting the overall progress in the job
+def run_push_tasks(push_task_list, job):
+    def on_progress(push_scheduler, push_task):
+        if push_task.is_complete == True:
+            job.add_progress(1, push_task.byte_count)
+        elif push_task.is_failed == True:
+            job.add_progress(0, failed_count=1)
+
+    job.set_totals(len(push_task_list), sum(map(lambda push_task : push_task.file_size_bytes, push_task_list)))
+
+    push_scheduler = PushScheduler(push_task_list, PUSH_WORKER_COUNT, PUSH_RETRY_COUNT, on_progress, job, job.device_serial)
+    push_scheduler.run()
+    if push_scheduler.failed_count > 0:
+        print("{failed_count} file(s) could not be pushed".format(failed_count=push_scheduler.failed_count))
+
+# Pulls files by having tar write them all to a single stream, which is unpacked on the host as it arrives
+# This avoids the cost of starting a transfer for every file, which matters most for large amounts of small files.
+# Runs on the job thread, presenting the amount of files pulled so far in the job
+def run_tar_stream_pull(absolute_directory, pull_file_list, job):
+    # Directory sizes come from du, so this is close rather than exact
+    if all(map(lambda file : file.is_size_deferred == False, pull_file_list)):
+        job.set_totals(None, sum(map(lambda file : file.file_size_bytes, pull_file_list)))
+
+    # "./" stops a file name starting with "-" from being read as an option by tar
+    quoted_file_names = " ".join(map(lambda file : "'./" + quote_path_correctly_single(file.file_name) + "'", pull_file_list))
+    command = TAR_STREAM_COMMAND.format(absolute_directory=quote_path_correctly_single(absolute_directory), quoted_file_names=quoted_file_names)
+    # The command is passed straight to adb rather than through the host shell, so it only needs quoting for the Android shell
+    process = subprocess.Popen(get_adb_command(job.device_serial) + ["exec-out", command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if job.add_running_command(process.kill) == False:
+        process.kill()
+    print("Command run: {command}".format(command=command))
+
+    try:
+        extract_tar_stream(process.stdout, os.path.join(os.path.abspath("."), OUTPUT_FOLDER), job)
+    except tarfile.TarError as error:
+        # The stream ends part way through a file when the job is cancelled
+        if job.is_interrupted == False:
+            print("Could not read tar stream: {error}".format(error=error))
+            job.add_progress(0, failed_count=1)
+    finally:
+        process.stdout.close()
+        if process.wait() != 0 and job.is_interrupted == False:
+            print("tar reported an error, some files may not have been pulled")
+            job.add_progress(0, failed_count=1)
+        job.remove_running_command(process.kill)
+
+# Removes what a cancelled pull left behind on the host. A partly pulled file is always removed, as it can't be used,
+# but a directory is only removed if the pull created it, so nothing which was pulled before is lost.
+def remove_partially_pulled_path(absolute_path_on_host, is_new_path_on_host):
+    try:
+        if os.path.isdir(absolute_path_on_host):
+            if is_new_path_on_host == True:
+                shutil.rmtree(absolute_path_on_host)
+        elif os.path.exists(absolute_path_on_host):
+            os.remove(absolute_path_on_host)
+    except OSError as error:
+        print("Could not remove {path}: {error}".format(path=absolute_path_on_host, error=error))
+
+# Unpacks a tar stream into a directory on the host one file at a time, without needing to seek
+# On Windows, every part of every path is given its compatible name on the way.
+# Only files and directories are unpacked. Anything which would end up outside of the host directory is skipped.
+# Every file unpacked is added to the job's progress, and unpacking stops once the job has been cancelled.
+def extract_tar_stream(tar_stream_file, absolute_host_directory, job):
+    created_host_directory_set = set()
+    pulled_file_count = 0
+
+    with tarfile.open(fileobj=tar_stream_file, mode="r|") as tar_stream:
+        for member in tar_stream:
+            if job.is_interrupted == True:
+                break
+
+            # e.g. "./TestDirectory/test.txt" -> ["TestDirectory", "test.txt"]
+            member_path_list = list(filter(lambda name : name != ".", filter_empty_string_elements(member.name.split("/"))))
+
+            if len(member_path_list) == 0 or ".." in member_path_list:
+                continue
+
+            if CURRENT_OS == "Windows":
+                member_path_list = list(map(get_compatibility_name, member_path_list))
+
+            absolute_file_path_on_host = os.path.join(absolute_host_directory, *member_path_list)
+
+            if member.isdir():
+                if absolute_file_path_on_host not in created_host_directory_set:
+                    os.makedirs(absolute_file_path_on_host, exist_ok=True)
+                    created_host_directory_set.add(absolute_file_path_on_host)
+                continue
+
+            if member.isfile() == False:
+                continue
+
+            host_directory_path = os.path.dirname(absolute_file_path_on_host)
+            if host_directory_path not in created_host_directory_set:
+                os.makedirs(host_directory_path, exist_ok=True)
+                created_host_directory_set.add(host_directory_path)
+
+            # A file which is cut off part way through (e.g. the job was cancelled) is removed, rather than left looking complete
+            try:
+                with tar_stream.extractfile(member) as member_file, open(absolute_file_path_on_host, "wb") as host_file:
+                    shutil.copyfileobj(member_file, host_file, TAR_STREAM_COPY_BUFFER_SIZE)
+            except (tarfile.TarError, OSError):
+                remove_partially_pulled_path(absolute_file_path_on_host, True)
+                raise
+            os.utime(absolute_file_path_on_host, (member.mtime, member.mtime))
+
+            pulled_file_count = pulled_file_count + 1
+            job.add_progress(1, member.size)
+
+    return pulled_file_count
 
 # Runs pull first, and then opens up each selected file
 # If a directory has been selected, the directory will be opened, but not the files within it.
 def on_open():
-    on_pull()
-    for file in selected_files:
-        correct_file_name = file.file_name if CURRENT_OS != "Windows" else file.file_name_compat
-        absolute_file_path_on_host = os.path.join(os.path.abspath("."), OUTPUT_FOLDER, correct_file_name)
-        command = RUNTIME_OPEN_COMMAND.format(absolute_file_path_on_host=quote_path_correctly_outer_double(absolute_file_path_on_host))
-        popup_destructor = create_command_running_popup()
-        subprocess.run(command, shell=True)
-        print("Command run: {command}".format(command=command))
-        popup_destructor()
+    open_file_list = list(selected_files)
+
+    def open_files():
+        for file in open_file_list:
+            absolute_file_path_on_host = os.path.join(os.path.abspath("."), OUTPUT_FOLDER, get_host_relative_path(file.file_name))
+            command = RUNTIME_OPEN_COMMAND.format(absolute_file_path_on_host=quote_path_correctly_outer_double(absolute_file_path_on_host))
+            subprocess.run(command, shell=True)
+            print("Command run: {command}".format(command=command))
+
+    on_pull(open_files)
         
 # For each selected file, delete it on the file system. 
+# The files are removed from the presented list straight away, rather than listing the whole directory again afterwards.
+# Any file which is still there once the delete is done is put back.
 def on_delete():
-    for file in selected_files:
-        command = DELETE_COMMAND.format(absolute_file_path=quote_path_correctly_outer_double_inner_single(current_directory_value + file.file_name))
-        popup_destructor = create_command_running_popup()
-        subprocess.run(command, shell=True)
-        print("Command run: {command}".format(command=command))
-        popup_destructor()
-    refresh()
+    deleted_file_list = list(selected_files)
+    deleted_file_set = set(deleted_file_list)
+    absolute_file_path_list = list(map(lambda file : file.file_absolute_directory_path + file.file_name, deleted_file_list))
+    directory_list_generation = current_directory_list_generation
+    remaining_file_modified_epochs = {}
+    # Files are only known to be deleted once the check after the delete has run for them,
+    # which it never does if the job is cancelled before it starts, or stops on an error
+    unchecked_file_paths = set(absolute_file_path_list)
+    on_unselect_all()
+    current_directory_list[:] = list(filter(lambda file_descriptor : file_descriptor not in deleted_file_set, current_directory_list))
+    redraw()
+
+    def delete_job_action(job):
+        run_batched_path_command(DELETE_COMMAND, absolute_file_path_list, "delete", job)
+        unchecked_file_path_list = []
+        remaining_file_modified_epochs.update(get_file_modified_epochs(absolute_file_path_list, job, unchecked_file_path_list))
+        unchecked_file_paths.intersection_update(unchecked_file_path_list)
+
+    def delete_job_complete(job):
+        for absolute_file_path in absolute_file_path_list:
+            invalidate_directory_listing(job.device_serial, absolute_file_path + "/", include_subdirectories=True)
+        # Directories holding files which may or may not have been deleted are listed again when they are next opened
+        for file in deleted_file_list:
+            if file.file_absolute_directory_path + file.file_name in unchecked_file_paths:
+                invalidate_directory_listing(job.device_serial, file.file_absolute_directory_path)
+        # The user has since moved to another directory, which will be listed again when they come back
+        if directory_list_generation != current_directory_list_generation:
+            return
+        # Files which are still there, or may still be there, are put back
+        current_directory_list.extend(filter(lambda file : file.file_absolute_directory_path + file.file_name in remaining_file_modified_epochs or file.file_absolute_directory_path + file.file_name in unchecked_file_paths, deleted_file_list))
+        if len(unchecked_file_paths) == 0:
+            store_current_directory_list()
+        redraw()
+
+    add_job(Job("Delete {file_count} file(s)".format(file_count=len(deleted_file_list)), delete_job_action, delete_job_complete))
+
+# Runs a command which takes a list of paths (e.g. DELETE_COMMAND) for every path in absolute_path_list, using as few commands as possible.
+# Each command is given as many paths as fit in BATCH_COMMAND_MAX_PATHS_LENGTH. Any other format arguments are passed on to the command.
+# Returns a dictionary of path to error message, for every path an error was printed for. Each error is also printed, using action_name.
+# When a command fails with an error which names none of its paths, every path given to it which was not named is returned too.
+# If a job is given, the commands are run for it, and no more commands are run once it has been cancelled.
+# Its progress is updated after every command too, unless is_progress_reported is False (e.g. when the commands are only part of the job).
+def run_batched_path_command(command_format, absolute_path_list, action_name, job=None, is_progress_reported=True, **format_arguments):
+    failed_paths = {}
+    path_batches = [[]]
+    batch_length = 0
+
+    for absolute_path in absolute_path_list:
+        quoted_path = "'" + quote_path_correctly_single(absolute_path) + "'"
+        if batch_length + len(quoted_path) + 1 > BATCH_COMMAND_MAX_PATHS_LENGTH and len(path_batches[-1]) > 0:
+            path_batches.append([])
+            batch_length = 0
+        path_batches[-1].append((absolute_path, quoted_path))
+        batch_length = batch_length + len(quoted_path) + 1
+
+    if job is not None and is_progress_reported == True:
+        job.set_totals(len(absolute_path_list))
+
+    for path_batch in path_batches:
+        if len(path_batch) == 0 or (job is not None and job.is_interrupted == True):
+            continue
+        result = run_shell_command(command_format.format(quoted_paths=" ".join(map(lambda path_pair : path_pair[1], path_batch)), **format_arguments), thread_state=job)
+        if result.returncode == ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE:
+            continue
+        if result.returncode == 0:
+            if job is not None and is_progress_reported == True:
+                job.add_progress(len(path_batch))
+            continue
+
+        # Errors name the path they are about, e.g. "rm: /sdcard/test: Permission denied", or "rm: cannot remove '/sdcard/test': Permission denied"
+        error_line_list = filter_empty_string_elements(result.stdout.split("\n"))
+        matched_error_line_set = set()
+        for absolute_path, quoted_path in path_batch:
+            for error_line in error_line_list:
+                if "'" + absolute_path + "'" in error_line or absolute_path + ":" in error_line:
+                    failed_paths[absolute_path] = error_line
+                    matched_error_line_set.add(error_line)
+                    break
+
+        # Otherwise it is not known which paths failed, e.g. "cp: cannot overwrite directory '/sdcard/Backup/DCIM' with non-directory" names the destination,
+        # or the command failed without any error, e.g. the device was disconnected. Every path in the batch which was not named is then counted as failed.
+        unmatched_error_line_list = list(filter(lambda error_line : error_line not in matched_error_line_set, error_line_list))
+        if len(error_line_list) == 0 or len(unmatched_error_line_list) > 0 or result.returncode == ADB_SHELL_SESSION_FAILED_RETURN_CODE:
+            unknown_error = unmatched_error_line_list[0] if len(unmatched_error_line_list) > 0 else "exit code {returncode}".format(returncode=result.returncode)
+            for absolute_path, quoted_path in path_batch:
+                if absolute_path not in failed_paths:
+                    failed_paths[absolute_path] = unknown_error
+
+        if job is not None and is_progress_reported == True:
+            failed_path_count = len(list(filter(lambda path_pair : path_pair[0] in failed_paths, path_batch)))
+            job.add_progress(len(path_batch) - failed_path_count, failed_count=failed_path_count)
+
+    for absolute_path, error_line in failed_paths.items():
+        print("Could not {action_name}: {path} ({error})".format(action_name=action_name, path=absolute_path, error=error_line))
+
+    return failed_paths
 
 # After selecting some files, it is possible to use the copy/move functionality
 # When clicking the copy/move button initially, the program enters the copy/move state, and the file view changes to only show directories
@@ -1084,13 +3641,15 @@ def on_copy_or_move(button_command, this_button, other_button):
     global copy_move_state_info_object
     # Initial button click...
     if copy_move_state_info_object is None:
+        if is_showing_search_results() == True:
+            return
         # Save the current directory, which will be used when the actual copy/move is done
         # as the program will be in a different directory when the copy/move occurs
         copy_move_state_info_object = CopyMoveStateInfo(current_directory_value, selected_files, this_button)
         scroll_to_top()
         display_file_list()
         scroll_to_top()
-        modify_widget_states(disable_list=[rename_file_button, pull_button, open_button, delete_button, other_button])
+        modify_widget_states(disable_list=[rename_file_button, pull_button, mirror_button, open_button, delete_button, other_button])
         modify_field_states(disable_list=[rename_file_field])
     else:
         # Copy/move button clicked again but in the same directory...
@@ -1102,26 +3661,82 @@ def on_copy_or_move(button_command, this_button, other_button):
             scroll_to_top()
             display_file_list()
             scroll_to_top()
-            modify_widget_states(enable_list=[rename_file_button, pull_button, open_button, delete_button, other_button])
+            modify_widget_states(enable_list=[rename_file_button, pull_button, mirror_button, open_button, delete_button, other_button])
             modify_field_states(enable_list=[rename_file_field])
         else:
             # Copy/move button clicked again, different directory
-            for file_name in copy_move_state_info_object.file_names:
-                command = button_command.format(absolute_file_path=quote_path_correctly_outer_double_inner_single(copy_move_state_info_object.initial_working_directory + file_name), absolute_directory=quote_path_correctly_outer_double_inner_single(current_directory_value))
-                popup_destructor = create_command_running_popup()
-                subprocess.run(command, shell=True)
-                print("Command run: {command}".format(command=command))
-                popup_destructor()
+            source_file_list = copy_move_state_info_object.file_list
+            absolute_file_path_list = list(map(lambda file : file.file_absolute_directory_path + file.file_name, source_file_list))
             copy_move_state_info_object = None
-            refresh()
-            modify_widget_states(disable_list=[rename_file_button, pull_button, open_button, copy_button, move_button, delete_button])
+            on_unselect_all()
+
+            # The files are presented in the directory straight away, taking the place of any file with the same name,
+            # rather than listing the whole directory again afterwards. Each one is checked once the copy/move is done.
+            current_file_descriptors = {}
+            for file_descriptor in current_directory_list:
+                current_file_descriptors[file_descriptor.file_name] = file_descriptor
+            replaced_file_descriptors = {}
+            new_file_list = []
+            for file in source_file_list:
+                new_file_descriptor = FileDescriptor(file.is_directory, file.file_name, current_directory_value, file.file_modified_epoch, file.file_size_bytes)
+                new_file_descriptor.copy_details(file)
+                if file.file_name in current_file_descriptors:
+                    replaced_file_descriptors[file.file_name] = current_file_descriptors[file.file_name]
+                new_file_list.append(new_file_descriptor)
+            replaced_file_descriptor_set = set(replaced_file_descriptors.values())
+            current_directory_list[:] = list(filter(lambda file_descriptor : file_descriptor not in replaced_file_descriptor_set, current_directory_list)) + new_file_list
+            redraw()
+
+            absolute_directory = current_directory_value
+            directory_list_generation = current_directory_list_generation
+            action_name = "copy" if button_command == COPY_COMMAND else "move"
+            failed_paths = {}
+            file_details = {}
+            # The files of the same name which are already there, as they were before the copy/move
+            replaced_file_details = {}
+
+            def copy_or_move_job_action(job):
+                replaced_file_details.update(get_file_details(list(map(lambda file_name : absolute_directory + file_name, replaced_file_descriptors.keys())), job))
+                failed_paths.update(run_batched_path_command(button_command, absolute_file_path_list, action_name, job, absolute_directory=quote_path_correctly_single(absolute_directory)))
+                file_details.update(get_file_details(list(map(lambda file : absolute_directory + file.file_name, new_file_list)) + (absolute_file_path_list if button_command == MOVE_COMMAND else []), job))
+
+            def copy_or_move_job_complete(job):
+                # A moved directory no longer exists where it was, and the directory it was in has changed
+                if button_command == MOVE_COMMAND:
+                    for absolute_file_path in absolute_file_path_list:
+                        invalidate_directory_listing(job.device_serial, absolute_file_path + "/", include_subdirectories=True)
+                invalidate_directory_listing(job.device_serial, absolute_directory)
+                # The user has since moved to another directory, which will be listed again when they come back
+                if directory_list_generation != current_directory_list_generation:
+                    return
+
+                # A file was copied if it is now in this directory without an error, as the same type and (for files) size,
+                # and was moved if it is also no longer where it was. A file of the same name which was already there doesn't count unless it has changed.
+                # Otherwise, the file it took the place of is put back
+                for absolute_file_path, new_file_descriptor in zip(absolute_file_path_list, new_file_list):
+                    absolute_new_file_path = absolute_directory + new_file_descriptor.file_name
+                    new_file_details = file_details.get(absolute_new_file_path)
+                    is_new_file_matching = new_file_details is not None and new_file_details[0] == new_file_descriptor.is_directory and (new_file_descriptor.is_directory == True or new_file_details[1] == new_file_descriptor.file_size_bytes)
+                    is_new_file_replaced = new_file_details != replaced_file_details.get(absolute_new_file_path)
+                    if absolute_file_path not in failed_paths and is_new_file_matching == True and is_new_file_replaced == True and (button_command == COPY_COMMAND or absolute_file_path not in file_details):
+                        new_file_descriptor.file_modified_epoch = new_file_details[2]
+                        continue
+                    current_directory_list.remove(new_file_descriptor)
+                    if new_file_descriptor.file_name in replaced_file_descriptors:
+                        current_directory_list.append(replaced_file_descriptors[new_file_descriptor.file_name])
+                store_current_directory_list()
+                redraw()
+
+            add_job(Job("{action_name} {file_count} file(s)".format(action_name=action_name.capitalize(), file_count=len(source_file_list)), copy_or_move_job_action, copy_or_move_job_complete))
+            modify_widget_states(disable_list=[rename_file_button, pull_button, mirror_button, open_button, copy_button, move_button, delete_button])
             modify_field_states(disable_list=[rename_file_field])
 
 # Called when a file selection occurrs.
 def update_rename_field_and_state():
     rename_file_field.delete(1.0, tkinter.END)    
 
-    if len(selected_files) == 1:
+    # Search results are named by their path inside the searched directory, so a new name would also move the file
+    if len(selected_files) == 1 and is_showing_search_results() == False:
         modify_widget_states(enable_list=[rename_file_button])
         rename_file_field["state"] = "normal"
         selected_file_name = list(selected_files)[0].file_name.replace("\n","").replace("\r","")
@@ -1132,50 +3747,109 @@ def update_rename_field_and_state():
 
 # Called when rename button is clicked or field is focused and the enter key is hit
 def on_rename():
+    if len(selected_files) != 1 or is_showing_search_results() == True:
+        return
     new_file_name = rename_file_field.get("1.0", tkinter.END).replace("\n","").replace("\r","").replace("/","")
     selected_file_descriptor = list(selected_files)[0]
-    command = RENAME_COMMAND.format(absolute_file_path=quote_path_correctly_outer_double_inner_single(selected_file_descriptor.file_absolute_directory_path + selected_file_descriptor.file_name), absolute_new_file_path=quote_path_correctly_outer_double_inner_single(selected_file_descriptor.file_absolute_directory_path + new_file_name))
-    popup_destructor = create_command_running_popup()
-    subprocess.run(command, shell=True)    
-    print("Command run: {command}".format(command=command))
-    popup_destructor()
-    selected_file_descriptor.file_name = new_file_name
-    selected_file_descriptor.file_name_compat = get_compatibility_name(selected_file_descriptor.file_name) # For Windows
+    old_file_name = selected_file_descriptor.file_name
+    absolute_file_path = selected_file_descriptor.file_absolute_directory_path + old_file_name
+    absolute_new_file_path = selected_file_descriptor.file_absolute_directory_path + new_file_name
+    if len(new_file_name) == 0 or new_file_name == old_file_name:
+        return
+    command = RENAME_COMMAND.format(absolute_file_path=quote_path_correctly_single(absolute_file_path), absolute_new_file_path=quote_path_correctly_single(absolute_new_file_path))
+    # The file is presented with its new name straight away, and given its old name back if the rename did not happen
+    selected_file_descriptor.set_file_name(new_file_name)
     redraw()
+    directory_list_generation = current_directory_list_generation
+    file_modified_epochs = {}
+
+    def rename_job_action(job):
+        run_shell_command(command, thread_state=job)
+        file_modified_epochs.update(get_file_modified_epochs([absolute_file_path, absolute_new_file_path], job))
+        if is_renamed() == False:
+            print("Could not rename: {path}".format(path=absolute_file_path))
+            job.add_progress(0, failed_count=1)
+        else:
+            job.add_progress(1)
+
+    # Renamed if the new name is there and the old name is not. Never true if the job was cancelled before it ran.
+    def is_renamed():
+        return absolute_new_file_path in file_modified_epochs and absolute_file_path not in file_modified_epochs
+
+    def rename_job_complete(job):
+        invalidate_directory_listing(job.device_serial, absolute_file_path + "/", include_subdirectories=True)
+        if is_renamed() == False:
+            selected_file_descriptor.set_file_name(old_file_name)
+        # The user has since moved to another directory, which will be listed again when they come back
+        if directory_list_generation != current_directory_list_generation:
+            return
+        store_current_directory_list()
+        redraw()
+
+    add_job(Job("Rename {name}".format(name=old_file_name), rename_job_action, rename_job_complete))
+
+# Adds a job to the job queue of its device, and shows the jobs panel so the user can follow its progress
+def add_job(job):
+    if job.device_serial not in job_queues:
+        job_queues[job.device_serial] = JobQueue()
+    job_queues[job.device_serial].add(job)
+    job_list.append(job)
+
+    # Only the most recent finished jobs are kept
+    while len(job_list) > JOB_PANEL_ROW_COUNT and job_list[0].is_finished() == True:
+        job_list.pop(0)
+
+    job_panel.deiconify()
+    update_job_panel()
+
+# Called on the main thread once a job has stopped
+def job_main_thread_action_complete(job):
+    if job.on_complete is not None:
+        job.on_complete(job)
+    update_job_panel()
+
+# True while any job, on any device, is yet to finish
+def is_any_job_unfinished():
+    return any(map(lambda job : job.is_finished() == False, job_list))
+
+# Presents the jobs in job_list, and then checks again after JOB_PANEL_UPDATE_INTERVAL_MS while any of them are yet to finish
+def update_job_panel():
+    global job_panel_after_id
+    if job_panel_after_id is not None:
+        root.after_cancel(job_panel_after_id)
+        job_panel_after_id = None
+
+    state_counts = collections.Counter(map(lambda job : job.state, job_list))
+    job_panel_summary_label.config(text="{running_count} running, {queued_count} queued, {finished_count} finished".format(running_count=state_counts[JobState.RUNNING], queued_count=state_counts[JobState.QUEUED], finished_count=len(job_list) - state_counts[JobState.RUNNING] - state_counts[JobState.QUEUED]))
+
+    # The most recent jobs are presented
+    presented_job_list = job_list[-JOB_PANEL_ROW_COUNT:]
+    for job_panel_row_index in range(0, JOB_PANEL_ROW_COUNT):
+        if job_panel_row_index < len(presented_job_list):
+            job_panel_rows[job_panel_row_index].show(presented_job_list[job_panel_row_index])
+        else:
+            job_panel_rows[job_panel_row_index].hide()
 
-# Any time a command is run, this function should be called to present a UI popup so that the user knows the program is working
-# This function returns a function to destroy the popup once the command is finished
-def create_command_running_popup():
-    def destroy():
-        for element in popup_elements:
-            element.grab_release()
-            element.forget()
-            element.destroy()
-        root.update_idletasks()
-
-    popup_elements = None
-
-    overlay_frame = tk.Frame(root, bg="black", width=260, height=68)
-    overlay_frame.place(x=510, y=360)
-
-    sub_overlay_frame = tk.Frame(root, bg="black", width=256, height=64)
-    sub_overlay_frame.place(x=512, y=362)
-    sub_overlay_frame.rowconfigure(0, minsize=64, weight=0)
-    sub_overlay_frame.columnconfigure(0, minsize=256, weight=0)
-    sub_overlay_frame.grid_propagate(0) # Should stop any resizing based on added widgets
-
-    sub_overlay_label = tk.Label(sub_overlay_frame, text=("Working" + "." * random.randint(1, 3)), font=("Helvetica", 20), width=1, height=1, bg="white")
-    sub_overlay_label.grid(column=0, row=0, sticky="nsew")
-
-    # Required to show the popup immediately, otherwise it won't show up until all functions return
-    root.update_idletasks()
-
-    # Forces all events to be forwarded to the popup UI, this ensures the user cannot interact with anything else while the command is running
-    overlay_frame.grab_set()
+    if is_any_job_unfinished() == True:
+        job_panel_after_id = root.after(JOB_PANEL_UPDATE_INTERVAL_MS, update_job_panel)
 
-    popup_elements = [sub_overlay_label, sub_overlay_frame, overlay_frame]
+# Can be called from any thread. The callback will be run on the main thread, where it is safe to modify UI elements.
+def run_on_main_thread(callback):
+    main_thread_callback_queue.put(callback)
 
-    return destroy
+# Runs every callback handed over by background threads, and then checks again after a short interval
+def process_main_thread_callbacks():
+    while True:
+        try:
+            callback = main_thread_callback_queue.get_nowait()
+        except queue.Empty:
+            break
+        # One failing callback must not stop the rest, or the polling, which would stop the UI from updating at all
+        try:
+            callback()
+        except Exception as error:
+            print("Main thread callback failed: {error}".format(error=error))
+    root.after(MAIN_THREAD_CALLBACK_POLL_INTERVAL_MS, process_main_thread_callbacks)
 
 def remove_newlines_in_text_field(target_text_field, target_text_field_cursor):
     text_field_value = target_text_field.get("1.0", tkinter.END).replace("\n","").replace("\r","")
@@ -1224,21 +3898,38 @@ def sanitisation_main_thread_action(event):
     remove_newlines_in_text_field(sanitisation_thread_state.target_text_field, sanitisation_thread_state.target_text_field_cursor)
     sanitisation_thread_state.is_complete = True
 
-create_toolbar_row_0() # 64
-create_separator(4, "black")
-create_toolbar_row_1() # 64
-create_separator(16, "black")
-create_sort_bar() # 32
-create_separator(16, "black")
-# 592 (List of 15 files, each 32 pixels high, with a separator of 8 pixels high between each one, with no separator after the last file)
-# 64 + 4 + 64 + 16 + 32 + 16 + 592 = 788 pixels high
-
-# https://stackoverflow.com/questions/17355902/tkinter-binding-mousewheel-to-scrollbar
-if CURRENT_OS == "Linux":
-    root.bind("<Button-4>", lambda event : file_scrollup_button.invoke())
-    root.bind("<Button-5>", lambda event : file_scrolldown_button.invoke())
-else:
-    root.bind("<MouseWheel>", lambda event : file_scrollup_button.invoke() if event.delta > 0 else file_scrolldown_button.invoke() if event.delta < 0 else None)
-
-root.bind(SANITISE_EVENT_KEY, sanitisation_main_thread_action)
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    root = tk.Tk()
+
+    root.geometry("1280x788")
+    root.title(ROOT_TITLE)
+    root.resizable(0, 0)
+
+    create_toolbar_row_0() # 64
+    create_separator(4, "black")
+    create_toolbar_row_1() # 64
+    create_separator(16, "black")
+    create_sort_bar() # 32
+    create_separator(16, "black")
+    create_file_list()
+    create_job_panel()
+    # 592 (List of 15 files, each 32 pixels high, with a separator of 8 pixels high between each one, with no separator after the last file)
+    # 64 + 4 + 64 + 16 + 32 + 16 + 592 = 788 pixels high
+
+    # https://stackoverflow.com/questions/17355902/tkinter-binding-mousewheel-to-scrollbar
+    if CURRENT_OS == "Linux":
+        root.bind("<Button-4>", lambda event : request_scroll_by(-SCROLL_WHEEL_ROW_COUNT))
+        root.bind("<Button-5>", lambda event : request_scroll_by(SCROLL_WHEEL_ROW_COUNT))
+    else:
+        root.bind("<MouseWheel>", lambda event : request_scroll_by(-SCROLL_WHEEL_ROW_COUNT) if event.delta > 0 else request_scroll_by(SCROLL_WHEEL_ROW_COUNT) if event.delta < 0 else None)
+
+    root.bind("<Prior>", lambda event : on_scroll_key(event, lambda : current_directory_list_index - (MAX_LIST_LENGTH - 1)))
+    root.bind("<Next>", lambda event : on_scroll_key(event, lambda : current_directory_list_index + (MAX_LIST_LENGTH - 1)))
+    root.bind("<Home>", lambda event : on_scroll_key(event, lambda : 0))
+    root.bind("<End>", lambda event : on_scroll_key(event, get_max_directory_list_index))
+
+    root.bind(SANITISE_EVENT_KEY, sanitisation_main_thread_action)
+    process_main_thread_callbacks()
+    on_scan_devices()
+    start_metadata_index_update()
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import sys
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+# Runs AdbShellSession against tests/fake_adb, whose "device" shell is the host shell
+class AdbShellSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+        self.adb_shell_session = adb_file_viewer.AdbShellSession(None)
+
+    def tearDown(self):
+        self.adb_shell_session.close()
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+
+    def test_output_is_framed(self):
+        result = self.adb_shell_session.run("printf 'first\\nsecond'")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"first\nsecond")
+
+        # Output which looks like the start of a token is still returned as output
+        result = self.adb_shell_session.run("printf '%s' " + adb_file_viewer.ADB_SHELL_SESSION_TOKEN_PREFIX)
+        self.assertEqual(result.stdout, adb_file_viewer.ADB_SHELL_SESSION_TOKEN_PREFIX.encode("utf-8"))
+
+    def test_binary_output(self):
+        result = self.adb_shell_session.run("printf 'a\\0b\\377'")
+        self.assertEqual(result.stdout, b"a\0b\xff")
+
+    def test_exit_codes(self):
+        self.assertEqual(self.adb_shell_session.run("true").returncode, 0)
+        self.assertEqual(self.adb_shell_session.run("false").returncode, 1)
+        self.assertNotEqual(self.adb_shell_session.run("ls /no/such/path 2>/dev/null").returncode, 0)
+
+    def test_exit_and_exec_keep_the_session(self):
+        self.adb_shell_session.run("true")
+        process = self.adb_shell_session.process
+
+        result = self.adb_shell_session.run("echo before; exit 3")
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.stdout, b"before\n")
+
+        result = self.adb_shell_session.run("exec sh -c 'exit 4'")
+        self.assertEqual(result.returncode, 4)
+
+        self.assertEqual(self.adb_shell_session.run("echo after").stdout, b"after\n")
+        self.assertIs(self.adb_shell_session.process, process)
+
+    def test_commands_can_not_read_the_session_input(self):
+        result = self.adb_shell_session.run("cat")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"")
+        self.assertEqual(self.adb_shell_session.run("echo next").stdout, b"next\n")
+
+    def test_session_is_reused(self):
+        self.adb_shell_session.run("true")
+        process = self.adb_shell_session.process
+        for command_index in range(0, 20):
+            self.assertEqual(self.adb_shell_session.run("echo {command_index}".format(command_index=command_index)).stdout, "{command_index}\n".format(command_index=command_index).encode("utf-8"))
+        self.assertIs(self.adb_shell_session.process, process)
+
+    def test_session_restarts_after_dying(self):
+        self.adb_shell_session.run("true")
+        self.adb_shell_session.close()
+        self.adb_shell_session.process.wait()
+
+        result = self.adb_shell_session.run("echo again")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"again\n")
+
+    def test_output_callback(self):
+        output = bytearray()
+
+        def on_output(new_output):
+            output.extend(new_output)
+            return True
+
+        result = self.adb_shell_session.run("seq 1 20000", on_output)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"")
+        self.assertEqual(bytes(output), "".join(map(lambda number : "{number}\n".format(number=number), range(1, 20001))).encode("utf-8"))
+
+    def test_output_callback_can_stop_the_command(self):
+        result = self.adb_shell_session.run("seq 1 1000000", lambda new_output : False)
+        self.assertEqual(result.returncode, adb_file_viewer.ADB_SHELL_SESSION_INTERRUPTED_RETURN_CODE)
+        self.assertEqual(self.adb_shell_session.run("echo restarted").stdout, b"restarted\n")
+
+class GetConnectedDevicesTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+    def tearDown(self):
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+
+    # Devices which are not ready to run commands are left out
+    def test_ready_devices_are_listed(self):
+        self.assertEqual(adb_file_viewer.get_connected_devices(), [("FAKE1", "Fake_1")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+# Runs run_batched_path_command against tests/fake_adb, whose "device" is a temporary directory on the host
+class RunBatchedPathCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        self.absolute_source_directory = os.path.join(self.temporary_directory_path, "source") + "/"
+        self.absolute_destination_directory = os.path.join(self.temporary_directory_path, "destination") + "/"
+        os.makedirs(self.absolute_source_directory)
+        os.makedirs(self.absolute_destination_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+
+    def write_file(self, absolute_file_path):
+        with open(absolute_file_path, "w") as new_file:
+            new_file.write("test")
+
+    def copy(self, file_name_list):
+        job = adb_file_viewer.Job("Copy", None)
+        absolute_path_list = list(map(lambda file_name : self.absolute_source_directory + file_name, file_name_list))
+        failed_paths = adb_file_viewer.run_batched_path_command(adb_file_viewer.COPY_COMMAND, absolute_path_list, "copy", job, absolute_directory=adb_file_viewer.quote_path_correctly_single(self.absolute_destination_directory))
+        return job, failed_paths
+
+    def test_copied(self):
+        self.write_file(self.absolute_source_directory + "a.txt")
+        self.write_file(self.absolute_source_directory + "b.txt")
+        job, failed_paths = self.copy(["a.txt", "b.txt"])
+
+        self.assertEqual(failed_paths, {})
+        self.assertEqual(job.file_count, 2)
+        self.assertEqual(job.failed_count, 0)
+
+    def test_error_naming_a_source_path(self):
+        self.write_file(self.absolute_source_directory + "a.txt")
+        job, failed_paths = self.copy(["a.txt", "missing.txt"])
+
+        self.assertEqual(list(failed_paths.keys()), [self.absolute_source_directory + "missing.txt"])
+        self.assertEqual(job.file_count, 2)
+        self.assertEqual(job.failed_count, 1)
+
+    # e.g. "cp: cannot overwrite directory '.../destination/a' with non-directory" names the destination rather than the source
+    def test_error_naming_no_source_path(self):
+        self.write_file(self.absolute_source_directory + "a")
+        os.makedirs(self.absolute_destination_directory + "a")
+        job, failed_paths = self.copy(["a"])
+
+        self.assertEqual(list(failed_paths.keys()), [self.absolute_source_directory + "a"])
+        self.assertEqual(job.failed_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+class ParseDateTimeStringTest(unittest.TestCase):
+    def test_date_time(self):
+        self.assertEqual(adb_file_viewer.parse_date_time_string("2000-01-01 23:45"), int(datetime.datetime(2000, 1, 1, 23, 45).timestamp()))
+        self.assertEqual(adb_file_viewer.parse_date_time_string("2024-02-29 00:00"), int(datetime.datetime(2024, 2, 29, 0, 0).timestamp()))
+
+    def test_other_formats_are_rejected(self):
+        for date_time_string in ["2000-01-01 23:45:00", "2000-01-01T23:45", "01/01/2000 23:45", "Jan  1 23:45 2000", "2000-1-01 23:45", "", "2000-13-01 23:45", "2000-02-30 23:45", "20a0-01-01 23:45"]:
+            with self.assertRaises(ValueError):
+                adb_file_viewer.parse_date_time_string(date_time_string)
+
+# Lists a temporary directory through get_file_list_from_ls, with tests/fake_adb running ls on the host as if it were the device.
+# The host's ls prints dates like "Jan  1 23:45", which can't be parsed, so every date comes from the batched stat fallback.
+class GetFileListFromLsTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.get_file_details_batch_size = adb_file_viewer.GET_FILE_DETAILS_BATCH_SIZE
+        self.refresh_main_thread_action_add_files = adb_file_viewer.refresh_main_thread_action_add_files
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+        # The main thread action is recorded rather than presented
+        self.presented_file_list = []
+        adb_file_viewer.refresh_main_thread_action_add_files = lambda thread_state, file_list : self.presented_file_list.extend(file_list)
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        self.absolute_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        os.makedirs(os.path.join(self.absolute_directory, "Directory"))
+        for file_index in range(0, 5):
+            absolute_file_path = os.path.join(self.absolute_directory, "file {file_index}.txt".format(file_index=file_index))
+            with open(absolute_file_path, "w") as new_file:
+                new_file.write("x" * file_index)
+            os.utime(absolute_file_path, (1700000000 + file_index, 1700000000 + file_index))
+
+    def tearDown(self):
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.GET_FILE_DETAILS_BATCH_SIZE = self.get_file_details_batch_size
+        adb_file_viewer.refresh_main_thread_action_add_files = self.refresh_main_thread_action_add_files
+
+    def test_unparsable_dates_are_fetched_in_batches(self):
+        adb_file_viewer.GET_FILE_DETAILS_BATCH_SIZE = 2
+        directory_list = adb_file_viewer.get_file_list_from_ls(adb_file_viewer.RefreshThreadState(self.absolute_directory))
+        while adb_file_viewer.main_thread_callback_queue.empty() == False:
+            adb_file_viewer.main_thread_callback_queue.get_nowait()()
+
+        self.assertEqual(list(map(lambda file : file.file_name, directory_list)), ["Directory"])
+        self.assertEqual(sorted(map(lambda file : (file.file_name, file.file_size_bytes, file.file_modified_epoch), self.presented_file_list)), list(map(lambda file_index : ("file {file_index}.txt".format(file_index=file_index), file_index, 1700000000 + file_index), range(0, 5))))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+class DirectoryListingCacheTest(unittest.TestCase):
+    def test_listing_is_copied(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(60, 10, 100)
+        file_list = ["a", "b"]
+        directory_listing_cache.put(("FAKE1", "/sdcard/"), file_list)
+        file_list.append("c")
+
+        cached_file_list = directory_listing_cache.get(("FAKE1", "/sdcard/"))
+        self.assertEqual(cached_file_list, ["a", "b"])
+        cached_file_list.append("d")
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/sdcard/")), ["a", "b"])
+        self.assertEqual(directory_listing_cache.get(("FAKE2", "/sdcard/")), None)
+
+    def test_entries_expire(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(0.05, 10, 100)
+        directory_listing_cache.put(("FAKE1", "/sdcard/"), ["a"])
+        time.sleep(0.1)
+
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/sdcard/")), None)
+        self.assertEqual(directory_listing_cache.file_count, 0)
+
+    # The least recently used entry is removed first, and reading an entry counts as using it
+    def test_least_recently_used_entry_is_removed(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(60, 2, 100)
+        directory_listing_cache.put(("FAKE1", "/a/"), ["a"])
+        directory_listing_cache.put(("FAKE1", "/b/"), ["b"])
+        directory_listing_cache.get(("FAKE1", "/a/"))
+        directory_listing_cache.put(("FAKE1", "/c/"), ["c"])
+
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/a/")), ["a"])
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/b/")), None)
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/c/")), ["c"])
+
+    def test_file_count_limit(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(60, 10, 3)
+        directory_listing_cache.put(("FAKE1", "/a/"), ["a1", "a2"])
+        directory_listing_cache.put(("FAKE1", "/b/"), ["b1", "b2"])
+
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/a/")), None)
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/b/")), ["b1", "b2"])
+        self.assertEqual(directory_listing_cache.file_count, 2)
+
+        # A single listing bigger than the limit is still kept, until something else is added
+        directory_listing_cache.put(("FAKE1", "/big/"), ["1", "2", "3", "4"])
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/big/")), ["1", "2", "3", "4"])
+        self.assertEqual(directory_listing_cache.file_count, 4)
+
+    # Putting the same directory again replaces its listing, rather than counting its files twice
+    def test_replaced_entry(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(60, 10, 100)
+        directory_listing_cache.put(("FAKE1", "/a/"), ["a1", "a2"])
+        directory_listing_cache.put(("FAKE1", "/a/"), ["a3"])
+
+        self.assertEqual(directory_listing_cache.get(("FAKE1", "/a/")), ["a3"])
+        self.assertEqual(directory_listing_cache.file_count, 1)
+
+    def test_remove_tree(self):
+        directory_listing_cache = adb_file_viewer.DirectoryListingCache(60, 10, 100)
+        for key in [("FAKE1", "/sdcard/"), ("FAKE1", "/sdcard/DCIM/"), ("FAKE1", "/sdcard/DCIM/Camera/"), ("FAKE1", "/sdcard/DCIM0/"), ("FAKE2", "/sdcard/DCIM/")]:
+            directory_listing_cache.put(key, ["file"])
+        directory_listing_cache.remove_tree("FAKE1", "/sdcard/DCIM/")
+
+        self.assertEqual(list(directory_listing_cache.entries.keys()), [("FAKE1", "/sdcard/"), ("FAKE1", "/sdcard/DCIM0/"), ("FAKE2", "/sdcard/DCIM/")])
+        self.assertEqual(directory_listing_cache.file_count, 3)
+
+if __name__ == "__main__":
+    unittest.main()
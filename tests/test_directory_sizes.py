@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+# The output of GET_CHILD_DIRECTORY_KBYTE_SIZES_COMMAND, one "size\tpath" line per directory
+class ParseChildDirectoryByteSizesTest(unittest.TestCase):
+    def test_child_directories(self):
+        output = "12\t/sdcard/DCIM\n4\t/sdcard/My Music\n20\t/sdcard/\n"
+
+        self.assertEqual(adb_file_viewer.parse_child_directory_byte_sizes(output, "/sdcard/"), {"DCIM": 12000, "My Music": 4000})
+
+    # Some versions of du repeat the slash given at the end of the directory
+    def test_doubled_slashes(self):
+        output = "12\t/sdcard//DCIM\n20\t/sdcard/\n"
+
+        self.assertEqual(adb_file_viewer.parse_child_directory_byte_sizes(output, "/sdcard/"), {"DCIM": 12000})
+
+    def test_root_directory(self):
+        output = "8\t/data\n4\t/sdcard\n12\t/\n"
+
+        self.assertEqual(adb_file_viewer.parse_child_directory_byte_sizes(output, "/"), {"data": 8000, "sdcard": 4000})
+
+    # e.g. "du: /sdcard/private: Permission denied", or a directory deeper down
+    def test_other_lines_are_skipped(self):
+        output = "du: /sdcard/private: Permission denied\n12\t/sdcard/DCIM/Camera\nabc\t/sdcard/Bad\n4\t/sdcard/DCIM\n"
+
+        self.assertEqual(adb_file_viewer.parse_child_directory_byte_sizes(output, "/sdcard/"), {"DCIM": 4000})
+
+    def test_name_with_a_tab(self):
+        output = "4\t/sdcard/a\tb\n"
+
+        self.assertEqual(adb_file_viewer.parse_child_directory_byte_sizes(output, "/sdcard/"), {"a\tb": 4000})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+class ParseFileListWithDetailsTest(unittest.TestCase):
+    def test_records(self):
+        file_list = adb_file_viewer.parse_file_list_with_details([b"d/4096/1700000000.123456789/DCIM", b"f/1050/1700000000.0/test file.txt", b"f/0/1700000000/new\nline"], "/sdcard/")
+
+        self.assertEqual(list(map(lambda file : (file.is_directory, file.file_name, file.file_absolute_directory_path, file.file_modified_epoch, file.file_size_bytes), file_list)), [
+            (True, "DCIM", "/sdcard/", 1700000000, 4096),
+            (False, "test file.txt", "/sdcard/", 1700000000, 1050),
+            (False, "new\nline", "/sdcard/", 1700000000, 0),
+        ])
+
+    # e.g. a find which does not support every -printf directive
+    def test_unreadable_records_are_skipped(self):
+        file_list = adb_file_viewer.parse_file_list_with_details([b"f/10/1700000000/", b"f/10/1700000000", b"f/ten/1700000000/a.txt", b"f/10/%T@/b.txt", b"f/10/1700000000/c.txt"], "/sdcard/")
+
+        self.assertEqual(list(map(lambda file : file.file_name, file_list)), ["c.txt"])
+
+    def test_names_are_decoded_as_utf8(self):
+        file_list = adb_file_viewer.parse_file_list_with_details(["f/1/1700000000/café".encode("utf-8"), b"f/1/1700000000/bad\xff"], "/sdcard/")
+
+        self.assertEqual(list(map(lambda file : file.file_name, file_list)), ["café", "bad�"])
+
+# Lists a temporary directory through get_file_list, with tests/fake_adb running find and du on the host as if it were the device
+class GetFileListTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.adb_shell_session_read_size = adb_file_viewer.ADB_SHELL_SESSION_READ_SIZE
+        self.refresh_main_thread_action_add_files = adb_file_viewer.refresh_main_thread_action_add_files
+        self.refresh_main_thread_action_set_directory_sizes = adb_file_viewer.refresh_main_thread_action_set_directory_sizes
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+        # The main thread actions are recorded rather than presented
+        self.presented_file_list = []
+        self.held_directory_list = []
+        adb_file_viewer.refresh_main_thread_action_add_files = lambda thread_state, file_list : self.presented_file_list.extend(file_list)
+        adb_file_viewer.refresh_main_thread_action_set_directory_sizes = lambda thread_state, held_directory_list, child_directory_byte_sizes : self.held_directory_list.extend(held_directory_list)
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        self.absolute_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        os.makedirs(os.path.join(self.absolute_directory, "Directory"))
+        for file_index in range(0, 300):
+            with open(os.path.join(self.absolute_directory, "file {file_index}.txt".format(file_index=file_index)), "w") as new_file:
+                new_file.write("x" * file_index)
+
+    def tearDown(self):
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.ADB_SHELL_SESSION_READ_SIZE = self.adb_shell_session_read_size
+        adb_file_viewer.refresh_main_thread_action_add_files = self.refresh_main_thread_action_add_files
+        adb_file_viewer.refresh_main_thread_action_set_directory_sizes = self.refresh_main_thread_action_set_directory_sizes
+
+    def run_main_thread_callbacks(self):
+        while adb_file_viewer.main_thread_callback_queue.empty() == False:
+            adb_file_viewer.main_thread_callback_queue.get_nowait()()
+
+    # Records are split across many reads of the output, and each one must still be parsed once, whole
+    def test_records_split_across_chunks(self):
+        adb_file_viewer.ADB_SHELL_SESSION_READ_SIZE = 7
+        adb_file_viewer.get_file_list(adb_file_viewer.RefreshThreadState(self.absolute_directory))
+        self.run_main_thread_callbacks()
+
+        file_sizes = {}
+        for file in self.presented_file_list:
+            file_sizes[file.file_name] = file.file_size_bytes
+        self.assertEqual(len(self.presented_file_list), 300)
+        for file_index in range(0, 300):
+            self.assertEqual(file_sizes["file {file_index}.txt".format(file_index=file_index)], file_index)
+        self.assertEqual(list(map(lambda file : (file.file_name, file.is_directory), self.held_directory_list)), [("Directory", True)])
+
+if __name__ == "__main__":
+    unittest.main()
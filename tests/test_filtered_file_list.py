@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+# update_filtered_current_directory_list only reads and writes module globals, so each test sets them and they are put back afterwards
+FILTER_GLOBAL_NAMES = ["current_directory_list", "current_directory_value", "search_file_field_value", "copy_move_state_info_object", "filtered_current_directory_list", "filtered_current_directory_list_state", "filtered_current_directory_list_is_valid"]
+
+class UpdateFilteredCurrentDirectoryListTest(unittest.TestCase):
+    def setUp(self):
+        self.filter_globals = {}
+        for global_name in FILTER_GLOBAL_NAMES:
+            self.filter_globals[global_name] = getattr(adb_file_viewer, global_name)
+
+        adb_file_viewer.current_directory_value = "/sdcard/"
+        adb_file_viewer.current_directory_list = [
+            adb_file_viewer.FileDescriptor(True, "DCIM", "/sdcard/", 0, 0),
+            adb_file_viewer.FileDescriptor(True, "Holiday Photos", "/sdcard/", 0, 0),
+            adb_file_viewer.FileDescriptor(False, "holiday.jpg", "/sdcard/", 0, 0),
+            adb_file_viewer.FileDescriptor(False, "notes.txt", "/sdcard/", 0, 0),
+        ]
+        adb_file_viewer.search_file_field_value = ""
+        adb_file_viewer.copy_move_state_info_object = None
+        adb_file_viewer.filtered_current_directory_list = []
+        adb_file_viewer.filtered_current_directory_list_state = ("", None, None)
+        adb_file_viewer.filtered_current_directory_list_is_valid = False
+
+    def tearDown(self):
+        for global_name in FILTER_GLOBAL_NAMES:
+            setattr(adb_file_viewer, global_name, self.filter_globals[global_name])
+
+    def get_filtered_file_names(self):
+        adb_file_viewer.update_filtered_current_directory_list()
+        self.assertEqual(adb_file_viewer.filtered_current_directory_list_is_valid, True)
+        return list(map(lambda file : file.file_name, adb_file_viewer.filtered_current_directory_list))
+
+    def test_no_filter(self):
+        self.assertEqual(self.get_filtered_file_names(), ["DCIM", "Holiday Photos", "holiday.jpg", "notes.txt"])
+
+    def test_search_ignores_case(self):
+        adb_file_viewer.search_file_field_value = "HOLIDAY"
+
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg"])
+
+    # Typing more of the search value only checks the files which were presented, until the list is invalidated
+    def test_narrowed_search_until_invalidated(self):
+        adb_file_viewer.search_file_field_value = "holi"
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg"])
+
+        adb_file_viewer.current_directory_list.append(adb_file_viewer.FileDescriptor(False, "holiday.png", "/sdcard/", 0, 0))
+        adb_file_viewer.search_file_field_value = "holiday"
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg"])
+
+        adb_file_viewer.invalidate_filtered_current_directory_list()
+        self.assertEqual(adb_file_viewer.filtered_current_directory_list_is_valid, False)
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg", "holiday.png"])
+
+    # A search value which is not a narrowing of the previous one checks every file again
+    def test_widened_search(self):
+        adb_file_viewer.search_file_field_value = "holiday.jpg"
+        self.assertEqual(self.get_filtered_file_names(), ["holiday.jpg"])
+
+        adb_file_viewer.search_file_field_value = "o"
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg", "notes.txt"])
+
+    # Only directories are presented while copying/moving, apart from the ones being copied/moved in the directory they come from
+    def test_copy_move_state(self):
+        adb_file_viewer.copy_move_state_info_object = adb_file_viewer.CopyMoveStateInfo("/sdcard/", [adb_file_viewer.current_directory_list[0], adb_file_viewer.current_directory_list[3]], None)
+        adb_file_viewer.search_file_field_value = "o"
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos"])
+
+        adb_file_viewer.search_file_field_value = ""
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos"])
+
+        adb_file_viewer.current_directory_value = "/sdcard/Download/"
+        self.assertEqual(self.get_filtered_file_names(), ["DCIM", "Holiday Photos"])
+
+    # A narrowed search value after the copy/move state has changed still checks every file
+    def test_narrowed_search_after_copy_move_state_changed(self):
+        adb_file_viewer.search_file_field_value = "a"
+        adb_file_viewer.copy_move_state_info_object = adb_file_viewer.CopyMoveStateInfo("/sdcard/", [], None)
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos"])
+
+        adb_file_viewer.search_file_field_value = "ay"
+        adb_file_viewer.copy_move_state_info_object = None
+        self.assertEqual(self.get_filtered_file_names(), ["Holiday Photos", "holiday.jpg"])
+
+if __name__ == "__main__":
+    unittest.main()
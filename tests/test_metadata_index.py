@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+class InvalidateDirectoryListingTest(unittest.TestCase):
+    def setUp(self):
+        self.use_metadata_index = adb_file_viewer.USE_METADATA_INDEX
+        self.temporary_directory_path = tempfile.mkdtemp()
+        self.metadata_index = adb_file_viewer.MetadataIndex(os.path.join(self.temporary_directory_path, "index.sqlite3"))
+        adb_file_viewer.USE_METADATA_INDEX = True
+        adb_file_viewer.metadata_indexes["FAKE1"] = self.metadata_index
+
+        self.metadata_index.add_records([
+            ("/sdcard/", "DCIM", 1, 4096, 1700000000),
+            ("/sdcard/", "DCIM0", 1, 4096, 1700000000),
+            ("/sdcard/", "test.txt", 0, 10, 1700000000),
+            ("/sdcard/DCIM/", "Camera", 1, 4096, 1700000000),
+            ("/sdcard/DCIM/Camera/", "IMG_1.jpg", 0, 1000, 1700000000),
+            ("/sdcard/DCIM0/", "keep.jpg", 0, 100, 1700000000),
+        ])
+        self.metadata_index.set_directory_modified_epochs([("/sdcard/", 1700000000), ("/sdcard/DCIM/", 1700000000), ("/sdcard/DCIM/Camera/", 1700000000), ("/sdcard/DCIM0/", 1700000000)])
+
+    def tearDown(self):
+        del adb_file_viewer.metadata_indexes["FAKE1"]
+        adb_file_viewer.USE_METADATA_INDEX = self.use_metadata_index
+        self.metadata_index.connection.close()
+        shutil.rmtree(self.temporary_directory_path)
+
+    def get_file_names(self, absolute_directory):
+        file_list = self.metadata_index.get_file_list(absolute_directory)
+        return None if file_list is None else sorted(map(lambda file : file.file_name, file_list))
+
+    # e.g. after a delete or a move, nothing of the directory is left in the index, including its record in the directory it was in
+    def test_removed_directory_leaves_the_index(self):
+        adb_file_viewer.invalidate_directory_listing("FAKE1", "/sdcard/DCIM/", include_subdirectories=True)
+
+        self.assertEqual(self.get_file_names("/sdcard/"), ["DCIM0", "test.txt"])
+        self.assertEqual(self.get_file_names("/sdcard/DCIM/"), None)
+        self.assertEqual(self.get_file_names("/sdcard/DCIM/Camera/"), None)
+        self.assertEqual(self.get_file_names("/sdcard/DCIM0/"), ["keep.jpg"])
+
+    def test_removed_file_leaves_the_index(self):
+        adb_file_viewer.invalidate_directory_listing("FAKE1", "/sdcard/test.txt/", include_subdirectories=True)
+
+        self.assertEqual(self.get_file_names("/sdcard/"), ["DCIM", "DCIM0"])
+
+    # Only the contents of a changed directory are removed, e.g. after a file was copied into it
+    def test_changed_directory_is_listed_again(self):
+        adb_file_viewer.invalidate_directory_listing("FAKE1", "/sdcard/DCIM/")
+
+        self.assertEqual(self.get_file_names("/sdcard/"), ["DCIM", "DCIM0", "test.txt"])
+        self.assertEqual(self.get_file_names("/sdcard/DCIM/"), None)
+        self.assertEqual(self.get_file_names("/sdcard/DCIM/Camera/"), ["IMG_1.jpg"])
+
+if __name__ == "__main__":
+    unittest.main()
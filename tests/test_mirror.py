@@ -0,0 +1,111 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+# Mirrors through run_mirror, with tests/fake_adb running find and pull on the host as if it were the device
+# The mirror is written to OUTPUT_FOLDER inside a temporary working directory, which already holds an older pull.
+class RunMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.current_os = adb_file_viewer.CURRENT_OS
+        self.mirror_remove_deleted_files = adb_file_viewer.MIRROR_REMOVE_DELETED_FILES
+        self.working_directory_path = os.getcwd()
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+        adb_file_viewer.CURRENT_OS = "Linux"
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        # Stands in for e.g. "/sdcard/"
+        self.absolute_device_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        self.host_directory_path = os.path.join(self.temporary_directory_path, "host")
+        self.output_directory_path = os.path.join(self.host_directory_path, adb_file_viewer.OUTPUT_FOLDER)
+        os.makedirs(self.host_directory_path)
+        os.chdir(self.host_directory_path)
+
+        self.write_file(self.absolute_device_directory, "test.txt", b"test")
+        self.write_file(self.absolute_device_directory, "DCIM/same.jpg", b"same")
+        self.write_file(self.absolute_device_directory, "DCIM/new.jpg", b"new")
+        self.write_file(self.absolute_device_directory, "DCIM/changed.jpg", b"changed")
+        self.write_file(self.absolute_device_directory, "DCIM/Thing/inside.jpg", b"inside")
+        os.makedirs(os.path.join(self.absolute_device_directory, "DCIM", "Empty"))
+
+        # The same size and date modified as on the device, so it is left alone even though its content differs
+        self.write_file(self.output_directory_path, "DCIM/same.jpg", b"SAME")
+        self.write_file(self.output_directory_path, "DCIM/changed.jpg", b"old")
+        # A file on the host where the device has a directory
+        self.write_file(self.output_directory_path, "DCIM/Thing", b"file")
+        self.write_file(self.output_directory_path, "DCIM/deleted.jpg", b"deleted")
+
+    def tearDown(self):
+        os.chdir(self.working_directory_path)
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.CURRENT_OS = self.current_os
+        adb_file_viewer.MIRROR_REMOVE_DELETED_FILES = self.mirror_remove_deleted_files
+
+    def write_file(self, absolute_directory_path, relative_file_path, content):
+        absolute_file_path = os.path.join(absolute_directory_path, relative_file_path)
+        os.makedirs(os.path.dirname(absolute_file_path), exist_ok=True)
+        with open(absolute_file_path, "wb") as new_file:
+            new_file.write(content)
+        os.utime(absolute_file_path, (1700000000, 1700000000))
+
+    def mirror(self, file_name_list):
+        mirror_file_list = []
+        for file_name in file_name_list:
+            absolute_file_path = os.path.join(self.absolute_device_directory, file_name)
+            mirror_file_list.append(adb_file_viewer.FileDescriptor(os.path.isdir(absolute_file_path), file_name, self.absolute_device_directory, 0, 0))
+
+        job = adb_file_viewer.Job("Mirror", None)
+        adb_file_viewer.run_mirror(self.absolute_device_directory, mirror_file_list, job)
+        return job
+
+    def get_mirrored_path_list(self):
+        mirrored_path_list = []
+        for absolute_directory_path, directory_name_list, file_name_list in os.walk(self.output_directory_path):
+            for name in directory_name_list + file_name_list:
+                mirrored_path_list.append(os.path.relpath(os.path.join(absolute_directory_path, name), self.output_directory_path))
+        return sorted(mirrored_path_list)
+
+    def read_mirrored_file(self, relative_file_path):
+        with open(os.path.join(self.output_directory_path, relative_file_path), "rb") as mirrored_file:
+            return mirrored_file.read()
+
+    # Only missing and changed files are pulled, and a file where the device has a directory is replaced
+    def test_differences_are_pulled(self):
+        adb_file_viewer.MIRROR_REMOVE_DELETED_FILES = False
+        job = self.mirror(["test.txt", "DCIM"])
+
+        self.assertEqual(self.get_mirrored_path_list(), ["DCIM", "DCIM/Empty", "DCIM/Thing", "DCIM/Thing/inside.jpg", "DCIM/changed.jpg", "DCIM/deleted.jpg", "DCIM/new.jpg", "DCIM/same.jpg", "test.txt"])
+        self.assertEqual(self.read_mirrored_file("DCIM/same.jpg"), b"SAME")
+        self.assertEqual(self.read_mirrored_file("DCIM/changed.jpg"), b"changed")
+        self.assertEqual(self.read_mirrored_file("DCIM/Thing/inside.jpg"), b"inside")
+        self.assertEqual(int(os.path.getmtime(os.path.join(self.output_directory_path, "DCIM", "new.jpg"))), 1700000000)
+        self.assertEqual((job.file_count, job.failed_count), (4, 0))
+
+    def test_deleted_files_are_removed(self):
+        adb_file_viewer.MIRROR_REMOVE_DELETED_FILES = True
+        self.mirror(["DCIM"])
+
+        self.assertEqual(self.get_mirrored_path_list(), ["DCIM", "DCIM/Empty", "DCIM/Thing", "DCIM/Thing/inside.jpg", "DCIM/changed.jpg", "DCIM/new.jpg", "DCIM/same.jpg"])
+
+    # A selected file which could not be listed is counted as failed, and nothing on the host is removed for it
+    def test_missing_file_is_not_removed(self):
+        adb_file_viewer.MIRROR_REMOVE_DELETED_FILES = True
+        self.write_file(self.output_directory_path, "gone.txt", b"gone")
+        job = self.mirror(["gone.txt", "test.txt"])
+
+        self.assertEqual(self.read_mirrored_file("gone.txt"), b"gone")
+        self.assertEqual(self.read_mirrored_file("test.txt"), b"test")
+        self.assertEqual((job.file_count, job.failed_count), (2, 1))
+
+if __name__ == "__main__":
+    unittest.main()
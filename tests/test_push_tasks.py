@@ -0,0 +1,101 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+# Pushes through get_push_tasks and run_push_tasks, with tests/fake_adb running mkdir and push on the host as if it were the device
+class PushTasksTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.push_directories_as_trees = adb_file_viewer.PUSH_DIRECTORIES_AS_TREES
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        # Stands in for e.g. "/sdcard/"
+        self.absolute_device_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        self.host_directory_path = os.path.join(self.temporary_directory_path, "host")
+        os.makedirs(self.absolute_device_directory)
+
+        self.write_host_file("test.txt", b"test")
+        self.write_host_file("fixtures/a.txt", b"a")
+        self.write_host_file("fixtures/images/b.jpg", b"bb")
+        os.makedirs(os.path.join(self.host_directory_path, "fixtures", "empty"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.PUSH_DIRECTORIES_AS_TREES = self.push_directories_as_trees
+
+    def write_host_file(self, relative_file_path, content):
+        absolute_file_path = os.path.join(self.host_directory_path, relative_file_path)
+        os.makedirs(os.path.dirname(absolute_file_path), exist_ok=True)
+        with open(absolute_file_path, "wb") as host_file:
+            host_file.write(content)
+
+    def get_push_tasks(self, job):
+        # A trailing slash on a directory is allowed, as the directory chooser may give one
+        absolute_path_on_host_list = [os.path.join(self.host_directory_path, "test.txt"), os.path.join(self.host_directory_path, "fixtures") + "/"]
+        push_task_list = adb_file_viewer.get_push_tasks(self.absolute_device_directory, absolute_path_on_host_list, job)
+        return sorted(map(lambda push_task : (push_task.absolute_file_path, os.path.relpath(push_task.absolute_file_path_on_host, self.host_directory_path), push_task.file_modified_epoch, push_task.file_size_bytes), push_task_list))
+
+    def get_device_path_list(self):
+        device_path_list = []
+        for absolute_directory_path, directory_name_list, file_name_list in os.walk(self.absolute_device_directory):
+            for name in directory_name_list + file_name_list:
+                device_path_list.append(os.path.relpath(os.path.join(absolute_directory_path, name), self.absolute_device_directory))
+        return sorted(device_path_list)
+
+    # A directory is pushed with a single task, sized by every file inside it
+    def test_directories_as_trees(self):
+        adb_file_viewer.PUSH_DIRECTORIES_AS_TREES = True
+        job = adb_file_viewer.Job("Push", None)
+
+        self.assertEqual(self.get_push_tasks(job), [
+            (self.absolute_device_directory, "fixtures", None, 3),
+            (self.absolute_device_directory + "test.txt", "test.txt", None, 4),
+        ])
+        self.assertEqual(self.get_device_path_list(), [])
+
+    # Every directory is created first, including empty ones, and then each file is pushed on its own
+    def test_directories_as_files(self):
+        adb_file_viewer.PUSH_DIRECTORIES_AS_TREES = False
+        job = adb_file_viewer.Job("Push", None)
+
+        self.assertEqual(self.get_push_tasks(job), [
+            (self.absolute_device_directory + "fixtures/a.txt", "fixtures/a.txt", None, 1),
+            (self.absolute_device_directory + "fixtures/images/b.jpg", "fixtures/images/b.jpg", None, 2),
+            (self.absolute_device_directory + "test.txt", "test.txt", None, 4),
+        ])
+        self.assertEqual(self.get_device_path_list(), ["fixtures", "fixtures/empty", "fixtures/images"])
+
+    def test_cancelled_job(self):
+        adb_file_viewer.PUSH_DIRECTORIES_AS_TREES = False
+        job = adb_file_viewer.Job("Push", None)
+        job.is_interrupted = True
+
+        self.assertEqual(self.get_push_tasks(job), [])
+        self.assertEqual(self.get_device_path_list(), [])
+
+    def test_push(self):
+        for push_directories_as_trees in [True, False]:
+            adb_file_viewer.PUSH_DIRECTORIES_AS_TREES = push_directories_as_trees
+            shutil.rmtree(self.absolute_device_directory)
+            os.makedirs(self.absolute_device_directory)
+            job = adb_file_viewer.Job("Push", None)
+
+            push_task_list = adb_file_viewer.get_push_tasks(self.absolute_device_directory, [os.path.join(self.host_directory_path, "test.txt"), os.path.join(self.host_directory_path, "fixtures")], job)
+            adb_file_viewer.run_push_tasks(push_task_list, job)
+
+            self.assertEqual(self.get_device_path_list(), ["fixtures", "fixtures/a.txt", "fixtures/empty", "fixtures/images", "fixtures/images/b.jpg", "test.txt"])
+            self.assertEqual((job.total_file_count, job.total_byte_count, job.file_count, job.failed_count), (len(push_task_list), 7, len(push_task_list), 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import datetime
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+class SearchQueryTest(unittest.TestCase):
+    def matches(self, query, file_name, file_size=0, file_modified_epoch=0):
+        return adb_file_viewer.SearchQuery(query).matches(file_name, file_size, file_modified_epoch)
+
+    def test_name_anywhere_ignoring_case(self):
+        self.assertEqual(self.matches("holiday", "My Holiday.jpg"), True)
+        self.assertEqual(self.matches("holiday", "work.jpg"), False)
+        self.assertEqual(self.matches("my holiday", "My Holiday.jpg"), True)
+
+    def test_glob_pattern(self):
+        self.assertEqual(self.matches("IMG_*.jpg", "img_1.JPG"), True)
+        self.assertEqual(self.matches("IMG_*.jpg", "x_img_1.jpg"), False)
+        self.assertEqual(self.matches("IMG_?.jpg", "IMG_10.jpg"), False)
+        self.assertEqual(self.matches("[ab].txt", "b.txt"), True)
+
+    def test_regular_expression(self):
+        self.assertEqual(self.matches("re:^IMG_\\d+", "img_20.jpg"), True)
+        self.assertEqual(self.matches("re:^IMG_\\d+", "IMG_x.jpg"), False)
+
+    def test_size(self):
+        self.assertEqual(self.matches("size>10K", "a", 10001), True)
+        self.assertEqual(self.matches("size>10K", "a", 10000), False)
+        self.assertEqual(self.matches("size<2m", "a", 1999999), True)
+        self.assertEqual(self.matches("size<2m", "a", 2000000), False)
+        self.assertEqual(self.matches("size>1G", "a", 1000 ** 3 + 1), True)
+
+    def test_date(self):
+        start_epoch = datetime.datetime(2024, 1, 31).timestamp()
+        self.assertEqual(self.matches("after:2024-01-31", "a", 0, start_epoch), True)
+        self.assertEqual(self.matches("after:2024-01-31", "a", 0, start_epoch - 1), False)
+        self.assertEqual(self.matches("before:2024-01-31", "a", 0, start_epoch - 1), True)
+        self.assertEqual(self.matches("before:2024-01-31", "a", 0, start_epoch), False)
+
+    def test_filters_combined(self):
+        search_query = adb_file_viewer.SearchQuery("size>1K jpg")
+        self.assertEqual(search_query.name_pattern, "*jpg*")
+        self.assertEqual(search_query.matches("a.jpg", 2000, 0), True)
+        self.assertEqual(search_query.matches("a.jpg", 500, 0), False)
+        self.assertEqual(search_query.matches("a.png", 2000, 0), False)
+
+    # With only filters, every name matches and find is given no name pattern
+    def test_filters_only(self):
+        search_query = adb_file_viewer.SearchQuery("size>1K")
+        self.assertEqual(search_query.name_pattern, None)
+        self.assertEqual(search_query.matches("anything", 2000, 0), True)
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValueError):
+            adb_file_viewer.SearchQuery("after:yesterday")
+        with self.assertRaises(re.error):
+            adb_file_viewer.SearchQuery("re:(")
+
+# Searches a temporary directory through search_files, with tests/fake_adb running find on the host as if it were the device
+class SearchFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.search_result_page_size = adb_file_viewer.SEARCH_RESULT_PAGE_SIZE
+        self.refresh_main_thread_action_add_files = adb_file_viewer.refresh_main_thread_action_add_files
+        self.search_main_thread_action_set_title = adb_file_viewer.search_main_thread_action_set_title
+        self.search_main_thread_action_complete = adb_file_viewer.search_main_thread_action_complete
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+        adb_file_viewer.SEARCH_RESULT_PAGE_SIZE = 2
+
+        # The main thread actions are recorded rather than presented
+        self.presented_file_list = []
+        adb_file_viewer.refresh_main_thread_action_add_files = lambda thread_state, file_list : self.presented_file_list.extend(file_list)
+        adb_file_viewer.search_main_thread_action_set_title = lambda thread_state, title : None
+        adb_file_viewer.search_main_thread_action_complete = lambda thread_state : setattr(thread_state, "is_complete", True)
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        self.absolute_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        os.makedirs(os.path.join(self.absolute_directory, "DCIM", "Camera"))
+        for relative_file_path in ["a.jpg", "note.txt", "DCIM/b.JPG", "DCIM/Camera/c.jpg"]:
+            with open(os.path.join(self.absolute_directory, relative_file_path), "w") as new_file:
+                new_file.write("test")
+
+    def tearDown(self):
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.SEARCH_RESULT_PAGE_SIZE = self.search_result_page_size
+        adb_file_viewer.refresh_main_thread_action_add_files = self.refresh_main_thread_action_add_files
+        adb_file_viewer.search_main_thread_action_set_title = self.search_main_thread_action_set_title
+        adb_file_viewer.search_main_thread_action_complete = self.search_main_thread_action_complete
+
+    def run_main_thread_callbacks(self):
+        while adb_file_viewer.main_thread_callback_queue.empty() == False:
+            adb_file_viewer.main_thread_callback_queue.get_nowait()()
+
+    def wait_until(self, condition):
+        end_time = time.monotonic() + 10
+        while condition() == False:
+            self.assertLess(time.monotonic(), end_time)
+            time.sleep(0.01)
+
+    # Results are named by their path inside the searched directory, and the search waits after each page without holding a shell session
+    def test_results_are_paged(self):
+        thread_state = adb_file_viewer.SearchThreadState(self.absolute_directory, adb_file_viewer.SearchQuery("jpg"))
+        search_thread_object = threading.Thread(target=adb_file_viewer.search_files, args=(thread_state,))
+        search_thread_object.start()
+
+        try:
+            self.wait_until(lambda : thread_state.is_paused == True)
+            self.assertEqual(adb_file_viewer.foreground_command_count, 0)
+            self.run_main_thread_callbacks()
+            self.assertEqual(len(self.presented_file_list), 2)
+
+            thread_state.next_page_event.set()
+            search_thread_object.join(10)
+            self.run_main_thread_callbacks()
+        finally:
+            thread_state.is_interrupted = True
+            search_thread_object.join(10)
+
+        self.assertEqual(thread_state.is_complete, True)
+        self.assertEqual(sorted(map(lambda file : file.file_name, self.presented_file_list)), ["DCIM/Camera/c.jpg", "DCIM/b.JPG", "a.jpg"])
+        self.assertEqual(set(map(lambda file : file.file_absolute_directory_path, self.presented_file_list)), {self.absolute_directory})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import unittest
+
+TESTS_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY_PATH))
+
+import adb_file_viewer
+
+FAKE_ADB_PATH = os.path.join(TESTS_DIRECTORY_PATH, "fake_adb")
+
+# Pulls through run_tar_stream_pull, with tests/fake_adb running tar on the host as if it were the device
+# The pull is written to OUTPUT_FOLDER inside a temporary working directory.
+class TarStreamPullTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime_adb_command = adb_file_viewer.RUNTIME_ADB_COMMAND
+        self.current_os = adb_file_viewer.CURRENT_OS
+        self.working_directory_path = os.getcwd()
+        adb_file_viewer.RUNTIME_ADB_COMMAND = FAKE_ADB_PATH
+
+        self.temporary_directory_path = tempfile.mkdtemp()
+        # Stands in for e.g. "/sdcard/"
+        self.absolute_device_directory = os.path.join(self.temporary_directory_path, "device") + "/"
+        self.host_directory_path = os.path.join(self.temporary_directory_path, "host")
+        os.makedirs(self.host_directory_path)
+        os.chdir(self.host_directory_path)
+
+        self.write_device_file("test.txt", b"test")
+        self.write_device_file("bad:name?.txt", b"unsafe")
+        self.write_device_file("TestDirectory/Sub|Directory/deep.txt", b"deep")
+        self.write_device_file("TestDirectory/it's $weird.txt", b"weird")
+        os.makedirs(os.path.join(self.absolute_device_directory, "TestDirectory", "Empty"))
+        os.utime(os.path.join(self.absolute_device_directory, "test.txt"), (1700000000, 1700000000))
+
+    def tearDown(self):
+        os.chdir(self.working_directory_path)
+        shutil.rmtree(self.temporary_directory_path)
+        adb_file_viewer.RUNTIME_ADB_COMMAND = self.runtime_adb_command
+        adb_file_viewer.CURRENT_OS = self.current_os
+
+    def write_device_file(self, relative_file_path, content):
+        absolute_file_path = os.path.join(self.absolute_device_directory, relative_file_path)
+        os.makedirs(os.path.dirname(absolute_file_path), exist_ok=True)
+        with open(absolute_file_path, "wb") as device_file:
+            device_file.write(content)
+
+    def pull(self, file_name_list):
+        pull_file_list = []
+        for file_name in file_name_list:
+            absolute_file_path = os.path.join(self.absolute_device_directory, file_name)
+            pull_file_list.append(adb_file_viewer.FileDescriptor(os.path.isdir(absolute_file_path), file_name, self.absolute_device_directory, 0, os.path.getsize(absolute_file_path)))
+
+        job = adb_file_viewer.Job("Pull", None)
+        adb_file_viewer.run_tar_stream_pull(self.absolute_device_directory, pull_file_list, job)
+        return job
+
+    def get_pulled_path_list(self):
+        output_directory_path = os.path.join(self.host_directory_path, adb_file_viewer.OUTPUT_FOLDER)
+        pulled_path_list = []
+        for absolute_directory_path, directory_name_list, file_name_list in os.walk(output_directory_path):
+            for name in directory_name_list + file_name_list:
+                pulled_path_list.append(os.path.relpath(os.path.join(absolute_directory_path, name), output_directory_path))
+        return sorted(pulled_path_list)
+
+    def read_pulled_file(self, relative_file_path):
+        with open(os.path.join(self.host_directory_path, adb_file_viewer.OUTPUT_FOLDER, relative_file_path), "rb") as pulled_file:
+            return pulled_file.read()
+
+    def test_nested_directories(self):
+        adb_file_viewer.CURRENT_OS = "Linux"
+        job = self.pull(["test.txt", "TestDirectory"])
+
+        self.assertEqual(self.get_pulled_path_list(), ["TestDirectory", "TestDirectory/Empty", "TestDirectory/Sub|Directory", "TestDirectory/Sub|Directory/deep.txt", "TestDirectory/it's $weird.txt", "test.txt"])
+        self.assertEqual(self.read_pulled_file("TestDirectory/Sub|Directory/deep.txt"), b"deep")
+        self.assertEqual(int(os.path.getmtime(os.path.join(self.host_directory_path, adb_file_viewer.OUTPUT_FOLDER, "test.txt"))), 1700000000)
+        self.assertEqual(job.file_count, 3)
+        self.assertEqual(job.failed_count, 0)
+
+    # Every part of every path is given its compatible name as it is unpacked
+    def test_windows_unsafe_names(self):
+        adb_file_viewer.CURRENT_OS = "Windows"
+        job = self.pull(["bad:name?.txt", "TestDirectory"])
+
+        self.assertEqual(self.get_pulled_path_list(), ["TestDirectory", "TestDirectory/Empty", "TestDirectory/SubDirectory", "TestDirectory/SubDirectory/deep.txt", "TestDirectory/it's $weird.txt", "badname.txt"])
+        self.assertEqual(self.read_pulled_file("badname.txt"), b"unsafe")
+        self.assertEqual(job.file_count, 3)
+
+    # A file name starting with "-" must not be read as an option by tar
+    def test_file_name_like_an_option(self):
+        self.write_device_file("--help", b"not an option")
+        job = self.pull(["--help"])
+
+        self.assertEqual(self.get_pulled_path_list(), ["--help"])
+        self.assertEqual(job.failed_count, 0)
+
+    def test_paths_outside_the_host_directory_are_skipped(self):
+        tar_stream_file = io.BytesIO()
+        with tarfile.open(fileobj=tar_stream_file, mode="w") as tar_stream:
+            for member_name in ["../escaped.txt", "./kept.txt"]:
+                member = tarfile.TarInfo(member_name)
+                member.size = 4
+                tar_stream.addfile(member, io.BytesIO(b"data"))
+        tar_stream_file.seek(0)
+
+        extract_directory_path = os.path.join(self.host_directory_path, "extract")
+        pulled_file_count = adb_file_viewer.extract_tar_stream(tar_stream_file, extract_directory_path, adb_file_viewer.Job("Pull", None))
+
+        self.assertEqual(pulled_file_count, 1)
+        self.assertEqual(os.listdir(extract_directory_path), ["kept.txt"])
+        self.assertEqual(os.path.exists(os.path.join(self.host_directory_path, "escaped.txt")), False)
+
+if __name__ == "__main__":
+    unittest.main()